@@ -1,14 +1,16 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from config import GOOGLE_API_KEY
+from services.telemetry_service import span, log_prompt
+from services.token_service import record_usage
+from services.model_service import chat_model, invoke, model_name, tier_stats
 import json
+import logging
+import time
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-image-preview",
-    api_key=GOOGLE_API_KEY
-)
+logger = logging.getLogger(__name__)
 
-def generate_feedback(question: str, answer: str, band: float):
+llm = chat_model("feedback")
+
+def _build_feedback_prompt(question: str, answer: str, band: float) -> str:
     prompt_template = """
     You are an experienced IELTS examiner. Your task is to provide **examiner-style feedback** directly to the student in an interactive way (use "you").
     The feedback must cover **Task 1, Task 2, and an overall comment**, referring to the band score.  
@@ -36,15 +38,15 @@ def generate_feedback(question: str, answer: str, band: float):
         template=prompt_template
     )
 
-    formatted_prompt = feedback_prompt.format(
+    return feedback_prompt.format(
         question=question,
         answer=answer,
         band=band,
     )
 
-    print("Calling feedback LLM...")
-    response = llm.invoke(formatted_prompt)
-    raw_output = getattr(response, "content", "").strip()
+
+def parse_feedback_output(raw_output: str) -> dict:
+    raw_output = (raw_output or "").strip()
 
     # Clean fenced code output if present
     if raw_output.startswith("```"):
@@ -66,3 +68,32 @@ def generate_feedback(question: str, answer: str, band: float):
         return parsed
     except Exception:
         return {"feedback": raw_output or "Unable to generate feedback."}
+
+
+def generate_feedback(question: str, answer: str, band: float):
+    formatted_prompt = _build_feedback_prompt(question, answer, band)
+
+    log_prompt("llm.feedback", formatted_prompt)
+    logger.debug("Calling feedback LLM...")
+    response = invoke(llm, "feedback", formatted_prompt)
+    return parse_feedback_output(getattr(response, "content", ""))
+
+
+def stream_feedback(question: str, answer: str, band: float):
+    """
+    Yield feedback text chunks as Gemini streams them.
+    Join the chunks and pass them to parse_feedback_output for the final object.
+    """
+    formatted_prompt = _build_feedback_prompt(question, answer, band)
+
+    log_prompt("llm.feedback_stream", formatted_prompt)
+    logger.debug("Streaming feedback LLM...")
+    start, prompt_tokens, completion_tokens = time.perf_counter(), 0, 0
+    with span("llm.feedback_stream"):
+        for chunk in llm.stream(formatted_prompt):
+            p, c = record_usage("feedback", chunk)
+            prompt_tokens, completion_tokens = prompt_tokens + p, completion_tokens + c
+            text = getattr(chunk, "content", "")
+            if text:
+                yield text
+    tier_stats.observe("feedback", model_name(llm), time.perf_counter() - start, prompt_tokens, completion_tokens)
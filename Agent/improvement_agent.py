@@ -1,12 +1,12 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from config import GOOGLE_API_KEY
+from services.telemetry_service import log_prompt
+from services.model_service import chat_model, invoke
 import json
+import logging
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-image-preview",
-    api_key=GOOGLE_API_KEY
-)
+logger = logging.getLogger(__name__)
+
+llm = chat_model("improvements")
 
 def generate_improvements(question: str, answer: str,feedback: str):
     prompt_template = """
@@ -46,8 +46,9 @@ def generate_improvements(question: str, answer: str,feedback: str):
         feedback=feedback
     )
 
-    response = llm.invoke(formatted_prompt)
-    print("Calling improvement LLM...")
+    log_prompt("llm.improvements", formatted_prompt)
+    logger.debug("Calling improvement LLM...")
+    response = invoke(llm, "improvements", formatted_prompt)
     try:
         return json.loads(response.content)
     except Exception:
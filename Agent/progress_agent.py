@@ -0,0 +1,374 @@
+# agents/progress_agent.py
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.history_service import WRITING_TASK_CRITERIA
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+PROGRESS_EMA_ALPHA = float(os.getenv("PROGRESS_EMA_ALPHA", "0.3"))
+# How stale a query may be: at most this often a query first pulls new history rows.
+PROGRESS_REFRESH_SECONDS = float(os.getenv("PROGRESS_REFRESH_SECONDS", "5"))
+
+# Columns of the analytics matrices. History rows (module, criterion) map onto them.
+CRITERIA = (
+    "writing_band", "writing_task1_band", "writing_task2_band",
+    *(f"writing_{c}" for c in WRITING_TASK_CRITERIA),
+    "speaking_band", "fluency", "coherence", "lexical_resource", "grammar", "pronunciation",
+)
+_COLUMN = {c: i for i, c in enumerate(CRITERIA)}
+_HISTORY_COLUMN = {
+    ("writing", "band"): "writing_band",
+    ("writing", "task1_band"): "writing_task1_band",
+    ("writing", "task2_band"): "writing_task2_band",
+    **{("writing", c): f"writing_{c}" for c in WRITING_TASK_CRITERIA},
+    ("speaking", "band"): "speaking_band",
+    **{("speaking", c): c for c in ("fluency", "coherence", "lexical_resource", "grammar", "pronunciation")},
+}
+# Writing criteria are only stored per task (part "task1" / "task2"); a session's two tasks
+# are combined with task 2 counting double, as in the writing band.
+_PER_TASK_COLUMNS = np.array([_COLUMN[f"writing_{c}"] for c in WRITING_TASK_CRITERIA])
+_TASK_WEIGHT = {"task1": 1.0, "task2": 2.0}
+# scores rows read by refresh(): overall rows plus the per-task writing criteria
+_ANALYSED_ROWS = "(part IS NULL OR module = 'writing')"
+# Sub-criteria eligible as "weakest" (overall and per-task bands are excluded: they are summaries, not skills)
+_SKILL_COLUMNS = np.array([_COLUMN[c] for c in CRITERIA if not c.endswith("_band")])
+
+_DAY = 86400.0
+
+
+class ProgressAnalytics:
+    """
+    Per-user and per-cohort score analytics kept as columnar NumPy arrays
+    (one row per user, one column per criterion) and updated incrementally.
+
+    For every (user, criterion) we keep running sums for count, mean and a
+    least-squares trend (score per day), an exponential moving average and the
+    last score. Cohort distributions are recomputed lazily, only after new data.
+
+    attach() follows the shared SQLite history store rather than one process's
+    writes: queries first read the scores rows above the last seen id (at most
+    every PROGRESS_REFRESH_SECONDS), so every worker sees every worker's results.
+    When rows below that id have gone (a re-scored session replaces its scores)
+    the aggregates are rebuilt from scratch.
+    """
+
+    def __init__(self, capacity: int = 1024, ema_alpha: float = PROGRESS_EMA_ALPHA):
+        self.alpha = ema_alpha
+        self._lock = threading.RLock()
+        self._capacity = capacity
+        self._store = None
+        self._refresh_interval = PROGRESS_REFRESH_SECONDS
+        self._last_refresh = float("-inf")
+        self._reset()
+
+    def _reset(self):
+        self._scores_seen_id = 0       # high-water mark of scores.id
+        self._scores_seen = 0          # _ANALYSED_ROWS read up to it
+        self._writing_seen_id = 0
+        self._users: Dict[str, int] = {}
+        self._user_ids: List[str] = []
+        self._cohort_names: Dict[str, int] = {"all": 0}
+        self._n = 0
+        self._version = 0
+        self._cache: Dict[Tuple[str, int], Any] = {}
+        self._alloc(self._capacity)
+
+    # ---- storage ----
+    def _alloc(self, capacity: int):
+        c = len(CRITERIA)
+        self._cap = capacity
+        self.count = np.zeros((capacity, c))
+        self.sum_y = np.zeros((capacity, c))
+        self.sum_t = np.zeros((capacity, c))
+        self.sum_tt = np.zeros((capacity, c))
+        self.sum_ty = np.zeros((capacity, c))
+        self.ema = np.full((capacity, c), np.nan)
+        self.last = np.full((capacity, c), np.nan)
+        self.first_ts = np.full(capacity, np.nan)
+        self.cohort = np.zeros(capacity, dtype=np.int32)
+
+    def _grow(self, needed: int):
+        if needed <= self._cap:
+            return
+        new_cap = max(needed, self._cap * 2)
+        for name in ("count", "sum_y", "sum_t", "sum_tt", "sum_ty", "ema", "last"):
+            old = getattr(self, name)
+            fill = np.nan if name in ("ema", "last") else 0.0
+            grown = np.full((new_cap, old.shape[1]), fill)
+            grown[: self._cap] = old
+            setattr(self, name, grown)
+        first_ts = np.full(new_cap, np.nan)
+        first_ts[: self._cap] = self.first_ts
+        cohort = np.zeros(new_cap, dtype=np.int32)
+        cohort[: self._cap] = self.cohort
+        self.first_ts, self.cohort, self._cap = first_ts, cohort, new_cap
+
+    def _rows_for(self, user_ids: Sequence[str]) -> np.ndarray:
+        rows = np.empty(len(user_ids), dtype=np.int64)
+        for i, uid in enumerate(user_ids):
+            row = self._users.get(uid)
+            if row is None:
+                row = self._n
+                self._users[uid] = row
+                self._user_ids.append(uid)
+                self._n += 1
+            rows[i] = row
+        self._grow(self._n)
+        return rows
+
+    def assign_cohort(self, user_id: str, cohort: str):
+        with self._lock:
+            row = self._rows_for([user_id])[0]
+            self.cohort[row] = self._cohort_names.setdefault(cohort, len(self._cohort_names))
+            self._version += 1
+
+    # ---- updates ----
+    def update(self, user_ids: Sequence[str], timestamps: Sequence[float], values: np.ndarray):
+        """
+        Add a batch of observations. values is (len(user_ids), len(CRITERIA)) with NaN
+        where a criterion was not scored. Rows must be in time order per user.
+        """
+        values = np.asarray(values, dtype=float)
+        ts = np.asarray(timestamps, dtype=float)
+        if values.size == 0:
+            return
+        with self._lock:
+            unique_users, user_index = np.unique(np.asarray(user_ids, dtype=object).astype(str), return_inverse=True)
+            rows = self._rows_for(unique_users)[user_index]
+            # per-user time origin keeps trend sums well-conditioned
+            np.fmin.at(self.first_ts, rows, ts)
+            t = ((ts - self.first_ts[rows]) / _DAY)[:, None]
+
+            seen = ~np.isnan(values)
+            y = np.where(seen, values, 0.0)
+            tt = np.where(seen, t, 0.0)
+            np.add.at(self.count, rows, seen)
+            np.add.at(self.sum_y, rows, y)
+            np.add.at(self.sum_t, rows, tt)
+            np.add.at(self.sum_tt, rows, tt * tt)
+            np.add.at(self.sum_ty, rows, tt * y)
+
+            # EMA / last are order dependent: apply in rounds so each round touches a user once
+            order = np.argsort(ts, kind="stable")
+            rows_o, values_o, seen_o = rows[order], values[order], seen[order]
+            occurrence = _occurrence_index(rows_o)
+            for k in range(int(occurrence.max()) + 1):
+                sel = occurrence == k
+                r, v, s = rows_o[sel], values_o[sel], seen_o[sel]
+                prev = self.ema[r]
+                blended = np.where(np.isnan(prev), v, self.alpha * v + (1 - self.alpha) * prev)
+                self.ema[r] = np.where(s, blended, prev)
+                self.last[r] = np.where(s, v, self.last[r])
+            self._version += 1
+
+    def record(self, user_id: str, scores: Dict[str, float], timestamp: Optional[float] = None):
+        row = np.full((1, len(CRITERIA)), np.nan)
+        for name, value in scores.items():
+            if name in _COLUMN and value is not None:
+                row[0, _COLUMN[name]] = float(value)
+        self.update([user_id], [timestamp or time.time()], row)
+
+    def ingest_history_rows(self, rows: Iterable[Tuple]):
+        """
+        Ingest history `scores` rows (user_id, test_id, module, criterion, part, score, created_at).
+        Per-part rows are skipped, except the per-task writing criteria, which are averaged over the
+        session's tasks; rows of one session (same user, test, timestamp) become one observation.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        cols = np.array(rows, dtype=object)
+        user, test, module, criterion, part, score, created = cols.T
+
+        # (module, criterion) -> column index, resolved once per distinct pair
+        pair = np.char.add(np.char.add(module.astype(str), ":"), criterion.astype(str))
+        pairs, pair_index = np.unique(pair, return_inverse=True)
+        lookup = np.array([_COLUMN.get(_HISTORY_COLUMN.get(tuple(p.split(":", 1))), -1) for p in pairs])
+        column = lookup[pair_index]
+
+        per_task = np.isin(column, _PER_TASK_COLUMNS)
+        keep = (column >= 0) & ((part == None) != per_task) & (score != None) & (user != None)  # noqa: E711
+        if not keep.any():
+            return
+        user, test, column, part = user[keep], test[keep], column[keep], part[keep]
+        score, created = score[keep].astype(float), created[keep].astype(float)
+        weight = np.array([_TASK_WEIGHT.get(p, 1.0) for p in part])
+
+        session_key = np.char.add(np.char.add(user.astype(str), "|"), np.char.add(test.astype(str), "|"))
+        session_key = np.char.add(session_key, created.astype(str))
+        _, first, session = np.unique(session_key, return_index=True, return_inverse=True)
+        weighted = np.zeros((len(first), len(CRITERIA)))
+        weights = np.zeros((len(first), len(CRITERIA)))
+        np.add.at(weighted, (session, column), weight * score)
+        np.add.at(weights, (session, column), weight)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.where(weights > 0, weighted / weights, np.nan)
+
+        order = np.argsort(created[first], kind="stable")
+        self.update(user[first][order], created[first][order], values[order])
+
+    # ---- history store ----
+    def attach(self, store, refresh_interval: float = PROGRESS_REFRESH_SECONDS):
+        """Follow a HistoryStore (shared by all workers) and load what it holds so far."""
+        self._store, self._refresh_interval = store, refresh_interval
+        self.refresh()
+        logger.info("Progress analytics loaded for %d users", self._n)
+
+    def refresh(self, chunk_size: int = 50000):
+        """Ingest scores and cohorts committed since the last refresh, by any process."""
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            conn = self._store._reader()
+            top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM scores").fetchone()[0]
+            if top != self._scores_seen_id and self._scores_seen_id:
+                kept = conn.execute(
+                    f"SELECT COUNT(*) FROM scores WHERE {_ANALYSED_ROWS} AND id <= ?", (self._scores_seen_id,)
+                ).fetchone()[0]
+                if kept != self._scores_seen:
+                    logger.info("History scores were replaced; rebuilding progress analytics")
+                    self._reset()
+            cursor = conn.execute(
+                "SELECT user_id, test_id, module, criterion, part, score, created_at FROM scores"
+                f" WHERE {_ANALYSED_ROWS} AND id > ? AND id <= ? ORDER BY created_at",
+                (self._scores_seen_id, top),
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                self._scores_seen += len(rows)
+                self.ingest_history_rows(tuple(r) for r in rows)
+            self._scores_seen_id = top
+
+            for row_id, user_id, test_type in conn.execute(
+                "SELECT id, user_id, test_type FROM writing_submissions WHERE id > ? AND user_id IS NOT NULL ORDER BY id",
+                (self._writing_seen_id,),
+            ):
+                if test_type:
+                    self.assign_cohort(user_id, test_type)
+                self._writing_seen_id = row_id
+
+    def _maybe_refresh(self):
+        if self._store is None or time.monotonic() - self._last_refresh < self._refresh_interval:
+            return
+        try:
+            self.refresh()
+        except Exception as e:  # keep answering from what is already loaded
+            logger.error("Progress analytics refresh failed: %s", e)
+
+    # ---- derived arrays ----
+    def _means(self) -> np.ndarray:
+        n = self.count[: self._n]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, self.sum_y[: self._n] / n, np.nan)
+
+    def _row_stats(self, row: int):
+        n = self.count[row]
+        st, sy = self.sum_t[row], self.sum_y[row]
+        denom = n * self.sum_tt[row] - st * st
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(n > 0, sy / n, np.nan)
+            slopes = np.where((n >= 2) & (np.abs(denom) > 1e-12), (n * self.sum_ty[row] - st * sy) / denom, np.nan)
+        return means, slopes
+
+    def _sorted_means(self, cohort_id: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-criterion sorted user means (NaN last) and non-NaN counts, cached until the next update."""
+        key = ("sorted", -1 if cohort_id is None else cohort_id)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        means = self._means()
+        if cohort_id is not None:
+            means = means[self.cohort[: self._n] == cohort_id]
+        ordered = np.sort(means, axis=0)
+        valid = (~np.isnan(ordered)).sum(axis=0)
+        self._cache[key] = (self._version, (ordered, valid))
+        return ordered, valid
+
+    # ---- queries ----
+    def user_progress(self, user_id: str) -> Optional[Dict[str, Any]]:
+        self._maybe_refresh()
+        with self._lock:
+            row = self._users.get(user_id)
+            if row is None:
+                return None
+            means, slopes = self._row_stats(row)
+            ordered, valid = self._sorted_means(None)
+            # percentile rank: share of users whose mean is <= this user's mean
+            rank = np.array([
+                np.searchsorted(ordered[: valid[c], c], means[c], side="right") for c in range(len(CRITERIA))
+            ])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                percentile = np.where((valid > 0) & ~np.isnan(means), 100.0 * rank / valid, np.nan)
+
+            skills = means[_SKILL_COLUMNS]
+            weakest = None
+            if not np.all(np.isnan(skills)):
+                weakest = CRITERIA[_SKILL_COLUMNS[int(np.nanargmin(skills))]]
+
+            criteria = {}
+            for c, name in enumerate(CRITERIA):
+                if self.count[row, c] == 0:
+                    continue
+                criteria[name] = {
+                    "count": int(self.count[row, c]),
+                    "mean": _r(means[c]),
+                    "moving_average": _r(self.ema[row, c]),
+                    "last": _r(self.last[row, c]),
+                    "trend_per_day": _r(slopes[c], 4),
+                    "percentile_rank": _r(percentile[c], 1),
+                }
+            return {"user_id": user_id, "criteria": criteria, "weakest_criterion": weakest}
+
+    def cohort_summary(self, cohort: str = "all") -> Optional[Dict[str, Any]]:
+        self._maybe_refresh()
+        with self._lock:
+            if cohort != "all" and cohort not in self._cohort_names:
+                return None
+            cached = self._cache.get(("summary", cohort))
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+            ordered, valid = self._sorted_means(None if cohort == "all" else self._cohort_names[cohort])
+            # columns are sorted with NaN last, so quantiles index straight into the valid prefix
+            q = np.full((3, len(CRITERIA)), np.nan)
+            mean = np.full(len(CRITERIA), np.nan)
+            for c in np.flatnonzero(valid):
+                column = ordered[: valid[c], c]
+                q[:, c] = np.percentile(column, [25, 50, 75])
+                mean[c] = column.mean()
+            skills = mean[_SKILL_COLUMNS]
+            weakest = None if np.all(np.isnan(skills)) else CRITERIA[_SKILL_COLUMNS[int(np.nanargmin(skills))]]
+            criteria = {
+                name: {"users": int(valid[c]), "mean": _r(mean[c]), "p25": _r(q[0, c]), "median": _r(q[1, c]), "p75": _r(q[2, c])}
+                for c, name in enumerate(CRITERIA) if valid[c]
+            }
+            summary = {"cohort": cohort, "users": int(ordered.shape[0]), "criteria": criteria, "weakest_criterion": weakest}
+            self._cache[("summary", cohort)] = (self._version, summary)
+            return summary
+
+
+def _occurrence_index(keys: np.ndarray) -> np.ndarray:
+    """For each element, how many earlier elements share its key (0 for the first)."""
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.r_[0, np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1]
+    lengths = np.diff(np.r_[starts, len(keys)])
+    occurrence = np.empty(len(keys), dtype=np.int64)
+    occurrence[order] = np.arange(len(keys)) - np.repeat(starts, lengths)
+    return occurrence
+
+
+def _r(x: float, digits: int = 2) -> Optional[float]:
+    return None if x is None or np.isnan(x) else round(float(x), digits)
+
+
+progress_analytics = ProgressAnalytics()
@@ -0,0 +1,282 @@
+# agents/reading_agent.py
+"""
+IELTS Reading: tests from data/reading, graded locally against precomputed keys.
+
+Each test is one JSON file (passages + questions, each question with its accepted
+answers). At load time every accepted answer is normalised, expanded with spelling
+variants (British/American, T/F/NG abbreviations) and hashed to int64, giving a
+(questions x variants) key matrix per test. Grading normalises and hashes the
+candidate's answers and compares them with the matrix in one NumPy operation, for
+a single sheet or a whole batch. The raw score maps to a band through the official
+conversion tables. The LLM only writes the explanation of a question's answer,
+which is the same for every candidate and is cached per question.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.telemetry_service import log_prompt
+from services.model_service import chat_model, invoke
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+READING_DATA_DIR = os.getenv("READING_DATA_DIR", os.path.join("data", "reading"))
+READING_CACHE_DIR = os.getenv("READING_CACHE_DIR", os.path.join("data", "reading_cache"))
+READING_EXPLAIN_WORKERS = int(os.getenv("READING_EXPLAIN_WORKERS", "8"))
+
+llm = chat_model("reading_explain")
+
+# Raw score (out of 40) -> band. Official IELTS conversion tables; they stop at band
+# 2.5, below which bands 2 / 1 / 0 are used for 2-3 / 1 / 0 correct answers.
+_BAND_RANGES = {
+    "academic": [
+        (39, 9.0), (37, 8.5), (35, 8.0), (33, 7.5), (30, 7.0), (27, 6.5), (23, 6.0),
+        (19, 5.5), (15, 5.0), (13, 4.5), (10, 4.0), (8, 3.5), (6, 3.0), (4, 2.5), (2, 2.0), (1, 1.0), (0, 0.0),
+    ],
+    "general_training": [
+        (40, 9.0), (39, 8.5), (37, 8.0), (36, 7.5), (34, 7.0), (32, 6.5), (30, 6.0),
+        (27, 5.5), (23, 5.0), (19, 4.5), (15, 4.0), (12, 3.5), (9, 3.0), (6, 2.5), (2, 2.0), (1, 1.0), (0, 0.0),
+    ],
+}
+BAND_TABLES = {
+    test_type: np.array([next(band for low, band in ranges if raw >= low) for raw in range(41)])
+    for test_type, ranges in _BAND_RANGES.items()
+}
+FULL_TEST_QUESTIONS = 40
+
+_CHOICE_VARIANTS = {
+    "true": ("true", "t"), "false": ("false", "f"), "not given": ("not given", "ng", "notgiven"),
+    "yes": ("yes", "y"), "no": ("no", "n"),
+}
+_NUMBER_WORDS = {w: str(i) for i, w in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve".split())}
+_ARTICLES = {"a", "an", "the"}
+# British <-> American endings, applied in both directions
+_SPELLING_RULES = [
+    ("isation", "ization"), ("ise", "ize"), ("ised", "ized"), ("ising", "izing"),
+    ("yse", "yze"), ("our", "or"), ("tre", "ter"), ("ogue", "og"), ("elled", "eled"), ("elling", "eling"),
+]
+_PUNCT_RE = re.compile(r"[^\w\s]")
+# Choice questions are answered with a letter or a fixed label: "A" is an option, not an article.
+_CHOICE_TYPES = ("mcq", "tfng", "ynng")
+_PAD, _BLANK = 0, 1  # reserved hashes: key padding and an unanswered question; keys never hash to either
+
+
+def normalise(text: Optional[str], qtype: Optional[str] = None) -> str:
+    """Lower-case, drop punctuation; for written answers also articles and number words to digits."""
+    text = _PUNCT_RE.sub(" ", (text or "").lower().replace("&", " and "))
+    if qtype in _CHOICE_TYPES:
+        return " ".join(text.split())
+    return " ".join(_NUMBER_WORDS.get(t, t) for t in text.split() if t not in _ARTICLES)
+
+
+def _word_variants(word: str) -> set:
+    variants = {word}
+    for british, american in _SPELLING_RULES:
+        if word.endswith(british):
+            variants.add(word[: -len(british)] + american)
+        if word.endswith(american):
+            variants.add(word[: -len(american)] + british)
+    return variants
+
+
+def answer_variants(answer: str, qtype: str) -> set:
+    """Every normalised form of one accepted answer."""
+    base = normalise(answer, qtype)
+    if qtype in ("tfng", "ynng"):
+        return set(_CHOICE_VARIANTS.get(base, (base,)))
+    if qtype == "mcq":
+        return {base}
+    tokens = base.split()
+    if len(tokens) > 4:  # long keys: don't explode the combinations
+        return {base}
+    return {" ".join(combo) for combo in product(*(_word_variants(t) for t in tokens))}
+
+
+def _hash(text: str) -> int:
+    if not text:
+        return _BLANK
+    h = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+    return h if h not in (_PAD, _BLANK) else 2
+
+
+class ReadingTest:
+    def __init__(self, spec: Dict[str, Any]):
+        self.test_id = spec["test_id"]
+        self.test_type = spec.get("test_type", "academic").lower().replace(" ", "_")
+        self.title = spec.get("title", self.test_id)
+        self.passages = {p["id"]: p for p in spec["passages"]}
+        self.questions = sorted(spec["questions"], key=lambda q: q["n"])
+        self.numbers = np.array([q["n"] for q in self.questions])
+        self._index = {int(n): i for i, n in enumerate(self.numbers)}
+        variants = [sorted(set().union(*(answer_variants(a, q["type"]) for a in q["answer"])) - {""})
+                    for q in self.questions]
+        empty = [q["n"] for q, v in zip(self.questions, variants) if not v]
+        if empty:
+            raise ValueError(f"Reading test {self.test_id}: questions {empty} have no usable answer")
+        self.keys = np.full((len(variants), max(len(v) for v in variants)), _PAD, dtype=np.int64)
+        for i, v in enumerate(variants):
+            self.keys[i, : len(v)] = [_hash(x) for x in v]
+
+    def public(self) -> Dict[str, Any]:
+        """Passages and questions without the answers."""
+        return {
+            "test_id": self.test_id, "test_type": self.test_type, "title": self.title,
+            "passages": list(self.passages.values()),
+            "questions": [{k: v for k, v in q.items() if k != "answer"} for q in self.questions],
+        }
+
+    def encode(self, sheets: Sequence[Dict[Any, str]]) -> np.ndarray:
+        """(sheets x questions) int64 hashes of the normalised answers, by question number."""
+        out = np.full((len(sheets), len(self.questions)), _BLANK, dtype=np.int64)
+        for s, sheet in enumerate(sheets):
+            for n, answer in sheet.items():
+                i = self._index.get(int(n))
+                if i is not None:
+                    out[s, i] = _hash(normalise(answer, self.questions[i]["type"]))
+        return out
+
+    def grade_matrix(self, encoded: np.ndarray) -> np.ndarray:
+        """Boolean (sheets x questions) correctness, one broadcast comparison against the keys."""
+        return (encoded[:, :, None] == self.keys[None, :, :]).any(axis=2)
+
+    def band_for(self, raw: np.ndarray) -> np.ndarray:
+        """Band per raw score; practice sets shorter than 40 questions are scaled to 40 first."""
+        scaled = np.rint(raw * (FULL_TEST_QUESTIONS / len(self.questions))).astype(int)
+        table = BAND_TABLES.get(self.test_type, BAND_TABLES["academic"])
+        return table[np.clip(scaled, 0, FULL_TEST_QUESTIONS)]
+
+    def grade(self, sheets: Sequence[Dict[Any, str]]) -> List[Dict[str, Any]]:
+        correct = self.grade_matrix(self.encode(sheets))
+        raw = correct.sum(axis=1)
+        bands = self.band_for(raw)
+        return [
+            {
+                "test_id": self.test_id,
+                "raw_score": int(raw[s]),
+                "total": len(self.questions),
+                "band": float(bands[s]),
+                "band_estimated": len(self.questions) != FULL_TEST_QUESTIONS,
+                "correct": self.numbers[correct[s]].tolist(),
+                "incorrect": self.numbers[~correct[s]].tolist(),
+            }
+            for s in range(len(sheets))
+        ]
+
+
+class ReadingBank:
+    def __init__(self, data_dir: str = READING_DATA_DIR, cache_dir: str = READING_CACHE_DIR):
+        self.tests: Dict[str, ReadingTest] = {}
+        self.cache_dir = cache_dir
+        self._explanations: Dict[str, Dict[str, str]] = {}
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        if os.path.isdir(data_dir):
+            for name in sorted(os.listdir(data_dir)):
+                if name.endswith(".json"):
+                    with open(os.path.join(data_dir, name), encoding="utf-8") as f:
+                        test = ReadingTest(json.load(f))
+                    self.tests[test.test_id] = test
+        logger.info("Loaded %d reading tests from %s", len(self.tests), data_dir)
+
+    def get(self, test_id: str) -> Optional[ReadingTest]:
+        return self.tests.get(test_id)
+
+    def catalogue(self) -> List[Dict[str, Any]]:
+        return [{"test_id": t.test_id, "test_type": t.test_type, "title": t.title, "questions": len(t.questions)}
+                for t in self.tests.values()]
+
+    # ---- explanations (LLM, cached per question) ----
+    def _cache_path(self, test_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{test_id}.explanations.json")
+
+    def _cached(self, test_id: str) -> Dict[str, str]:
+        with self._lock:
+            if test_id not in self._explanations:
+                try:
+                    with open(self._cache_path(test_id), encoding="utf-8") as f:
+                        self._explanations[test_id] = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    self._explanations[test_id] = {}
+            return self._explanations[test_id]
+
+    def _store(self, test_id: str, n: int, text: str):
+        with self._lock:
+            cache = self._explanations.setdefault(test_id, {})
+            cache[str(n)] = text
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{self._cache_path(test_id)}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self._cache_path(test_id))
+
+    def explain(self, test_id: str, n: int) -> str:
+        """Why the key is right for question n; generated once, then served from the cache."""
+        cached = self._cached(test_id).get(str(n))
+        if cached:
+            return cached
+        with self._lock:
+            lock = self._locks.setdefault((test_id, n), threading.Lock())
+        with lock:  # one LLM call per question even under concurrent requests
+            cached = self._cached(test_id).get(str(n))
+            if cached:
+                return cached
+            test = self.tests[test_id]
+            question = test.questions[test._index[n]]
+            text = _generate_explanation(test.passages.get(question.get("passage"), {}).get("text", ""), question)
+            self._store(test_id, n, text)
+            return text
+
+
+def _generate_explanation(passage: str, question: Dict[str, Any]) -> str:
+    prompt = f"""You are an IELTS Reading tutor. Explain briefly (2-3 sentences) why the answer below is correct,
+quoting the words of the passage that support it. Speak to the student ("you").
+
+Passage: {passage}
+Question {question["n"]} ({question["type"]}): {question["prompt"]}
+Options: {json.dumps(question.get("options") or {}, ensure_ascii=False)}
+Correct answer: {" / ".join(question["answer"])}
+
+Return ONLY valid JSON: {{"explanation": "<plain text>"}}"""
+    log_prompt("llm.reading_explain", prompt)
+    response = invoke(llm, "reading_explain", prompt)
+    raw = (getattr(response, "content", "") or "").strip().strip("`")
+    try:
+        return json.loads(raw.replace("json", "", 1) if raw.startswith("json") else raw)["explanation"]
+    except (ValueError, KeyError, TypeError):
+        return raw
+
+
+def grade_submission(test_id: str, answers: Dict[Any, str], explain: bool = True) -> Optional[Dict[str, Any]]:
+    """Grade one answer sheet; explanations (cached) for the questions answered wrongly."""
+    test = reading_bank.get(test_id)
+    if test is None:
+        return None
+    result = test.grade([answers])[0]
+    if explain and result["incorrect"]:
+        by_n = {q["n"]: q for q in test.questions}
+        # cache hits return at once; misses are generated concurrently, each in a copy of
+        # the caller's context so token usage and the trace id stay attributed
+        contexts = [contextvars.copy_context() for _ in result["incorrect"]]
+        with ThreadPoolExecutor(max_workers=READING_EXPLAIN_WORKERS) as pool:
+            texts = pool.map(lambda ctx, n: ctx.run(reading_bank.explain, test_id, n), contexts, result["incorrect"])
+            result["explanations"] = {
+                n: {"your_answer": answers.get(n, answers.get(str(n))), "answer": by_n[n]["answer"][0], "explanation": text}
+                for n, text in zip(result["incorrect"], texts)
+            }
+    return result
+
+
+reading_bank = ReadingBank()
@@ -1,61 +1,96 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from config import GOOGLE_API_KEY
 from services.evaluation_service import get_rubric
+from services.vector_db_service import retrieve_scoring_context
+from services.telemetry_service import log_prompt
+from services.model_service import chat_model, invoke, escalation_reason, tier_stats
+import services.model_service as model_service
 import json
+import logging
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-image-preview",
-    api_key=GOOGLE_API_KEY)
+logger = logging.getLogger(__name__)
 
+llm = chat_model("score")
+combine_llm = chat_model("combine")
+# cascade tiers (SCORE_CASCADE=true)
+fast_llm = chat_model("score_fast")
+strong_llm = chat_model("score_strong")
 
-def score_task(task_type: str, test_type: str, question: str, answer: str = None, image_b64: str = None):
-    rubric_type=get_rubric(task_type,test_type)
+
+def score_task(task_type: str, test_type: str, question: str, answer: str = None, image_b64: str = None,
+               features: str = None):
+    # Nearest scored exemplars plus the descriptor levels around them; the full
+    # rubric only when there is no index (or nothing indexed for this task).
+    context = retrieve_scoring_context(task_type, test_type, answer) if answer else None
+    rubric_type = context["descriptors"] if context else get_rubric(task_type, test_type)
 
     prompt_template_score = """You are an expert IELTS examiner.Evaluate the following IELTS Writing {task_type} answer.
     Question: {question}
     Your answer: {answer}
     Band descriptors to guide scoring:{rubric_type}
+    Scored example answers for calibration: {exemplars}
+    Measured text features (use as evidence, not as the score): {features}
     Return a valid JSON object, exactly in this format:
-    {{"band": <float 0.0-9.0, step 0.5>}}
+    {{"task_response": <float>, "coherence_cohesion": <float>, "lexical_resource": <float>, "grammatical_range_accuracy": <float>, "band": <float 0.0-9.0, step 0.5>}}
     
     Rules:
     - Return ONLY the JSON object
     - Do not include the word "json" anywhere
     - Do not include line breaks inside JSON
-    - Format example: {{"band": 6.5}}
+    - task_response is Task Achievement for Task 1; each criterion is 0.0-9.0 in whole bands
+    - band is the mean of the four criteria rounded to the nearest 0.5
+    - Format example: {{"task_response": 6, "coherence_cohesion": 7, "lexical_resource": 6, "grammatical_range_accuracy": 6, "band": 6.5}}
 """
     
 
     
     score_prompt = PromptTemplate(
-    input_variables=["task_type", "question", "answer", "rubric_type"],
+    input_variables=["task_type", "question", "answer", "rubric_type", "exemplars", "features"],
     template=prompt_template_score)
     
     formatted_prompt = score_prompt.format(
         task_type=task_type,
         question=question,
         answer=answer if answer else "[Answer provided in image]",   #format the text even if image is present
-        rubric_type=json.dumps(rubric_type, ensure_ascii=False, indent=2)
+        rubric_type=json.dumps(rubric_type, ensure_ascii=False, indent=2),
+        exemplars=json.dumps(context["exemplars"], ensure_ascii=False) if context else "none",
+        features=features or "not available"
     )
-    print("format prompt",formatted_prompt)
+    log_prompt("llm.score", formatted_prompt)
     
-    if not image_b64:
-        response = llm.invoke(formatted_prompt)
-        return json.loads(response.content)
-    #text+image
-    response = llm.invoke(
-        [
+    message = formatted_prompt
+    if image_b64:
+        #text+image
+        message = [
             {"role": "user", "content": [
                 {"type": "text", "text": formatted_prompt},
                 {"type": "image_url", "image_url": f"data:image/png;base64,{image_b64}"}
             ]}
         ]
-    )
-    print("successfully sent response")
+    if not model_service.SCORE_CASCADE:
+        return _score(llm, "score", message)
+    return _score_cascade(task_type, message)
+
+
+def _score(model, stage: str, message):
+    response = invoke(model, stage, message, span_name="llm.score")
+    logger.debug("successfully sent response")
     return json.loads(response.content)
 
 
+def _score_cascade(task_type: str, message):
+    """Fast tier first; the strong tier re-scores only when the fast criteria are not trustworthy."""
+    try:
+        result = _score(fast_llm, "score_fast", message)
+    except ValueError:
+        result = None
+    reason = escalation_reason(result)
+    tier_stats.cascade_outcome(reason)
+    if reason is None:
+        return {**result, "tier": "fast"}
+    logger.info("Escalating %s score to the strong tier (%s)", task_type, reason)
+    return {**_score(strong_llm, "score_strong", message), "tier": "strong", "escalated": reason}
+
+
 def combine_results(task1_result: dict, task2_result: dict):
     prompt_template = """
     You are an IELTS examiner. Combine the Task 1 and Task 2 evaluations into a single final assessment.
@@ -92,9 +127,9 @@ def combine_results(task1_result: dict, task2_result: dict):
         task2=json.dumps(task2_result, ensure_ascii=False)
     )
 
-    print("final prompt",formatted_prompt)
-    print("Calling scoring LLM...")
-    response = llm.invoke(formatted_prompt)
+    log_prompt("llm.combine", formatted_prompt)
+    logger.debug("Calling scoring LLM...")
+    response = invoke(combine_llm, "combine", formatted_prompt)
     return json.loads(response.content)
 
 
@@ -2,9 +2,14 @@
 import os
 import re
 import json
+import hashlib
+import sqlite3
+import time
 import tempfile
 import logging
-from typing import TypedDict, Dict, Any, Optional
+import threading
+from functools import wraps
+from typing import TypedDict, Dict, Any, List, Optional
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, END
@@ -14,23 +19,48 @@ from langgraph.graph import StateGraph, END
 from config import genai  # type: ignore
 
 # Use your ASR service (must exist in services/asr_service.py)
-from services.asr_service import transcribe_audio
+from services.asr_service import transcribe_audio_detailed
+from services.telemetry_service import span, traced, log_prompt, get_trace_id, set_trace_id, reset_trace_id
+from services.token_service import fit_to_budget
+from services.model_service import STAGE_MODELS, observe_call
+from services.linguistic_service import check, feature_summary, is_asr_error, round_band
+from services.fluency_service import fluency_metrics, fluency_band, metrics_summary
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_MODEL = STAGE_MODELS["speaking"]
+# "llm": the model scores fluency from the transcript (timing metrics are given as evidence);
+# "local": the fluency sub-score is computed from word timings and overrides the model's.
+SPEAKING_FLUENCY_MODE = os.getenv("SPEAKING_FLUENCY_MODE", "llm")
+# Graph runs are checkpointed per (user, test, audio) so a retry after a failed
+# evaluation resumes from the stored transcripts instead of re-running ASR.
+SPEAKING_CHECKPOINTS = os.getenv("SPEAKING_CHECKPOINTS", "true").lower() == "true"
+SPEAKING_CHECKPOINT_DB = os.getenv("SPEAKING_CHECKPOINT_DB", os.path.join("data", "speaking_checkpoints.db"))
+# Runs not touched for this long are deleted; pruning runs at most once per interval per process.
+SPEAKING_CHECKPOINT_TTL_DAYS = float(os.getenv("SPEAKING_CHECKPOINT_TTL_DAYS", "30"))
+SPEAKING_CHECKPOINT_PRUNE_INTERVAL_S = float(os.getenv("SPEAKING_CHECKPOINT_PRUNE_INTERVAL_S", "3600"))
+
+
+class TranscriptionError(RuntimeError):
+    """ASR failed for a part. Raised inside the transcribe node so the failure is never checkpointed."""
 
 
 # ---- State typing ----
 class SpeakingState(TypedDict, total=False):
     test_id: str
     user_id: str
+    trace_id: str
     responses: Dict[str, Any]    # e.g. {"part_1": "path_or_url", ...}
     transcripts: Dict[str, str]
+    asr_errors: Dict[str, str]   # parts whose transcription failed (their transcript is "")
+    timings: Dict[str, List[Dict[str, Any]]]
+    fluency_metrics: Dict[str, Optional[Dict[str, Any]]]
     per_part: Dict[str, Dict[str, Any]]
     aggregated: Dict[str, Any]
+    precheck: Dict[str, Dict[str, Any]]
+    thread_id: str               # checkpoint thread; the history store keys the session on it
 
 
 # ---- Helpers ----
@@ -49,9 +79,11 @@ def _download_to_temp(url: str) -> str:
     return tmp.name
 
 
-def _safe_transcribe(src: Any) -> str:
+def _safe_transcribe(src: Any) -> Dict[str, Any]:
     """
     Accepts local file path or dict with 'audio_url' or http(s) url string.
+    Returns {"text", "words"} (words carry start/end timings when the ASR backend gives them),
+    plus "error" when transcription failed.
     """
     try:
         if isinstance(src, dict) and src.get("audio_url"):
@@ -59,18 +91,18 @@ def _safe_transcribe(src: Any) -> str:
         if isinstance(src, str) and src.startswith(("http://", "https://")):
             path = _download_to_temp(src)
             try:
-                return transcribe_audio(path)
+                return transcribe_audio_detailed(path)
             finally:
                 try:
                     os.remove(path)
                 except Exception:
                     pass
         if isinstance(src, str):
-            return transcribe_audio(src)
+            return transcribe_audio_detailed(src)
         raise ValueError("Unsupported audio source type for transcription")
     except Exception as e:
         logger.exception("Transcription failed for source %s: %s", str(src), e)
-        return f"ERROR: {str(e)}"
+        return {"text": "", "words": [], "error": str(e)}
 
 
 def _extract_text_from_genai_response(resp: Any) -> str:
@@ -113,12 +145,8 @@ def _extract_json(text: str) -> Optional[Dict[str, Any]]:
             return None
 
 
-def _round_half(x: float) -> float:
-    return round(x * 2) / 2.0
-
-
 # ---- Prompt builder (few-shot) ----
-def _build_evaluation_prompt(transcripts: Dict[str, str]) -> str:
+def _build_evaluation_prompt(transcripts: Dict[str, str], features: Optional[Dict[str, str]] = None) -> str:
     examples = [
         {
             "transcript": "I live in a small town. I like to read books and sometimes go cycling.",
@@ -175,32 +203,88 @@ def _build_evaluation_prompt(transcripts: Dict[str, str]) -> str:
     prompt_parts.append("Now evaluate these transcripts. Return ONLY a single JSON object.")
     prompt_parts.append("Transcripts:")
     prompt_parts.append("\n".join(parts_lines))
+    if features:
+        prompt_parts.append("Measured transcript features (use as evidence, not as the score):")
+        prompt_parts.append("\n".join(f"{p}: {f}" for p, f in features.items()))
     prompt_parts.append("\nInstructions: Scores must be integers 0-9. Band = average of five categories rounded to nearest 0.5. Feedback sentences should be short.")
     return "\n\n".join(prompt_parts)
 
 
+def _with_state_trace(fn):
+    """LangGraph may run nodes outside the caller's context; re-bind the trace id carried in state."""
+    @wraps(fn)
+    def wrapper(state: SpeakingState) -> SpeakingState:
+        token = set_trace_id(state.get("trace_id") or get_trace_id())
+        try:
+            return fn(state)
+        finally:
+            reset_trace_id(token)
+    return wrapper
+
+
 # ---- LangGraph node: transcribe ----
+@_with_state_trace
+@traced("graph.transcribe")
 def transcribe_node(state: SpeakingState) -> SpeakingState:
-    logger.info("Node: transcribe")
+    logger.info("trace=%s Node: transcribe", get_trace_id())
     responses = state.get("responses", {}) or {}
-    transcripts: Dict[str, str] = {}
     for part, src in responses.items():
-        transcripts[part] = _safe_transcribe(src)
-    state["transcripts"] = transcripts
+        store_transcription(state, part, _safe_transcribe(src))
+    _raise_on_asr_errors(state)
     return state
 
 
+def store_transcription(state: SpeakingState, part: str, result: Dict[str, Any]):
+    """Keep a part's transcript and timings; a failed transcription is stored as "" and flagged in asr_errors."""
+    errors = state.setdefault("asr_errors", {})
+    errors.pop(part, None)
+    if result.get("error"):
+        errors[part] = result["error"]
+        result = {"text": "", "words": []}
+    state.setdefault("transcripts", {})[part] = result["text"]
+    state.setdefault("timings", {})[part] = result["words"]
+    state.setdefault("fluency_metrics", {})[part] = fluency_metrics(result["words"])
+
+
+def _raise_on_asr_errors(state: SpeakingState):
+    errors = state.get("asr_errors") or {}
+    if errors:
+        raise TranscriptionError("Transcription failed for " + "; ".join(f"{p}: {e}" for p, e in errors.items()))
+
+
 # ---- LangGraph node: evaluate ----
+@_with_state_trace
+@traced("graph.evaluate")
 def evaluate_node(state: SpeakingState) -> SpeakingState:
-    logger.info("Node: evaluate")
+    logger.info("trace=%s Node: evaluate", get_trace_id())
     transcripts = state.get("transcripts", {}) or {}
     if not transcripts:
         raise ValueError("No transcripts available for evaluation.")
-
-    prompt = _build_evaluation_prompt(transcripts)
+    transcripts = {p: fit_to_budget(t, "speaking") for p, t in transcripts.items()}
+
+    # Local pre-check: parts with no ratable speech get a deterministic score and skip the LLM.
+    # A failed transcription counts as no speech, never as text to score.
+    failed = set(state.get("asr_errors") or {}) | {p for p, t in transcripts.items() if is_asr_error(t)}
+    checks = {p: check("speaking", "" if p in failed else t) for p, t in transcripts.items()}
+    state["precheck"] = {p: {"features": f, "triage": v["reason"] if v else None} for p, (f, v) in checks.items()}
+    triaged = {p: _triaged_part(v) for p, (_, v) in checks.items() if v}
+    if len(triaged) == len(transcripts):
+        state["per_part"] = triaged
+        state["aggregated"] = _aggregate_scores(triaged)
+        return state
+    transcripts = {p: t for p, t in transcripts.items() if p not in triaged}
+
+    metrics = state.get("fluency_metrics", {}) or {}
+    prompt = _build_evaluation_prompt(transcripts, {
+        p: f"{feature_summary(checks[p][0])}; timing: {metrics_summary(metrics.get(p))}" for p in transcripts
+    })
+    log_prompt("llm.speaking_evaluate", prompt)
     logger.info("Calling Gemini model for evaluation...")
     model = genai.GenerativeModel(LLM_MODEL)
-    resp = model.generate_content(prompt)
+    start = time.perf_counter()
+    with span("llm.speaking_evaluate"):
+        resp = model.generate_content(prompt)
+    observe_call("speaking_evaluate", LLM_MODEL, time.perf_counter() - start, resp)
     raw_text = _extract_text_from_genai_response(resp)
     logger.debug("Raw LLM response (truncated): %s", raw_text[:800])
 
@@ -221,7 +305,10 @@ def evaluate_node(state: SpeakingState) -> SpeakingState:
                 "You are an IELTS Speaking examiner. Return ONLY JSON with keys: fluency, coherence, lexical_resource, grammar, pronunciation, feedback (object), band.\n"
                 f"Transcript: \"{txt}\""
             )
-            resp_p = model.generate_content(small_prompt)
+            start = time.perf_counter()
+            with span("llm.speaking_evaluate_part"):
+                resp_p = model.generate_content(small_prompt)
+            observe_call("speaking_evaluate_part", LLM_MODEL, time.perf_counter() - start, resp_p)
             raw_p = _extract_text_from_genai_response(resp_p)
             parsed_p = _extract_json(raw_p) or {}
             per_part_eval[p] = parsed_p
@@ -232,12 +319,34 @@ def evaluate_node(state: SpeakingState) -> SpeakingState:
     # Ensure aggregated is present
     if not aggregated and per_part_eval:
         aggregated = _aggregate_scores(per_part_eval)
+    local_fluency = _apply_local_fluency(per_part_eval, metrics) if SPEAKING_FLUENCY_MODE == "local" else False
+    if triaged:
+        per_part_eval.update(triaged)
+    if triaged or local_fluency:
+        aggregated = _aggregate_scores(per_part_eval)
 
     state["per_part"] = per_part_eval
     state["aggregated"] = aggregated
     return state
 
 
+def _apply_local_fluency(per_part_eval: Dict[str, Dict[str, Any]], metrics: Dict[str, Any]) -> bool:
+    """Replace the model's fluency sub-score with the timing-based one where timings exist."""
+    applied = False
+    for part, obj in per_part_eval.items():
+        band = fluency_band(metrics.get(part))
+        if band is not None and isinstance(obj, dict):
+            obj["fluency"] = band
+            obj["fluency_source"] = "timings"
+            applied = True
+    return applied
+
+
+def _triaged_part(verdict: Dict[str, Any]) -> Dict[str, Any]:
+    cats = ["fluency", "coherence", "lexical_resource", "grammar", "pronunciation"]
+    return {**{c: verdict["band"] for c in cats}, "feedback": verdict["feedback"], "band": verdict["band"], "triage": verdict["reason"]}
+
+
 def _aggregate_scores(per_part_eval: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
     cats = ["fluency", "coherence", "lexical_resource", "grammar", "pronunciation"]
     sums = {c: 0.0 for c in cats}
@@ -252,7 +361,7 @@ def _aggregate_scores(per_part_eval: Dict[str, Dict[str, Any]]) -> Dict[str, Any
     if n == 0:
         return {}
     avg = {c: round(sums[c] / n, 1) for c in cats}
-    band = _round_half(sum(avg[c] for c in cats) / len(cats))
+    band = round_band(sum(avg[c] for c in cats) / len(cats))
     return {**avg, "band": band}
 
 
@@ -266,6 +375,158 @@ graph.add_edge("evaluate", END)
 speaking_agent = graph.compile()
 
 
+# ---- Checkpointed runs ----
+def audio_fingerprint(src: Any) -> str:
+    """sha256 of a local recording's bytes; remote sources are identified by their URL."""
+    if isinstance(src, dict):
+        src = src.get("audio_url")
+    if isinstance(src, str) and os.path.isfile(src):
+        digest = hashlib.sha256()
+        with open(src, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    return hashlib.sha256(str(src).encode("utf-8")).hexdigest()
+
+
+def speaking_thread_id(user_id: str, test_id: str, responses: Dict[str, Any]) -> str:
+    parts = "|".join(f"{p}={audio_fingerprint(src)}" for p, src in sorted(responses.items()))
+    return hashlib.sha256(f"{user_id}|{test_id}|{parts}".encode("utf-8")).hexdigest()
+
+
+_checkpointed = None
+_checkpointed_pid = None
+_checkpointed_lock = threading.Lock()
+_last_prune = None
+_prune_lock = threading.Lock()
+
+
+def _checkpointed_agent():
+    """The speaking graph compiled with a SQLite checkpointer (one connection per process), or None."""
+    global _checkpointed, _checkpointed_pid
+    if not SPEAKING_CHECKPOINTS:
+        return None
+    with _checkpointed_lock:
+        if _checkpointed_pid != os.getpid():
+            try:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+            except ImportError:
+                logger.warning("langgraph-checkpoint-sqlite is not installed; speaking runs are not checkpointed")
+                _checkpointed, _checkpointed_pid = None, os.getpid()
+                return None
+            directory = os.path.dirname(SPEAKING_CHECKPOINT_DB)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # the saver serialises access with its own lock
+            conn = sqlite3.connect(SPEAKING_CHECKPOINT_DB, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            saver = SqliteSaver(conn)
+            saver.setup()
+            with saver.lock, conn:
+                # last use per thread, for the TTL; runs stored before this table existed start their TTL now
+                conn.execute("CREATE TABLE IF NOT EXISTS speaking_threads (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO speaking_threads SELECT DISTINCT thread_id, ? FROM checkpoints", (time.time(),))
+            _checkpointed = graph.compile(checkpointer=saver)
+            _checkpointed_pid = os.getpid()
+        return _checkpointed
+
+
+def _touch_thread(agent, thread_id: str):
+    saver = agent.checkpointer
+    with saver.lock, saver.conn:
+        saver.conn.execute(
+            "INSERT INTO speaking_threads (thread_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (thread_id, time.time()),
+        )
+    _maybe_prune(agent)
+
+
+def prune_checkpoints(agent=None, ttl_days: float = None) -> int:
+    """Delete checkpointed runs unused for ttl_days (default SPEAKING_CHECKPOINT_TTL_DAYS); returns how many."""
+    agent = agent or _checkpointed_agent()
+    if agent is None:
+        return 0
+    saver = agent.checkpointer
+    cutoff = time.time() - (SPEAKING_CHECKPOINT_TTL_DAYS if ttl_days is None else ttl_days) * 86400
+    with saver.lock:
+        expired = [r[0] for r in saver.conn.execute("SELECT thread_id FROM speaking_threads WHERE updated_at < ?", (cutoff,))]
+    for thread_id in expired:
+        saver.delete_thread(thread_id)
+        with saver.lock, saver.conn:
+            saver.conn.execute("DELETE FROM speaking_threads WHERE thread_id = ? AND updated_at < ?", (thread_id, cutoff))
+    if expired:
+        logger.info("Pruned %d speaking checkpoint threads older than %s days", len(expired), ttl_days or SPEAKING_CHECKPOINT_TTL_DAYS)
+    return len(expired)
+
+
+def _maybe_prune(agent):
+    global _last_prune
+    if SPEAKING_CHECKPOINT_TTL_DAYS <= 0:
+        return
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune is not None and now - _last_prune < SPEAKING_CHECKPOINT_PRUNE_INTERVAL_S:
+            return
+        _last_prune = now
+    try:
+        prune_checkpoints(agent)
+    except Exception:
+        logger.exception("Pruning speaking checkpoints failed")
+
+
+def run_speaking(state: SpeakingState) -> SpeakingState:
+    """
+    speaking_agent.invoke with checkpoints. A run that stopped part-way (e.g. the
+    evaluation LLM call failed) resumes at the node that failed; a finished run for
+    the same user, test and audio returns its stored result. A failed transcription
+    raises TranscriptionError and leaves the run resumable at the transcribe node.
+    """
+    agent = _checkpointed_agent()
+    if agent is None:
+        return speaking_agent.invoke(state)
+    thread_id = speaking_thread_id(state.get("user_id"), state.get("test_id"), state.get("responses") or {})
+    config = {
+        "configurable": {"thread_id": thread_id},
+        "metadata": {"user_id": state.get("user_id"), "test_id": state.get("test_id")},
+    }
+    _touch_thread(agent, thread_id)
+    snapshot = agent.get_state(config)
+    if snapshot.next:
+        logger.info("trace=%s Resuming speaking run at %s", get_trace_id(), list(snapshot.next))
+        agent.update_state(config, {"trace_id": state.get("trace_id"), "thread_id": thread_id})
+        return agent.invoke(None, config)
+    if snapshot.values.get("aggregated"):
+        logger.info("trace=%s Speaking run already evaluated; returning the checkpointed result", get_trace_id())
+        return {**snapshot.values, "thread_id": thread_id}
+    return agent.invoke({**state, "thread_id": thread_id}, config)
+
+
+def reevaluate_speaking(user_id: str, test_id: str, trace_id: Optional[str] = None) -> Optional[SpeakingState]:
+    """
+    Score a test's stored transcripts again (no audio, no ASR). Uses the latest
+    checkpointed run, which keeps word timings; returns None if there is none or
+    it never got past transcription.
+    """
+    agent = _checkpointed_agent()
+    if agent is None:
+        return None
+    latest = next(iter(agent.checkpointer.list(None, filter={"user_id": user_id, "test_id": test_id}, limit=1)), None)
+    if latest is None:
+        return None
+    config = {
+        "configurable": {"thread_id": latest.config["configurable"]["thread_id"]},
+        "metadata": {"user_id": user_id, "test_id": test_id},
+    }
+    if not agent.get_state(config).values.get("transcripts"):
+        return None
+    _touch_thread(agent, config["configurable"]["thread_id"])
+    # rewind to "transcripts done" and run the evaluate node again
+    agent.update_state(config, {"trace_id": trace_id or get_trace_id(), "thread_id": config["configurable"]["thread_id"]},
+                       as_node="transcribe")
+    return agent.invoke(None, config)
+
+
 # ---- Output formatter ----
 def format_output(state: SpeakingState) -> Dict[str, Any]:
     transcripts = state.get("transcripts", {})
@@ -302,5 +563,27 @@ def format_output(state: SpeakingState) -> Dict[str, Any]:
         "score": score_obj,
         "feedback": feedback_out,
         "per_part": per_part,
-        "aggregated": aggregated
+        "aggregated": aggregated,
+        "precheck": state.get("precheck", {}),
+        "fluency_metrics": state.get("fluency_metrics", {}),
+        "session_key": state.get("thread_id"),
     }
+
+
+# ---- Progressive (streaming) run ----
+def stream_speaking(state: SpeakingState):
+    """
+    Run transcribe + evaluate outside the compiled graph so callers see each part's
+    transcript as soon as it is ready. Yields (event, data) pairs:
+    transcript (one per part) -> scores (the format_output payload).
+    """
+    responses = state.get("responses", {}) or {}
+    for part, src in responses.items():
+        store_transcription(state, part, _safe_transcribe(src))
+        _raise_on_asr_errors(state)
+        yield "transcript", {
+            "part": part, "text": state["transcripts"][part], "fluency_metrics": state["fluency_metrics"][part]
+        }
+
+    state = evaluate_node(state)
+    yield "scores", format_output(state)
@@ -1,19 +1,21 @@
-from config import GOOGLE_API_KEY
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph,END
 from typing import TypedDict, List
 from agents.scoring_agent import combine_results,score_task
-from agents.feedback_agent import generate_feedback
+from agents.feedback_agent import generate_feedback, stream_feedback, parse_feedback_output
 from agents.improvement_agent import generate_improvements
+from services.telemetry_service import span, traced
+from services.linguistic_service import check, feature_summary, round_band
+from services.model_service import chat_model, WRITING_CRITERIA
+import logging
 
+logger = logging.getLogger(__name__)
 
 
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-image-preview",
-    api_key=GOOGLE_API_KEY
-)
+
+# question generation draws Task 1 charts, so this stage needs the image model
+llm = chat_model("question")
 state={
     "mode":"",
     "test_type":"",
@@ -94,38 +96,74 @@ task2_prompt=PromptTemplate(
 
 
 
-def evaluate_task(request):
-    # 1. Score
-    task1_result, task2_result = None, None
+def _precheck(request):
+    """Local features and triage verdict for each submitted task; runs before any LLM call."""
+    tasks = []
+    if request.task1_answer and (
+        (request.test_type == "academic" and request.task1_image) or request.test_type == "general training"
+    ):
+        tasks.append("task1")
+    if request.task2_answer and request.task2_question:
+        tasks.append("task2")
 
-    # --- Task 1 ---
-    if request.test_type == "academic" and request.task1_answer and request.task1_image:
-        task1_result = score_task("task1", request.test_type, request.task1_question, request.task1_answer, request.task1_image)
-    elif request.test_type == "general training" and request.task1_answer:
-        task1_result = score_task("task1", request.test_type, request.task1_question, request.task1_answer)
+    checks = {}
+    for task in tasks:
+        features, verdict = check("writing", getattr(request, f"{task}_answer"), getattr(request, f"{task}_question"), task)
+        checks[task] = {"features": features, "triage": verdict}
+    return checks
 
-    # --- Task 2 ---
-    if request.task2_answer and request.task2_question:
-        task2_result = score_task("task2", request.test_type, request.task2_question, request.task2_answer)
 
-    if not task1_result and not task2_result:
-        return {"error": "No valid tasks submitted"}
+def _iter_task_scores(request, checks):
+    """Yield (task, result) as each task is scored, so a stream can send task 1 before task 2 is done."""
+    for task, c in checks.items():
+        if c["triage"]:
+            # clearly unratable: deterministic band, no LLM call
+            yield task, {"band": c["triage"]["band"], "triage": c["triage"]["reason"]}
+            continue
+        image = request.task1_image if task == "task1" and request.test_type == "academic" else None
+        yield task, score_task(
+            task, request.test_type, getattr(request, f"{task}_question"), getattr(request, f"{task}_answer"), image,
+            features=feature_summary(c["features"])
+        )
 
-    
+
+def _score_tasks(request, checks):
+    results = dict(_iter_task_scores(request, checks))
+    return results.get("task1"), results.get("task2")
+
+
+def _final_result(task1_result, task2_result):
     if task1_result and task2_result:
-        final_result = combine_results(task1_result, task2_result)
+        if "triage" in task1_result or "triage" in task2_result:
+            # Task 2 counts double, as in combine_results
+            return {"band": round_band((task1_result["band"] + 2 * task2_result["band"]) / 3)}
+        return combine_results(task1_result, task2_result)
     elif task2_result:
-        final_result = task2_result
-    else:
-        final_result = task1_result
-    final_band = final_result["band"]
-    print("final score",final_band)
+        return task2_result
+    return task1_result
 
- 
 
+def _all_triaged(checks):
+    return bool(checks) and all(c["triage"] for c in checks.values())
 
-    
-    # 2. Feedback
+
+def _triage_feedback(checks):
+    """Deterministic feedback and improvements when no submitted task was ratable."""
+    feedback = " ".join(f"{task.replace('task', 'Task ')}: {c['triage']['feedback']}" for task, c in checks.items())
+    improvements = []
+    for c in checks.values():
+        improvements += [i for i in c["triage"]["improvements"] if i not in improvements]
+    return feedback, improvements
+
+
+def _precheck_summary(checks):
+    return {
+        task: {"features": c["features"], "triage": c["triage"]["reason"] if c["triage"] else None}
+        for task, c in checks.items()
+    }
+
+
+def _combined_question_answer(request):
     combined_question = ""
     combined_answer = ""
 
@@ -137,18 +175,113 @@ def evaluate_task(request):
         combined_question += f"Task 2 Question: {request.task2_question}\n"
         combined_answer += f"Task 2 Answer: {request.task2_answer}\n"
 
+    return combined_question, combined_answer
+
+
+@traced("writing.evaluate")
+def evaluate_task(request):
+    # 0. Local pre-check
+    checks = _precheck(request)
+
+    # 1. Score
+    task1_result, task2_result = _score_tasks(request, checks)
+
+    if not task1_result and not task2_result:
+        return {"error": "No valid tasks submitted"}
+
+    final_result = _final_result(task1_result, task2_result)
+    final_band = final_result["band"]
+    logger.debug("final score %s", final_band)
+
+    if _all_triaged(checks):
+        feedback, improvements = _triage_feedback(checks)
+        return {
+            "band": final_band,
+            "feedback": feedback,
+            "improvements": improvements,
+            "precheck": _precheck_summary(checks),
+            **_task_bands(task1_result, task2_result)
+        }
+
+    # 2. Feedback
+    combined_question, combined_answer = _combined_question_answer(request)
+
     # --- Feedback ---
     feedback_obj = generate_feedback(combined_question, combined_answer, final_band)
     feedback = feedback_obj.get("feedback", "")
-    print("feedback_combined",feedback)
+    logger.debug("feedback_combined %s", feedback)
 
     # 3. Improvements
     improvement_obj = generate_improvements(combined_question, combined_answer, feedback)
     improvements = improvement_obj.get("improvements", [])
-    print(improvements)
+    logger.debug("improvements %s", improvements)
 
     return {
         "band": final_band,
         "feedback": feedback,
-        "improvements": improvements
+        "improvements": improvements,
+        "precheck": _precheck_summary(checks),
+        **_task_bands(task1_result, task2_result)
+    }
+
+
+def _task_bands(task1_result, task2_result):
+    criteria = {
+        task: {c: result[c] for c in WRITING_CRITERIA if result.get(c) is not None}
+        for task, result in (("task1", task1_result), ("task2", task2_result)) if result
+    }
+    return {
+        "task1_band": task1_result.get("band") if task1_result else None,
+        "task2_band": task2_result.get("band") if task2_result else None,
+        "criteria": {task: scores for task, scores in criteria.items() if scores} or None,
+    }
+
+
+def evaluate_task_stream(request):
+    """
+    Same pipeline as evaluate_task, but yields (event, data) pairs as each stage completes:
+    precheck -> task1_band / task2_band -> band -> feedback_token (repeated) -> feedback -> improvements -> done.
+    """
+    # 0. Local pre-check
+    checks = _precheck(request)
+    yield "precheck", _precheck_summary(checks)
+
+    # 1. Score, sending each task's band as soon as it is known
+    results = {}
+    for task, result in _iter_task_scores(request, checks):
+        results[task] = result
+        if result:
+            yield f"{task}_band", result
+    task1_result, task2_result = results.get("task1"), results.get("task2")
+
+    if not task1_result and not task2_result:
+        yield "error", {"error": "No valid tasks submitted"}
+        return
+
+    final_band = _final_result(task1_result, task2_result)["band"]
+    yield "band", {"band": final_band}
+
+    if _all_triaged(checks):
+        feedback, improvements = _triage_feedback(checks)
+        yield "feedback", {"feedback": feedback}
+    else:
+        # 2. Feedback, token by token
+        combined_question, combined_answer = _combined_question_answer(request)
+        chunks = []
+        for text in stream_feedback(combined_question, combined_answer, final_band):
+            chunks.append(text)
+            yield "feedback_token", {"text": text}
+        feedback = parse_feedback_output("".join(chunks)).get("feedback", "")
+        yield "feedback", {"feedback": feedback}
+
+        # 3. Improvements
+        improvements = generate_improvements(combined_question, combined_answer, feedback).get("improvements", [])
+    yield "improvements", {"improvements": improvements}
+
+    yield "done", {
+        "band": final_band,
+        "feedback": feedback,
+        "improvements": improvements,
+        "precheck": _precheck_summary(checks),
+        **_task_bands(task1_result, task2_result)
     }
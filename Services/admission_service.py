@@ -0,0 +1,296 @@
+"""
+Admission control for the evaluation endpoints.
+
+Every evaluation takes a slot before it calls Whisper or Gemini:
+
+- rate limits: token buckets per user and per tenant (requests/minute, with that
+  many as burst); over the limit the request is rejected at once (429). Requests
+  without a user_id are keyed on the client address instead; requests without a
+  tenant_id are not subject to tenant limits, so clients that send neither never
+  share one bucket;
+- concurrency limits: at most ADMISSION_USER_CONCURRENCY running evaluations per
+  user, ADMISSION_TENANT_CONCURRENCY per tenant and ADMISSION_MAX_CONCURRENT in
+  total; beyond that the request waits in a queue (503 after ADMISSION_QUEUE_TIMEOUT_S).
+  Endpoints wait with acquire_async, which holds no thread while queued;
+- priority classes (ADMISSION_PRIORITIES, highest first, e.g. timed mock tests ahead
+  of practice): a free slot always goes to the highest class with an eligible request;
+- weighted fair queuing between users inside a class: each request gets a virtual
+  finish tag max(class virtual time, user's previous tag) + cost, and the smallest
+  eligible tag is served first, so a client that queues fifty requests only gets
+  every other slot when one more user shows up.
+
+A batch is admitted once: one rate-limit token and a fair-queue weight of its item
+count. Its items are then paced through concurrency slots in the lowest class with
+rate_limited=False, so a large batch waits for capacity instead of failing with 429s.
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import threading
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge, Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_USER_CONCURRENCY = int(os.getenv("ADMISSION_USER_CONCURRENCY", "2"))
+ADMISSION_TENANT_CONCURRENCY = int(os.getenv("ADMISSION_TENANT_CONCURRENCY", "6"))
+ADMISSION_USER_RATE_PER_MIN = float(os.getenv("ADMISSION_USER_RATE_PER_MIN", "10"))
+ADMISSION_TENANT_RATE_PER_MIN = float(os.getenv("ADMISSION_TENANT_RATE_PER_MIN", "120"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "120"))
+# Highest priority first; requests with an unknown or missing mode get the last class.
+ADMISSION_PRIORITIES = [p.strip() for p in os.getenv("ADMISSION_PRIORITIES", "mock,practice").split(",") if p.strip()]
+
+
+QUEUE_DELAY = Histogram(
+    "ielts_admission_queue_seconds",
+    "Time evaluations waited for an admission slot, by priority class",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+REJECTED = Counter("ielts_admission_rejected_total", "Evaluations refused by admission control", ["priority", "reason"])
+QUEUED = Gauge("ielts_admission_queued", "Evaluations waiting for a slot", ["priority"])
+RUNNING = Gauge("ielts_admission_running", "Evaluations holding a slot")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused; status_code 429 (rate/queue full) or 503 (waited too long)."""
+
+    def __init__(self, reason: str, message: str, status_code: int = 429, retry_after: float = 1.0):
+        super().__init__(message)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class Ticket:
+    __slots__ = ("user", "tenant", "priority", "cost", "tag", "enqueued_at", "granted", "released", "_future")
+
+    def __init__(self, user: Optional[str], tenant: Optional[str], priority: str, cost: float):
+        self.user, self.tenant, self.priority, self.cost = user, tenant, priority, cost
+        self.tag = 0.0
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.released = False
+        self._future: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = None
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+
+class _TokenBucket:
+    """Per-key token buckets: `rate_per_min` requests a minute with a burst of the same size."""
+
+    def __init__(self, rate_per_min: float):
+        self.capacity = rate_per_min
+        self.refill = rate_per_min / 60.0
+        self._state: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str, now: float) -> float:
+        """Consume one token; returns 0 on success, else seconds until one is available."""
+        if self.capacity <= 0:
+            return 0.0
+        tokens, last = self._state.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.refill)
+        if tokens < 1:
+            self._state[key] = (tokens, now)
+            return (1 - tokens) / self.refill
+        self._state[key] = (tokens - 1, now)
+        if len(self._state) > 10000:  # forget keys whose bucket has refilled
+            self._state = {k: v for k, v in self._state.items() if v[0] + (now - v[1]) * self.refill < self.capacity}
+        return 0.0
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+                 user_concurrency: int = ADMISSION_USER_CONCURRENCY,
+                 tenant_concurrency: int = ADMISSION_TENANT_CONCURRENCY,
+                 user_rate_per_min: float = ADMISSION_USER_RATE_PER_MIN,
+                 tenant_rate_per_min: float = ADMISSION_TENANT_RATE_PER_MIN,
+                 priorities: Optional[List[str]] = None,
+                 max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_S):
+        self.max_concurrent = max_concurrent
+        self.user_concurrency = user_concurrency
+        self.tenant_concurrency = tenant_concurrency
+        self.priorities = priorities or ADMISSION_PRIORITIES
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._user_rate = _TokenBucket(user_rate_per_min)
+        self._tenant_rate = _TokenBucket(tenant_rate_per_min)
+        self._cond = threading.Condition()
+        self._queues: Dict[str, list] = {p: [] for p in self.priorities}  # heap of (tag, seq, ticket)
+        self._virtual_time = {p: 0.0 for p in self.priorities}
+        self._last_tag: Dict[Tuple[str, str], float] = {}
+        self._seq = itertools.count()
+        self._running = 0
+        self._per_user: Dict[str, int] = {}
+        self._per_tenant: Dict[str, int] = {}
+
+    def priority_for(self, mode: Optional[str]) -> str:
+        mode = (mode or "").strip().lower()
+        return mode if mode in self._queues else self.priorities[-1]
+
+    # ---- scheduling (call with the lock held) ----
+    def _eligible(self, ticket: Ticket) -> bool:
+        return ((ticket.user is None or self._per_user.get(ticket.user, 0) < self.user_concurrency)
+                and (ticket.tenant is None or self._per_tenant.get(ticket.tenant, 0) < self.tenant_concurrency))
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        self._running += 1
+        for counts, key in ((self._per_user, ticket.user), (self._per_tenant, ticket.tenant)):
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+        self._virtual_time[ticket.priority] = max(self._virtual_time[ticket.priority], ticket.tag - ticket.cost)
+        QUEUE_DELAY.labels(priority=ticket.priority).observe(time.monotonic() - ticket.enqueued_at)
+        RUNNING.set(self._running)
+        if ticket._future:
+            loop, future = ticket._future
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _dispatch(self) -> bool:
+        granted = False
+        while self._running < self.max_concurrent:
+            for priority in self.priorities:
+                heap = self._queues[priority]
+                # smallest finish tag whose user and tenant still have room; a throttled
+                # user at the head does not block everyone behind them
+                entry = next((e for e in sorted(heap) if self._eligible(e[2])), None)
+                if entry:
+                    heap.remove(entry)
+                    heapq.heapify(heap)
+                    QUEUED.labels(priority=priority).set(len(heap))
+                    self._grant(entry[2])
+                    granted = True
+                    break
+            else:
+                break
+        return granted
+
+    def _release_counts(self, ticket: Ticket):
+        self._running -= 1
+        for counts, key in ((self._per_user, ticket.user), (self._per_tenant, ticket.tenant)):
+            if key is None:
+                continue
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+        RUNNING.set(self._running)
+
+    def _enqueue(self, user_id: Optional[str], tenant_id: Optional[str], mode: Optional[str], cost: float,
+                 client: Optional[str], rate_limited: bool = True) -> Ticket:
+        """Rate checks (unless rate_limited is False), then queue the ticket and dispatch (it may be granted at once). Lock held."""
+        user = user_id or (f"ip:{client}" if client else None)
+        priority = self.priority_for(mode)
+        ticket = Ticket(user, tenant_id or None, priority, cost)
+        now = time.monotonic()
+        for bucket, key, scope in ((self._user_rate, ticket.user, "user"), (self._tenant_rate, ticket.tenant, "tenant")):
+            wait = bucket.take(key, now) if key is not None and rate_limited else 0.0
+            if wait:
+                REJECTED.labels(priority=priority, reason=f"{scope}_rate").inc()
+                raise AdmissionRejected(f"{scope}_rate", f"Too many evaluations for this {scope}; retry in {wait:.0f}s",
+                                        429, wait)
+        if sum(len(q) for q in self._queues.values()) >= self.max_queue:
+            REJECTED.labels(priority=priority, reason="queue_full").inc()
+            raise AdmissionRejected("queue_full", "Evaluation queue is full; please retry shortly", 429, 5)
+
+        key = (priority, ticket.user)
+        ticket.tag = max(self._virtual_time[priority], self._last_tag.get(key, 0.0)) + cost
+        self._last_tag[key] = ticket.tag
+        if len(self._last_tag) > 10000:  # tags at or below virtual time carry no history
+            self._last_tag = {k: t for k, t in self._last_tag.items() if t > self._virtual_time[k[0]]}
+        heap = self._queues[priority]
+        heapq.heappush(heap, (ticket.tag, next(self._seq), ticket))
+        QUEUED.labels(priority=priority).set(len(heap))
+        if self._dispatch():
+            self._cond.notify_all()
+        return ticket
+
+    def _abandon(self, ticket: Ticket):
+        """Take a waiting ticket out of its queue (timeout or cancelled client). Lock held."""
+        heap = self._queues[ticket.priority]
+        heap[:] = [e for e in heap if e[2] is not ticket]
+        heapq.heapify(heap)
+        QUEUED.labels(priority=ticket.priority).set(len(heap))
+
+    def _timed_out(self, ticket: Ticket) -> AdmissionRejected:
+        self._abandon(ticket)
+        REJECTED.labels(priority=ticket.priority, reason="queue_timeout").inc()
+        return AdmissionRejected("queue_timeout", "Server busy; the evaluation could not start in time", 503, 10)
+
+    # ---- public API ----
+    def acquire(self, user_id: Optional[str], tenant_id: Optional[str] = None, mode: Optional[str] = None,
+                cost: float = 1.0, timeout: Optional[float] = None, client: Optional[str] = None,
+                rate_limited: bool = True) -> Ticket:
+        """
+        Block the calling thread until the request may run; raises AdmissionRejected.
+        For worker threads (batch items, with rate_limited=False once the batch itself
+        was admitted); endpoints use acquire_async. Pair with release().
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            ticket = self._enqueue(user_id, tenant_id, mode, cost, client, rate_limited)
+            if not self._cond.wait_for(lambda: ticket.granted, timeout):
+                raise self._timed_out(ticket)
+        return ticket
+
+    async def acquire_async(self, user_id: Optional[str], tenant_id: Optional[str] = None, mode: Optional[str] = None,
+                            cost: float = 1.0, timeout: Optional[float] = None, client: Optional[str] = None) -> Ticket:
+        """acquire() for the event loop: a queued request waits on a future, not on a threadpool thread."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            ticket = self._enqueue(user_id, tenant_id, mode, cost, client)
+            if ticket.granted:
+                return ticket
+            future = loop.create_future()
+            ticket._future = (loop, future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            with self._cond:
+                if not ticket.granted:
+                    raise self._timed_out(ticket)
+        except asyncio.CancelledError:
+            # client went away while queued: give the place (or a slot granted meanwhile) back
+            with self._cond:
+                if not ticket.granted:
+                    self._abandon(ticket)
+            if ticket.granted:
+                self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Free the ticket's slot; safe to call more than once."""
+        with self._cond:
+            if ticket.released or not ticket.granted:
+                return
+            ticket.released = True
+            self._release_counts(ticket)
+            self._dispatch()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "running": self._running,
+                "max_concurrent": self.max_concurrent,
+                "queued": {p: len(q) for p, q in self._queues.items()},
+                "running_per_tenant": dict(self._per_tenant),
+            }
+
+
+admission = AdmissionController()
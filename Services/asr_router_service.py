@@ -0,0 +1,209 @@
+"""
+Hybrid ASR routing (ASR_MODE=hybrid): each transcription goes to local Whisper or
+ElevenLabs, chosen per request from
+
+- the local queue: transcriptions waiting for or holding one of the
+  ASR_LOCAL_CONCURRENCY local slots, measured in seconds of audio;
+- recent latency: an EWMA of each backend's real-time factor (seconds of
+  processing per second of audio), seeded with ASR_*_RTF_PRIOR;
+- the audio duration.
+
+The predicted time is rtf * duration for the cloud, and for local rtf * (duration +
+queued audio / slots). Each backend has a circuit breaker: after
+ASR_BREAKER_FAILURES consecutive errors it opens and traffic fails over to the
+other backend; after ASR_BREAKER_RESET_S one probe request is let through
+(half-open) and a success closes it again. A request whose backend fails is
+retried once on the other one.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ASR_LOCAL_CONCURRENCY = int(os.getenv("ASR_LOCAL_CONCURRENCY", "1"))
+# Above this many local transcriptions (running + waiting) new ones go to the cloud outright.
+ASR_LOCAL_MAX_QUEUE = int(os.getenv("ASR_LOCAL_MAX_QUEUE", "4"))
+ASR_LOCAL_RTF_PRIOR = float(os.getenv("ASR_LOCAL_RTF_PRIOR", "0.3"))
+ASR_CLOUD_RTF_PRIOR = float(os.getenv("ASR_CLOUD_RTF_PRIOR", "0.2"))
+ASR_LATENCY_ALPHA = float(os.getenv("ASR_LATENCY_ALPHA", "0.2"))
+ASR_BREAKER_FAILURES = int(os.getenv("ASR_BREAKER_FAILURES", "3"))
+ASR_BREAKER_RESET_S = float(os.getenv("ASR_BREAKER_RESET_S", "30"))
+# Duration assumed when a file's length cannot be read.
+ASR_DEFAULT_DURATION_S = float(os.getenv("ASR_DEFAULT_DURATION_S", "30"))
+
+LOCAL, CLOUD = "local", "cloud"
+
+ROUTED = Counter("ielts_asr_routed_total", "Hybrid ASR routing decisions", ["backend", "reason"])
+FAILOVERS = Counter("ielts_asr_failovers_total", "Transcriptions retried on the other backend after an error", ["from_backend"])
+BREAKER_OPEN = Gauge("ielts_asr_breaker_open", "1 while the backend's circuit breaker is open", ["backend"])
+LOCAL_QUEUE = Gauge("ielts_asr_local_queue", "Local transcriptions running or waiting for a slot")
+
+
+class CircuitBreaker:
+    """closed -> (N consecutive failures) -> open -> (reset timeout) -> half-open -> closed/open."""
+
+    def __init__(self, name: str, failures: int = ASR_BREAKER_FAILURES, reset_s: float = ASR_BREAKER_RESET_S,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_s = reset_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self._opened_at >= self.reset_s else "open"
+
+    def available(self) -> bool:
+        """Would allow() let a request through (without claiming the half-open probe)."""
+        with self._lock:
+            state = self._state()
+            return state == "closed" or (state == "half_open" and not self._probing)
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures, self._opened_at, self._probing = 0, None, False
+        BREAKER_OPEN.labels(backend=self.name).set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning("ASR %s circuit breaker opened after %d failures", self.name, self._failures)
+                self._opened_at, self._probing = self._clock(), False
+                BREAKER_OPEN.labels(backend=self.name).set(1)
+
+
+class _LatencyEstimate:
+    def __init__(self, prior_rtf: float, alpha: float = ASR_LATENCY_ALPHA):
+        self.rtf = prior_rtf
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, duration: float):
+        with self._lock:
+            self.rtf += self.alpha * (seconds / max(duration, 1.0) - self.rtf)
+
+
+class ASRRouter:
+    def __init__(self, local: Callable[[Any], Dict[str, Any]], cloud: Callable[[Any], Dict[str, Any]],
+                 local_concurrency: int = ASR_LOCAL_CONCURRENCY, local_max_queue: int = ASR_LOCAL_MAX_QUEUE,
+                 local_rtf: float = ASR_LOCAL_RTF_PRIOR, cloud_rtf: float = ASR_CLOUD_RTF_PRIOR,
+                 breaker_failures: int = ASR_BREAKER_FAILURES, breaker_reset_s: float = ASR_BREAKER_RESET_S,
+                 clock: Callable[[], float] = time.monotonic):
+        self._backends = {LOCAL: local, CLOUD: cloud}
+        self.local_concurrency = local_concurrency
+        self.local_max_queue = local_max_queue
+        self._slots = threading.Semaphore(local_concurrency)
+        self._queue_lock = threading.Lock()
+        self._local_depth = 0
+        self._local_audio_s = 0.0
+        self.latency = {LOCAL: _LatencyEstimate(local_rtf), CLOUD: _LatencyEstimate(cloud_rtf)}
+        self.breakers = {
+            name: CircuitBreaker(name, breaker_failures, breaker_reset_s, clock) for name in (LOCAL, CLOUD)
+        }
+
+    # ---- routing ----
+    def predicted_seconds(self, backend: str, duration: float) -> float:
+        duration = max(duration, 1.0)
+        if backend == LOCAL:
+            return self.latency[LOCAL].rtf * (duration + self._local_audio_s / self.local_concurrency)
+        return self.latency[CLOUD].rtf * duration
+
+    def choose(self, duration: float) -> Tuple[str, str]:
+        """(backend, reason) for a clip of `duration` seconds."""
+        local_ok, cloud_ok = self.breakers[LOCAL].available(), self.breakers[CLOUD].available()
+        if not cloud_ok and not local_ok:
+            return LOCAL, "all_breakers_open"
+        if not cloud_ok:
+            return LOCAL, "cloud_breaker_open"
+        if not local_ok:
+            return CLOUD, "local_breaker_open"
+        if self._local_depth >= self.local_max_queue:
+            return CLOUD, "local_queue_full"
+        if self.predicted_seconds(CLOUD, duration) < self.predicted_seconds(LOCAL, duration):
+            return CLOUD, "faster"
+        return LOCAL, "faster"
+
+    # ---- execution ----
+    def _run_local(self, audio: Any, duration: float) -> Dict[str, Any]:
+        with self._queue_lock:
+            self._local_depth += 1
+            self._local_audio_s += duration
+            LOCAL_QUEUE.set(self._local_depth)
+        try:
+            with self._slots:
+                return self._timed(LOCAL, audio, duration)
+        finally:
+            with self._queue_lock:
+                self._local_depth -= 1
+                self._local_audio_s -= duration
+                LOCAL_QUEUE.set(self._local_depth)
+
+    def _timed(self, backend: str, audio: Any, duration: float) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = self._backends[backend](audio)
+        self.latency[backend].observe(time.perf_counter() - start, duration)
+        return result
+
+    def _attempt(self, backend: str, audio: Any, duration: float) -> Dict[str, Any]:
+        breaker = self.breakers[backend]
+        if not breaker.allow():
+            raise RuntimeError(f"ASR {backend} circuit breaker is open")
+        try:
+            result = self._run_local(audio, duration) if backend == LOCAL else self._timed(CLOUD, audio, duration)
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    def transcribe(self, audio: Any, duration: Optional[float] = None) -> Dict[str, Any]:
+        """Transcribe on the chosen backend, failing over to the other once; raises if both fail."""
+        duration = duration or ASR_DEFAULT_DURATION_S
+        backend, reason = self.choose(duration)
+        ROUTED.labels(backend=backend, reason=reason).inc()
+        try:
+            return self._attempt(backend, audio, duration)
+        except Exception as e:
+            fallback = CLOUD if backend == LOCAL else LOCAL
+            logger.warning("ASR %s failed (%s); failing over to %s", backend, e, fallback)
+            FAILOVERS.labels(from_backend=backend).inc()
+            return self._attempt(fallback, audio, duration)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "local_queue": self._local_depth,
+            "local_queued_audio_s": round(self._local_audio_s, 1),
+            "rtf": {name: round(est.rtf, 3) for name, est in self.latency.items()},
+            "breakers": {name: b.state for name, b in self.breakers.items()},
+        }
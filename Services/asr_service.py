@@ -1,23 +1,161 @@
+import io
 import os
+import wave
 import logging
+import threading
 import requests
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
+from services.telemetry_service import span
+from services.chunked_asr_service import transcribe_long
+from services.asr_router_service import ASR_LOCAL_CONCURRENCY, ASRRouter
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# "local" (Whisper), "cloud" (ElevenLabs) or "hybrid" (routed per request, see asr_router_service)
 ASR_MODE = os.getenv("ASR_MODE", "local")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ASR_MODEL_ID = os.getenv("ASR_MODEL_ID", "scribe_v1")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+ASR_CLOUD_TIMEOUT_S = float(os.getenv("ASR_CLOUD_TIMEOUT_S", "120"))
+# Word-level timings feed the fluency metrics; Whisper needs an extra alignment pass for them.
+ASR_WORD_TIMESTAMPS = os.getenv("ASR_WORD_TIMESTAMPS", "true").lower() == "true"
 
-# Load local Whisper model only if needed
+# Local model tuning. Backends: "whisper" (openai-whisper on torch) or "faster-whisper"
+# (CTranslate2, usually several times faster on CPU; falls back to whisper if not installed).
+ASR_BACKEND = os.getenv("ASR_BACKEND", "whisper")
+ASR_MODEL_SIZE = os.getenv("ASR_MODEL_SIZE", "base")
+ASR_INT8 = os.getenv("ASR_INT8", "false").lower() == "true"
+# 0 keeps the library default (torch: one intra-op thread per physical core)
+ASR_INTRA_OP_THREADS = int(os.getenv("ASR_INTRA_OP_THREADS", "0"))
+ASR_INTER_OP_THREADS = int(os.getenv("ASR_INTER_OP_THREADS", "0"))
+
+
+class LocalASRModel:
+    """A loaded local speech model; transcribe() returns {"text", "words"}."""
+
+    def __init__(self, model_size: str = ASR_MODEL_SIZE, backend: str = ASR_BACKEND, int8: bool = ASR_INT8,
+                 intra_threads: int = ASR_INTRA_OP_THREADS, inter_threads: int = ASR_INTER_OP_THREADS):
+        if backend == "faster-whisper":
+            try:
+                import faster_whisper  # noqa: F401
+            except ImportError:
+                logger.warning("faster-whisper is not installed; falling back to openai-whisper")
+                backend = "whisper"
+        self.model_size, self.backend, self.int8 = model_size, backend, int8
+        self.device = "cpu"
+        # Requests run on threadpool threads but share this one model. openai-whisper's
+        # decoder installs kv-cache hooks on the shared modules, so two decodes at once
+        # corrupt each other: one at a time. faster-whisper is thread-safe and takes up
+        # to ASR_LOCAL_CONCURRENCY.
+        self._decodes = threading.Semaphore(ASR_LOCAL_CONCURRENCY if backend == "faster-whisper" else 1)
+        logger.info("Loading %s %s model for local ASR (int8=%s, threads=%s/%s)...",
+                    backend, model_size, int8, intra_threads or "default", inter_threads or "default")
+        if backend == "faster-whisper":
+            self._load_faster_whisper(intra_threads, inter_threads)
+        else:
+            self._load_whisper(intra_threads, inter_threads)
+
+    def _load_whisper(self, intra_threads: int, inter_threads: int):
+        import torch
+        import whisper
+        if intra_threads:
+            torch.set_num_threads(intra_threads)
+        if inter_threads:
+            try:
+                torch.set_num_interop_threads(inter_threads)
+            except RuntimeError as e:  # only settable before the first parallel op
+                logger.warning("Could not set inter-op threads: %s", e)
+
+        device = "cpu" if self.int8 or not torch.cuda.is_available() else "cuda"
+        model = whisper.load_model(self.model_size, device=device)
+        if self.int8:
+            # whisper.model.Linear only adds a dtype cast for fp16; as a plain nn.Linear it
+            # matches quantize_dynamic's module mapping and gets int8 weights.
+            for module in model.modules():
+                if isinstance(module, torch.nn.Linear):
+                    module.__class__ = torch.nn.Linear
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._model = model
+        self.device = device
+        self._fp16 = device == "cuda"
+
+    def _load_faster_whisper(self, intra_threads: int, inter_threads: int):
+        from faster_whisper import WhisperModel
+        self._model = WhisperModel(
+            self.model_size,
+            device="cpu",
+            compute_type="int8" if self.int8 else "float32",
+            cpu_threads=intra_threads,
+            num_workers=max(inter_threads, 1),
+        )
+
+    def transcribe(self, audio_file, word_timestamps: bool = ASR_WORD_TIMESTAMPS) -> Dict[str, Any]:
+        """audio_file: a path, or 16 kHz mono float32 samples. Blocks while the model is busy."""
+        with self._decodes:
+            return self._transcribe(audio_file, word_timestamps)
+
+    def _transcribe(self, audio_file, word_timestamps: bool) -> Dict[str, Any]:
+        if self.backend == "faster-whisper":
+            segments, _ = self._model.transcribe(audio_file, word_timestamps=word_timestamps)
+            segments = list(segments)
+            return {
+                "text": "".join(s.text for s in segments),
+                "words": [
+                    {"word": w.word.strip(), "start": float(w.start), "end": float(w.end)}
+                    for s in segments for w in (s.words or [])
+                ],
+            }
+        result = self._model.transcribe(audio_file, word_timestamps=word_timestamps, fp16=self._fp16)
+        return {"text": result.get("text", ""), "words": _whisper_words(result)}
+
+
+def _whisper_words(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"word": w["word"].strip(), "start": float(w["start"]), "end": float(w["end"])}
+        for seg in result.get("segments", []) for w in seg.get("words", [])
+    ]
+
+
+def _elevenlabs_words(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"word": w["text"].strip(), "start": float(w["start"]), "end": float(w["end"])}
+        for w in result.get("words", []) if w.get("type", "word") == "word" and w.get("start") is not None
+    ]
+
+
+# Load local Whisper model only if needed. Under gunicorn with preload_app (see
+# gunicorn.conf.py) this runs once in the master and the workers fork from it.
 whisper_model = None
-if ASR_MODE == "local":
-    import whisper
-    logger.info("Loading Whisper base model for local ASR...")
-    whisper_model = whisper.load_model("base")
+if ASR_MODE in ("local", "hybrid"):
+    whisper_model = LocalASRModel()
+
+
+def after_fork(workers: int = 1):
+    """
+    Per-worker setup after forking from a master that preloaded the model. openai-whisper
+    weights are plain tensor storage and stay shared copy-on-write (inference never writes
+    them); only the torch thread pool is resized so N workers do not each claim every core.
+    CTranslate2 (faster-whisper) keeps worker threads that do not survive fork, so that
+    backend is reloaded per worker and does not share weights.
+    """
+    global whisper_model
+    if whisper_model is None:
+        return
+    if whisper_model.device != "cpu":
+        raise RuntimeError("Preload-then-fork needs the local ASR model on CPU; CUDA cannot be used after fork")
+    if whisper_model.backend == "faster-whisper":
+        logger.warning("faster-whisper cannot be shared across forked workers; loading a copy in pid %s", os.getpid())
+        whisper_model = LocalASRModel(whisper_model.model_size, whisper_model.backend, whisper_model.int8)
+        return
+    import torch
+    threads = ASR_INTRA_OP_THREADS or max(1, (os.cpu_count() or 1) // max(workers, 1))
+    torch.set_num_threads(threads)
+    logger.info("ASR worker %s shares the preloaded %s model (%d threads)", os.getpid(), whisper_model.model_size, threads)
+
 
 def transcribe_audio(audio_file: str) -> str:
     """
@@ -26,30 +164,127 @@ def transcribe_audio(audio_file: str) -> str:
     Modes:
     - local: Whisper
     - cloud: ElevenLabs ASR
+    - hybrid: either, per request (local queue depth, observed latency, circuit breakers)
+    """
+    return transcribe_audio_detailed(audio_file)["text"]
+
+
+def transcribe_audio_detailed(audio_file: str) -> Dict[str, Any]:
+    """
+    Like transcribe_audio, but returns {"text", "words"} where words is a list of
+    {"word", "start", "end"} (seconds) when the backend provides timings, else [].
+    On failure "text" holds the error message and "error" is set; callers that score
+    the text must check "error" rather than the wording.
     """
     try:
         if ASR_MODE == "local":
             logger.info("Using local Whisper ASR...")
-            result = whisper_model.transcribe(audio_file)
-            return result.get("text", "")
+            return _transcribe_local(audio_file)
 
         elif ASR_MODE == "cloud":
             logger.info("Using ElevenLabs Cloud ASR...")
-            url = "https://api.elevenlabs.io/v1/speech-to-text"
-            headers = {"xi-api-key": ELEVENLABS_API_KEY}
+            return _transcribe_cloud_source(audio_file)
 
-            with open(audio_file, "rb") as f:
-                files = {"file": f}
-                data = {"model_id": ASR_MODEL_ID}
-                response = requests.post(url, headers=headers, files=files, data=data)
+        elif ASR_MODE == "hybrid":
+            return asr_router.transcribe(audio_file, audio_duration(audio_file))
 
-            response.raise_for_status()
-            result = response.json()
-            return result.get("text", "")
+        else:
+            return _error_result("Error: Invalid ASR_MODE. Must be 'local', 'cloud' or 'hybrid'.", "invalid ASR_MODE")
+
+    except Exception as e:
+        logger.error(f"ASR Error: {e}")
+        return _error_result(f"Error in transcription: {e}", str(e))
+
+
+def transcribe_samples(samples, sample_rate: int = 16000) -> Dict[str, Any]:
+    """
+    Transcribe in-memory 16 kHz mono float32 samples (e.g. one window of a live
+    recording); same return shape and error handling as transcribe_audio_detailed.
+    """
+    try:
+        if ASR_MODE == "local":
+            return _transcribe_local(samples)
+
+        elif ASR_MODE == "cloud":
+            return _transcribe_cloud(wav_bytes(samples, sample_rate), "window.wav")
+
+        elif ASR_MODE == "hybrid":
+            return asr_router.transcribe(samples, len(samples) / sample_rate)
 
         else:
-            return "Error: Invalid ASR_MODE. Must be 'local' or 'cloud'."
+            return _error_result("Error: Invalid ASR_MODE. Must be 'local', 'cloud' or 'hybrid'.", "invalid ASR_MODE")
 
     except Exception as e:
         logger.error(f"ASR Error: {e}")
-        return f"Error in transcription: {e}"
+        return _error_result(f"Error in transcription: {e}", str(e))
+
+
+def _error_result(text: str, error: str) -> Dict[str, Any]:
+    return {"text": text, "words": [], "error": error}
+
+
+def _transcribe_local(audio) -> Dict[str, Any]:
+    """audio: a file path (long recordings are chunked) or 16 kHz mono float32 samples."""
+    with span("asr.local"):
+        if isinstance(audio, str):
+            try:
+                result = transcribe_long(audio, whisper_model)
+            except Exception as e:
+                logger.warning("Chunked transcription failed, decoding in one pass: %s", e)
+                result = None
+            if result:
+                return result
+        return whisper_model.transcribe(audio)
+
+
+def _transcribe_cloud_source(audio) -> Dict[str, Any]:
+    """audio: a file path or 16 kHz mono float32 samples."""
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            return _transcribe_cloud(f)
+    return _transcribe_cloud(wav_bytes(audio), "window.wav")
+
+
+def audio_duration(audio_file: str) -> Optional[float]:
+    """Length in seconds (WAV header, else a pydub decode); None if unreadable."""
+    try:
+        with wave.open(audio_file, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except Exception:
+        pass
+    try:
+        from pydub import AudioSegment
+        return AudioSegment.from_file(audio_file).duration_seconds
+    except Exception:
+        return None
+
+
+asr_router = ASRRouter(_transcribe_local, _transcribe_cloud_source) if ASR_MODE == "hybrid" else None
+
+
+def wav_bytes(samples, sample_rate: int = 16000) -> io.BytesIO:
+    """Encode float32 samples in [-1, 1] as a 16-bit mono WAV file in memory."""
+    import numpy as np
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    buf.seek(0)
+    return buf
+
+
+def _transcribe_cloud(f, filename: str = None) -> Dict[str, Any]:
+    url = f"{ELEVENLABS_BASE_URL}/v1/speech-to-text"
+    headers = {"xi-api-key": ELEVENLABS_API_KEY}
+
+    with span("asr.cloud"):
+        files = {"file": (filename, f) if filename else f}
+        data = {"model_id": ASR_MODEL_ID}
+        response = requests.post(url, headers=headers, files=files, data=data, timeout=ASR_CLOUD_TIMEOUT_S)
+
+    response.raise_for_status()
+    result = response.json()
+    return {"text": result.get("text", ""), "words": _elevenlabs_words(result)}
@@ -0,0 +1,298 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+AUDIO_DIR = os.getenv("AUDIO_DIR", "audio_files")
+AUDIO_DISK_QUOTA_MB = float(os.getenv("AUDIO_DISK_QUOTA_MB", "2048"))
+AUDIO_GC_INTERVAL_SECONDS = float(os.getenv("AUDIO_GC_INTERVAL_SECONDS", "300"))
+
+# Retention per kind of audio, in seconds since last write/use.
+AUDIO_RETENTION_SECONDS = {
+    "asr_upload": float(os.getenv("AUDIO_RETENTION_ASR_UPLOAD", str(60 * 60))),
+    "speaking_part": float(os.getenv("AUDIO_RETENTION_SPEAKING_PART", str(7 * 24 * 60 * 60))),
+    "tts": float(os.getenv("AUDIO_RETENTION_TTS", str(24 * 60 * 60))),
+}
+
+# Half-written files older than this are leftovers from crashed writers.
+_STALE_TMP_SECONDS = 60 * 60
+_EXT_RE = re.compile(r"^\.[a-z0-9]{1,5}$")
+
+AUDIO_BYTES_STORED = Gauge("ielts_audio_bytes_stored", "Bytes of audio currently on disk", ["kind"])
+AUDIO_BYTES_RECLAIMED = Counter("ielts_audio_bytes_reclaimed_total", "Bytes deleted by the audio GC", ["kind", "reason"])
+AUDIO_DEDUP_HITS = Counter("ielts_audio_dedup_hits_total", "Writes skipped because identical content was stored", ["kind"])
+
+
+def _safe_ext(filename: Optional[str], default: str = ".bin") -> str:
+    ext = os.path.splitext(os.path.basename(filename or ""))[1].lower()
+    return ext if _EXT_RE.match(ext) else default
+
+
+class AudioStore:
+    """
+    Content-addressed audio store:
+        <root>/<kind>/<sha256[:2]>/<sha256[2:4]>/<sha256><ext>
+
+    Identical uploads of the same kind are stored once. A background collector
+    deletes files past their kind's retention and then, if the disk quota is still
+    exceeded, the least recently used files first. Every worker process runs the
+    collector thread, but only the one holding <root>/.gc.lock collects; if it
+    exits, another worker takes the lock on its next tick.
+
+    The counters behind stats() live in <root>/.stats.db, so every worker reports
+    the totals of all workers sharing the store.
+    """
+
+    def __init__(self, root: str, retention: Dict[str, float], quota_bytes: int):
+        self.root = root
+        self.retention = retention
+        self.quota_bytes = quota_bytes
+        self._lock = threading.Lock()
+        self._gc_thread = None
+        self._gc_lock_file = None
+        self._stop = threading.Event()
+        self._stats_db = None
+        self._stats_pid = None
+        os.makedirs(root, exist_ok=True)
+
+    # ---- paths ----
+    def _path(self, kind: str, digest: str, ext: str) -> str:
+        if kind not in self.retention:
+            raise ValueError(f"Unknown audio kind: {kind}")
+        return os.path.join(self.root, kind, digest[:2], digest[2:4], digest + ext)
+
+    @staticmethod
+    def digest_of(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    # ---- writes ----
+    def put_bytes(self, kind: str, data: bytes, filename: Optional[str] = None) -> str:
+        """Store bytes once per content; returns the stored path."""
+        path = self._path(kind, self.digest_of(data), _safe_ext(filename))
+        if os.path.exists(path):
+            self._dedup_hit(kind, path)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        return self.commit(kind, tmp, path)
+
+    def path_for_key(self, kind: str, key: str, ext: str) -> Tuple[str, bool]:
+        """
+        Path for derived audio (e.g. TTS) addressed by a cache key instead of its bytes.
+        Returns (path, exists); callers write through temp_path_for() + commit().
+        """
+        path = self._path(kind, hashlib.sha256(key.encode("utf-8")).hexdigest(), ext)
+        if os.path.exists(path):
+            self._dedup_hit(kind, path)
+            return path, True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path, False
+
+    @staticmethod
+    def temp_path_for(path: str) -> str:
+        return f"{path}.{uuid.uuid4().hex}.tmp{os.path.splitext(path)[1]}"
+
+    def commit(self, kind: str, tmp_path: str, path: str) -> str:
+        """
+        Publish a finished temp file at path. Only the writer that creates the path
+        counts its bytes: a concurrent writer of the same content finds it taken
+        (hard links fail on an existing target) and is counted as a dedup hit.
+        """
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            os.remove(tmp_path)
+            self._dedup_hit(kind, path)
+            return path
+        except OSError:
+            # no hard links on this filesystem: last writer wins, bytes may be counted twice
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+        self._account_write(kind, os.path.getsize(path))
+        return path
+
+    def _dedup_hit(self, kind: str, path: str):
+        self.touch(path)
+        self._count({"dedup_hits": 1})
+        AUDIO_DEDUP_HITS.labels(kind=kind).inc()
+
+    def _account_write(self, kind: str, size: int):
+        stored = self._count({f"bytes_stored:{kind}": size})
+        AUDIO_BYTES_STORED.labels(kind=kind).set(stored[f"bytes_stored:{kind}"])
+
+    # ---- shared counters ----
+    def _stats_conn(self) -> sqlite3.Connection:
+        """This process's connection to the counters database (reopened after a fork); call with self._lock held."""
+        if self._stats_pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.root, ".stats.db"), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS audio_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._stats_db, self._stats_pid = conn, os.getpid()
+        return self._stats_db
+
+    def _count(self, deltas: Dict[str, int], absolute: bool = False) -> Dict[str, int]:
+        """Add deltas to (or, if absolute, overwrite) the shared counters; returns their new values."""
+        update = "excluded.value" if absolute else "value + excluded.value"
+        with self._lock:
+            conn = self._stats_conn()
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO audio_stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = {update}",
+                    deltas.items(),
+                )
+                names = list(deltas)
+                return dict(conn.execute(
+                    f"SELECT name, value FROM audio_stats WHERE name IN ({','.join('?' * len(names))})", names
+                ))
+
+    @staticmethod
+    def touch(path: str):
+        """Mark a file as recently used so retention and LRU eviction keep it."""
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            pass
+
+    # ---- garbage collection ----
+    def _scan(self):
+        """Yield (kind, path, size, mtime) for every stored file; removes stale temp files."""
+        now = time.time()
+        for kind in self.retention:
+            kind_dir = os.path.join(self.root, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for dirpath, _, filenames in os.walk(kind_dir):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if ".tmp" in name:
+                        if now - st.st_mtime > _STALE_TMP_SECONDS:
+                            self._remove(kind, path, st.st_size, "stale_tmp")
+                        continue
+                    yield kind, path, st.st_size, st.st_mtime
+
+    def _remove(self, kind: str, path: str, size: int, reason: str) -> int:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        AUDIO_BYTES_RECLAIMED.labels(kind=kind, reason=reason).inc(size)
+        self._count({"bytes_reclaimed": size, "files_reclaimed": 1})
+        return size
+
+    def collect(self) -> int:
+        """Enforce retention, then the disk quota (LRU first). Returns bytes reclaimed."""
+        now = time.time()
+        reclaimed = 0
+        survivors = []
+        for kind, path, size, mtime in self._scan():
+            if now - mtime > self.retention[kind]:
+                reclaimed += self._remove(kind, path, size, "retention")
+            else:
+                survivors.append((mtime, kind, path, size))
+
+        total = sum(s[3] for s in survivors)
+        if total > self.quota_bytes:
+            survivors.sort()
+            while survivors and total > self.quota_bytes:
+                _, kind, path, size = survivors.pop(0)
+                freed = self._remove(kind, path, size, "quota")
+                reclaimed += freed
+                total -= size
+
+        per_kind = {kind: 0 for kind in self.retention}
+        for _, kind, _, size in survivors:
+            per_kind[kind] += size
+        self._count({f"bytes_stored:{kind}": size for kind, size in per_kind.items()}, absolute=True)
+        for kind, size in per_kind.items():
+            AUDIO_BYTES_STORED.labels(kind=kind).set(size)
+
+        if reclaimed:
+            logger.info("Audio GC reclaimed %d bytes; %d bytes stored", reclaimed, sum(per_kind.values()))
+        return reclaimed
+
+    def _is_collector(self) -> bool:
+        """Take (or keep) the cross-process GC lock without blocking; True if this process holds it."""
+        if fcntl is None or self._gc_lock_file is not None:
+            return True
+        f = open(os.path.join(self.root, ".gc.lock"), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._gc_lock_file = f
+        logger.info("Audio GC runs in this process (pid %s)", os.getpid())
+        return True
+
+    def _gc_tick(self):
+        try:
+            if self._is_collector():
+                self.collect()
+        except Exception:
+            logger.exception("Audio GC failed")
+
+    def _gc_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self._gc_tick()
+
+    def start_gc(self, interval: float = AUDIO_GC_INTERVAL_SECONDS):
+        """Start the background collector (idempotent). Runs one pass immediately if this process holds the GC lock."""
+        if self._gc_thread and self._gc_thread.is_alive():
+            return
+        self._gc_tick()
+        self._stop.clear()
+        self._gc_thread = threading.Thread(target=self._gc_loop, args=(interval,), name="audio-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self):
+        """Stop the collector and hand the GC lock to another worker."""
+        self._stop.set()
+        if self._gc_thread:
+            self._gc_thread.join()
+            self._gc_thread = None
+        if self._gc_lock_file is not None:
+            self._gc_lock_file.close()
+            self._gc_lock_file = None
+
+    def stats(self) -> Dict[str, object]:
+        """Usage and GC counters of every worker sharing this store."""
+        with self._lock:
+            values = dict(self._stats_conn().execute("SELECT name, value FROM audio_stats"))
+        by_kind = {kind: values.get(f"bytes_stored:{kind}", 0) for kind in self.retention}
+        return {
+            "bytes_stored": sum(by_kind.values()),
+            "bytes_stored_by_kind": by_kind,
+            "bytes_reclaimed": values.get("bytes_reclaimed", 0),
+            "files_reclaimed": values.get("files_reclaimed", 0),
+            "dedup_hits": values.get("dedup_hits", 0),
+            "quota_bytes": self.quota_bytes,
+        }
+
+
+audio_store = AudioStore(AUDIO_DIR, AUDIO_RETENTION_SECONDS, int(AUDIO_DISK_QUOTA_MB * 1024 * 1024))
@@ -0,0 +1,181 @@
+"""
+Long-audio mode for local ASR.
+
+Recordings longer than ASR_LONG_AUDIO_SECONDS (e.g. 2-3 minute Part 2 monologues)
+are split on silences into chunks of at most ASR_CHUNK_SECONDS with a small
+overlap, transcribed in parallel by a pool of worker processes (each with its
+own model), and stitched back together. With word timings the seams are cut at
+the chunk boundary; without them the repeated words at the start of a chunk
+are matched against the end of the previous one and dropped.
+
+The mode is off by default (ASR_CHUNK_WORKERS=1). Chunk workers are spawned,
+not forked, so they do not share the weights gunicorn preloads: every server
+worker that transcribes long audio starts its own pool, and the deployment holds
+WEB_CONCURRENCY x ASR_CHUNK_WORKERS extra model copies. Measure it with
+`python -m Tests.benchmarks.memory_benchmark --modes preload chunked` before
+enabling it on a memory-bound host.
+"""
+import os
+import re
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from services.telemetry_service import span
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ASR_LONG_AUDIO_SECONDS = float(os.getenv("ASR_LONG_AUDIO_SECONDS", "45"))
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "30"))
+ASR_CHUNK_MIN_SECONDS = float(os.getenv("ASR_CHUNK_MIN_SECONDS", "10"))
+ASR_CHUNK_OVERLAP_SECONDS = float(os.getenv("ASR_CHUNK_OVERLAP_SECONDS", "0.5"))
+# Each worker holds its own model copy (per server worker); 1 disables the long-audio mode.
+ASR_CHUNK_WORKERS = int(os.getenv("ASR_CHUNK_WORKERS", "1"))
+
+SAMPLE_RATE = 16000
+_FRAME_SECONDS = 0.02
+_SILENCE_DB = -35.0          # frame energy relative to the loudest frame
+_MIN_SILENCE_SECONDS = 0.3
+_MAX_SEAM_WORDS = 12
+
+_TOKEN_RE = re.compile(r"[^\w']+")
+
+
+# ---- audio ----
+def load_pcm(path: str) -> np.ndarray:
+    """Decode any audio file to 16 kHz mono float32 in [-1, 1]."""
+    from pydub import AudioSegment
+    audio = AudioSegment.from_file(path).set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def silence_centers(samples: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Midpoints (seconds) of silent stretches of at least _MIN_SILENCE_SECONDS."""
+    frame = int(sr * _FRAME_SECONDS)
+    n = len(samples) // frame
+    if n == 0:
+        return np.empty(0)
+    energy = np.sqrt(np.mean(samples[: n * frame].reshape(n, frame) ** 2, axis=1))
+    db = 20 * np.log10(energy + 1e-10) - 20 * np.log10(energy.max() + 1e-10)
+    silent = np.r_[False, db < _SILENCE_DB, False].astype(np.int8)
+    edges = np.diff(silent)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    long_enough = (ends - starts) * _FRAME_SECONDS >= _MIN_SILENCE_SECONDS
+    return (starts[long_enough] + ends[long_enough]) / 2 * _FRAME_SECONDS
+
+
+def plan_chunks(duration: float, silences: np.ndarray, max_chunk: float = ASR_CHUNK_SECONDS,
+                min_chunk: float = ASR_CHUNK_MIN_SECONDS, overlap: float = ASR_CHUNK_OVERLAP_SECONDS
+                ) -> List[Tuple[float, float, float, float]]:
+    """
+    Chunks as (audio_start, audio_end, keep_from, keep_to) seconds. Boundaries sit on the
+    latest silence that keeps a chunk within max_chunk (hard cut if there is none); audio
+    extends `overlap` past each boundary, the keep window does not.
+    """
+    cuts, pos = [], 0.0
+    while duration - pos > max_chunk:
+        window = silences[(silences >= pos + min_chunk) & (silences <= pos + max_chunk)]
+        pos = float(window[-1]) if window.size else pos + max_chunk
+        cuts.append(pos)
+    bounds = [0.0] + cuts + [duration]
+    return [
+        (max(0.0, a - overlap), min(duration, b + overlap), a, b)
+        for a, b in zip(bounds, bounds[1:])
+    ]
+
+
+# ---- stitching ----
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.sub(" ", text.lower()).split() if t]
+
+
+def _merge_text(previous: str, current: str) -> str:
+    """Append current to previous, dropping the words the overlap made it repeat."""
+    prev_tokens, cur_words = _tokens(previous), current.split()
+    cur_tokens = [_TOKEN_RE.sub("", w.lower()) for w in cur_words]
+    for k in range(min(_MAX_SEAM_WORDS, len(prev_tokens), len(cur_tokens)), 0, -1):
+        if prev_tokens[-k:] == cur_tokens[:k]:
+            cur_words = cur_words[k:]
+            break
+    return " ".join(filter(None, [previous.strip(), " ".join(cur_words)]))
+
+
+def stitch(results: List[Dict[str, Any]], plan: List[Tuple[float, float, float, float]]) -> Dict[str, Any]:
+    """Join per-chunk {"text", "words"} (word times already absolute) into one transcript."""
+    if all(r["words"] for r in results if r["text"].strip()):
+        words = [
+            w for r, (_, _, keep_from, keep_to) in zip(results, plan) for w in r["words"]
+            if keep_from <= (w["start"] + w["end"]) / 2 < keep_to
+        ]
+        return {"text": " ".join(w["word"] for w in words), "words": words}
+    text = ""
+    for r in results:
+        text = _merge_text(text, r["text"])
+    return {"text": text, "words": []}
+
+
+# ---- worker pool ----
+_worker_model = None
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(model_size: str, backend: str, int8: bool, threads: int):
+    global _worker_model
+    os.environ["ASR_MODE"] = "cloud"  # importing asr_service must not load a second default model
+    from services.asr_service import LocalASRModel
+    _worker_model = LocalASRModel(model_size, backend, int8, intra_threads=threads, inter_threads=1)
+
+
+def _transcribe_chunk(samples: np.ndarray, offset: float) -> Dict[str, Any]:
+    result = _worker_model.transcribe(samples)
+    for w in result["words"]:
+        w["start"] += offset
+        w["end"] += offset
+    return result
+
+
+def _get_pool(model) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            threads = max(1, (os.cpu_count() or 1) // ASR_CHUNK_WORKERS)
+            logger.info("Starting %d ASR chunk workers (%d threads each)", ASR_CHUNK_WORKERS, threads)
+            _pool = ProcessPoolExecutor(
+                max_workers=ASR_CHUNK_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model.model_size, model.backend, model.int8, threads),
+            )
+        return _pool
+
+
+def transcribe_long(audio_file: str, model) -> Optional[Dict[str, Any]]:
+    """
+    Chunked parallel transcription, or None when the file is short enough for a single
+    decode (or the mode is disabled) and the caller should transcribe it directly.
+    """
+    if ASR_CHUNK_WORKERS < 2:
+        return None
+    samples = load_pcm(audio_file)
+    duration = len(samples) / SAMPLE_RATE
+    if duration <= ASR_LONG_AUDIO_SECONDS:
+        return None
+
+    plan = plan_chunks(duration, silence_centers(samples))
+    with span("asr.chunked"):
+        pool = _get_pool(model)
+        futures = [
+            pool.submit(_transcribe_chunk, samples[int(start * SAMPLE_RATE): int(end * SAMPLE_RATE)], start)
+            for start, end, _, _ in plan
+        ]
+        results = [f.result() for f in futures]
+    logger.info("Transcribed %.1fs of audio in %d chunks", duration, len(plan))
+    return stitch(results, plan)
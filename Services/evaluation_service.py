@@ -2,7 +2,7 @@ import json
 import os
 
 # Load rubrics
-RUBRICS_PATH = r"C:\IELTS_modules_app\data\prompts\rubrics\Band_descriptors.json"
+RUBRICS_PATH = os.getenv("RUBRICS_PATH", r"C:\IELTS_modules_app\data\prompts\rubrics\Band_descriptors.json")
 
 try:
     with open(RUBRICS_PATH, encoding="utf-8") as f:
@@ -0,0 +1,92 @@
+import os
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.linguistic_service import round_band
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Silent gaps between words at or above these lengths count as pauses / long pauses (seconds).
+PAUSE_THRESHOLD_S = float(os.getenv("PAUSE_THRESHOLD_S", "0.25"))
+LONG_PAUSE_THRESHOLD_S = float(os.getenv("LONG_PAUSE_THRESHOLD_S", "1.0"))
+
+FILLERS = np.array(["um", "umm", "uh", "uhm", "er", "erm", "ah", "eh", "hmm", "mm", "mhm"])
+
+# (metric value, band) anchors for the local fluency score, interpolated linearly and
+# clipped at the ends. Pause and filler rates are "lower is better", so bands descend.
+_BAND_ANCHORS = {
+    "speech_rate_wpm": ([60, 90, 110, 130, 150, 170], [3, 5, 6, 7, 8, 9]),
+    "mean_length_of_run": ([2, 4, 6, 8, 11, 14], [3, 5, 6, 7, 8, 9]),
+    "pauses_per_minute": ([4, 8, 12, 16, 22, 30], [9, 8, 7, 6, 5, 3]),
+    "fillers_per_100_words": ([0, 2, 4, 6, 9, 14], [9, 8, 7, 6, 5, 3]),
+}
+_BAND_WEIGHTS = {"speech_rate_wpm": 0.3, "mean_length_of_run": 0.3, "pauses_per_minute": 0.2, "fillers_per_100_words": 0.2}
+
+_PUNCT_RE = re.compile(r"[^\w']+")
+
+
+def fluency_metrics(words: List[Dict[str, Any]], duration: Optional[float] = None) -> Optional[Dict[str, float]]:
+    """
+    Temporal fluency measures from word timings ({"word", "start", "end"} in seconds):
+    speech and articulation rate, silent pauses, mean length of run and filler rate.
+    Returns None when there are no timings.
+    """
+    if not words:
+        return None
+    starts = np.fromiter((w["start"] for w in words), dtype=float, count=len(words))
+    ends = np.maximum(np.fromiter((w["end"] for w in words), dtype=float, count=len(words)), starts)
+    tokens = np.array([_PUNCT_RE.sub("", w["word"].lower()) for w in words])
+
+    n = len(words)
+    speaking_time = max(float(ends[-1] - starts[0]), 1e-6)
+    total_time = max(duration or 0.0, speaking_time)
+    gaps = np.clip(starts[1:] - ends[:-1], 0.0, None)
+    is_pause = gaps >= PAUSE_THRESHOLD_S
+    pause_count = int(is_pause.sum())
+    pause_time = float(gaps[is_pause].sum())
+    fillers = int(np.isin(tokens, FILLERS).sum())
+
+    return {
+        "words": n,
+        "speaking_time_s": round(speaking_time, 2),
+        "speech_rate_wpm": round(n / speaking_time * 60, 1),
+        "articulation_rate_wpm": round(n / max(speaking_time - pause_time, 1e-6) * 60, 1),
+        "pause_count": pause_count,
+        "long_pause_count": int((gaps >= LONG_PAUSE_THRESHOLD_S).sum()),
+        "pause_time_s": round(pause_time, 2),
+        "mean_pause_s": round(pause_time / pause_count, 2) if pause_count else 0.0,
+        "pauses_per_minute": round(pause_count / speaking_time * 60, 1),
+        "phonation_ratio": round((speaking_time - pause_time) / total_time, 3),
+        "mean_length_of_run": round(n / (pause_count + 1), 1),
+        "filler_count": fillers,
+        "fillers_per_100_words": round(fillers / n * 100, 1),
+    }
+
+
+def fluency_band(metrics: Optional[Dict[str, float]]) -> Optional[float]:
+    """Local fluency sub-score (0-9, step 0.5) from fluency_metrics(); None without timings."""
+    if not metrics:
+        return None
+    band = sum(
+        weight * float(np.interp(metrics[name], *_BAND_ANCHORS[name]))
+        for name, weight in _BAND_WEIGHTS.items()
+    )
+    return round_band(band)
+
+
+def metrics_summary(metrics: Optional[Dict[str, float]]) -> str:
+    """Compact line for the evaluation prompt."""
+    if not metrics:
+        return "no timings"
+    return (
+        f"{metrics['speech_rate_wpm']} words/min, {metrics['pause_count']} pauses"
+        f" ({metrics['long_pause_count']} over {LONG_PAUSE_THRESHOLD_S:g}s, mean {metrics['mean_pause_s']}s),"
+        f" mean length of run {metrics['mean_length_of_run']} words, {metrics['fillers_per_100_words']} fillers/100 words"
+    )
@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import atexit
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join("data", "ielts_history.db"))
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+HISTORY_FLUSH_INTERVAL_MS = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "250"))
+
+HISTORY_WRITES = Counter("ielts_history_writes_total", "Rows written to the history store", ["table"])
+HISTORY_DROPPED = Counter("ielts_history_dropped_total", "Records dropped (write queue full, or the record failed to write)",
+                          ["reason"])
+# On shutdown, wait this long for queued records to be written.
+HISTORY_CLOSE_TIMEOUT_S = float(os.getenv("HISTORY_CLOSE_TIMEOUT_S", "10"))
+HISTORY_BATCH_SECONDS = Histogram("ielts_history_batch_seconds", "Time to commit one batch of history writes")
+
+WRITING_CRITERIA = ("band", "task1_band", "task2_band")
+# per-task criteria, stored as score rows with part = "task1" / "task2"
+WRITING_TASK_CRITERIA = ("task_response", "coherence_cohesion", "lexical_resource", "grammatical_range_accuracy")
+SPEAKING_CRITERIA = ("band", "fluency", "coherence", "lexical_resource", "grammar", "pronunciation")
+
+# Each entry upgrades the schema by one version (PRAGMA user_version). Append only;
+# never edit a migration that has shipped.
+MIGRATIONS = [
+    # v1
+    """
+    CREATE TABLE IF NOT EXISTS writing_submissions (
+        id              INTEGER PRIMARY KEY,
+        user_id         TEXT,
+        test_id         TEXT,
+        test_type       TEXT,
+        task1_question  TEXT,
+        task1_answer    TEXT,
+        task2_question  TEXT,
+        task2_answer    TEXT,
+        content_key     TEXT,
+        band            REAL,
+        feedback        TEXT,
+        improvements    TEXT,   -- JSON list
+        usage           TEXT,   -- JSON token summary
+        created_at      REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_writing_user_time ON writing_submissions (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_writing_test ON writing_submissions (test_id);
+    CREATE INDEX IF NOT EXISTS idx_writing_content ON writing_submissions (content_key);
+
+    CREATE TABLE IF NOT EXISTS speaking_sessions (
+        id              INTEGER PRIMARY KEY,
+        user_id         TEXT,
+        test_id         TEXT,
+        transcripts     TEXT,   -- JSON {part: text}
+        band            REAL,
+        feedback        TEXT,   -- JSON {criterion: text}
+        per_part        TEXT,   -- JSON as returned by the speaking agent
+        usage           TEXT,
+        created_at      REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_speaking_user_time ON speaking_sessions (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_speaking_test ON speaking_sessions (test_id);
+
+    -- long format: one row per (session, criterion[, part]) so analytics can scan one criterion
+    CREATE TABLE IF NOT EXISTS scores (
+        id              INTEGER PRIMARY KEY,
+        user_id         TEXT,
+        test_id         TEXT,
+        module          TEXT NOT NULL,   -- writing | speaking
+        criterion       TEXT NOT NULL,
+        part            TEXT,
+        score           REAL,
+        created_at      REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_scores_user_criterion_time ON scores (user_id, module, criterion, created_at);
+    CREATE INDEX IF NOT EXISTS idx_scores_test ON scores (test_id);
+    """,
+    # v2: a speaking session is stored once per session_key (the checkpoint thread), so a
+    # checkpoint hit or a re-evaluation updates it instead of adding a duplicate
+    """
+    ALTER TABLE speaking_sessions ADD COLUMN session_key TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_speaking_session_key ON speaking_sessions (session_key);
+    ALTER TABLE scores ADD COLUMN session_key TEXT;
+    CREATE INDEX IF NOT EXISTS idx_scores_session_key ON scores (session_key);
+    """,
+]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _statements(script: str):
+    """Split a migration script into single statements (a ';' inside a literal does not end one)."""
+    statement = ""
+    for piece in script.split(";")[:-1]:
+        statement += piece + ";"
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+def migrate(conn: sqlite3.Connection):
+    """
+    Apply pending migrations in one transaction. BEGIN IMMEDIATE takes the write lock
+    before the version is read, so workers starting together migrate one at a time
+    and the later ones find nothing left to do. (executescript would commit after
+    every statement, leaving a half-applied version behind on failure.)
+    """
+    isolation_level, conn.isolation_level = conn.isolation_level, None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                logger.info("Migrating history store to schema v%d", target)
+                for statement in _statements(script):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def _as_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryStore:
+    """
+    Embedded SQLite (WAL) store for submissions, transcripts, scores and feedback.
+
+    record_* calls only enqueue; a background writer commits in batches, so the
+    request path never waits on disk. Reads use a per-thread connection and can run
+    concurrently with the writer thanks to WAL. close() (app shutdown, and atexit)
+    writes what is still queued. A batch that fails is retried one record at a time,
+    so only the bad record is lost.
+    """
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path
+        self._queue: "queue.Queue" = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_pid = None
+        self._start_lock = threading.Lock()
+        self._migrated = False
+        atexit.register(self.close)
+
+    # ---- connections ----
+    def _ensure_schema(self):
+        if self._migrated:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = _connect(self.path)
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+        self._migrated = True
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            self._ensure_schema()
+            conn = _connect(self.path)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---- writer ----
+    def _ensure_writer(self):
+        # (re)start after fork: threads do not survive into worker processes
+        if self._writer and self._writer.is_alive() and self._writer_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._writer and self._writer.is_alive() and self._writer_pid == os.getpid():
+                return
+            self._ensure_schema()
+            self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        interval = HISTORY_FLUSH_INTERVAL_MS / 1000.0
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + interval
+            while len(batch) < HISTORY_BATCH_SIZE and batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None          # close(): write what came before, then exit
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:
+                logger.warning("History batch of %d records failed (%s); retrying one by one", len(batch), e)
+                self._write_each(conn, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    def _write_each(self, conn: sqlite3.Connection, batch: List[Dict[str, Any]]):
+        for record in batch:
+            if record is None:
+                continue
+            try:
+                self._write_batch(conn, [record])
+            except Exception:
+                HISTORY_DROPPED.labels(reason="write_error").inc()
+                logger.exception("Dropping %s history record for user %s", record["kind"], record.get("user_id"))
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Dict[str, Any]]):
+        records = [r for r in batch if r is not None]
+        if not records:
+            return
+        start = time.perf_counter()
+        score_rows = 0
+        with conn:
+            for r in records:
+                if r["kind"] == "writing":
+                    conn.execute(
+                        "INSERT INTO writing_submissions (user_id, test_id, test_type, task1_question, task1_answer,"
+                        " task2_question, task2_answer, content_key, band, feedback, improvements, usage, created_at)"
+                        " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                        r["row"],
+                    )
+                    HISTORY_WRITES.labels(table="writing_submissions").inc()
+                    scores = [s + (None,) for s in r["scores"]]
+                else:
+                    # re-scoring a stored session replaces its scores; the session keeps its time
+                    conn.execute(
+                        "INSERT INTO speaking_sessions (user_id, test_id, transcripts, band, feedback, per_part, usage,"
+                        " created_at, session_key) VALUES (?,?,?,?,?,?,?,?,?)"
+                        " ON CONFLICT(session_key) DO UPDATE SET transcripts = excluded.transcripts,"
+                        " band = excluded.band, feedback = excluded.feedback, per_part = excluded.per_part,"
+                        " usage = excluded.usage",
+                        r["row"] + (r["session_key"],),
+                    )
+                    created_at = conn.execute(
+                        "SELECT created_at FROM speaking_sessions WHERE session_key = ?", (r["session_key"],)
+                    ).fetchone()[0]
+                    conn.execute("DELETE FROM scores WHERE session_key = ?", (r["session_key"],))
+                    HISTORY_WRITES.labels(table="speaking_sessions").inc()
+                    scores = [s[:6] + (created_at, r["session_key"]) for s in r["scores"]]
+                conn.executemany(
+                    "INSERT INTO scores (user_id, test_id, module, criterion, part, score, created_at, session_key)"
+                    " VALUES (?,?,?,?,?,?,?,?)",
+                    scores,
+                )
+                score_rows += len(scores)
+        HISTORY_WRITES.labels(table="scores").inc(score_rows)
+        HISTORY_BATCH_SECONDS.observe(time.perf_counter() - start)
+
+    def _enqueue(self, record: Dict[str, Any]):
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            HISTORY_DROPPED.labels(reason="queue_full").inc()
+            logger.warning("History queue full; dropping %s record", record["kind"])
+
+    def close(self, timeout: float = HISTORY_CLOSE_TIMEOUT_S):
+        """Write everything still queued and stop the writer (it restarts on the next record)."""
+        writer = self._writer
+        if not writer or not writer.is_alive() or self._writer_pid != os.getpid():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        writer.join(timeout)
+        if writer.is_alive():
+            logger.warning("History writer did not finish within %.0fs; %d records may be lost",
+                           timeout, self._queue.qsize())
+
+    # ---- record ----
+    def record_writing(self, submission: Dict[str, Any], result: Dict[str, Any], content_key: Optional[str] = None):
+        now = time.time()
+        user_id, test_id = submission.get("user_id"), submission.get("test_id")
+        row = (
+            user_id, test_id, submission.get("test_type"),
+            submission.get("task1_question"), submission.get("task1_answer"),
+            submission.get("task2_question"), submission.get("task2_answer"),
+            content_key, _as_float(result.get("band")), result.get("feedback"),
+            json.dumps(result.get("improvements", []), ensure_ascii=False),
+            json.dumps(result.get("usage"), ensure_ascii=False) if result.get("usage") else None,
+            now,
+        )
+        scores = [
+            (user_id, test_id, "writing", c, None, _as_float(result.get(c)), now)
+            for c in WRITING_CRITERIA if result.get(c) is not None
+        ]
+        for task, criteria in (result.get("criteria") or {}).items():
+            for c in WRITING_TASK_CRITERIA:
+                if (criteria or {}).get(c) is not None:
+                    scores.append((user_id, test_id, "writing", c, task, _as_float(criteria[c]), now))
+        self._enqueue({"kind": "writing", "user_id": user_id, "row": row, "scores": scores, "created_at": now})
+
+    def record_speaking(self, output: Dict[str, Any]):
+        """Store a scored session; recording the same session_key again updates it in place."""
+        now = time.time()
+        session_key = output.get("session_key") or uuid.uuid4().hex
+        user_id, test_id = output.get("user_id"), output.get("test_id")
+        score = output.get("score") or {}
+        row = (
+            user_id, test_id,
+            json.dumps(output.get("transcripts", {}), ensure_ascii=False),
+            _as_float(score.get("band")),
+            json.dumps(output.get("feedback", {}), ensure_ascii=False),
+            json.dumps(output.get("per_part", {}), ensure_ascii=False),
+            json.dumps(output.get("usage"), ensure_ascii=False) if output.get("usage") else None,
+            now,
+        )
+        scores = [
+            (user_id, test_id, "speaking", c, None, _as_float(score.get(c)), now)
+            for c in SPEAKING_CRITERIA if score.get(c) is not None
+        ]
+        for part, obj in (output.get("per_part") or {}).items():
+            for c in SPEAKING_CRITERIA:
+                if isinstance(obj, dict) and obj.get(c) is not None:
+                    scores.append((user_id, test_id, "speaking", c, part, _as_float(obj.get(c)), now))
+        self._enqueue({"kind": "speaking", "user_id": user_id, "row": row, "scores": scores, "created_at": now,
+                       "session_key": session_key})
+
+    # ---- queries ----
+    def user_history(self, user_id: str, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        conn = self._reader()
+        writing = conn.execute(
+            "SELECT id, test_id, test_type, band, feedback, improvements, created_at FROM writing_submissions"
+            " WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        speaking = conn.execute(
+            "SELECT id, test_id, session_key, transcripts, band, feedback, created_at FROM speaking_sessions"
+            " WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return {
+            "writing": [_decode(r, ("improvements",)) for r in writing],
+            "speaking": [_decode(r, ("transcripts", "feedback")) for r in speaking],
+        }
+
+    def test_result(self, user_id: str, test_id: str) -> Dict[str, Any]:
+        conn = self._reader()
+        writing = conn.execute(
+            "SELECT * FROM writing_submissions WHERE test_id = ? AND user_id = ? ORDER BY created_at DESC",
+            (test_id, user_id),
+        ).fetchall()
+        speaking = conn.execute(
+            "SELECT * FROM speaking_sessions WHERE test_id = ? AND user_id = ? ORDER BY created_at DESC",
+            (test_id, user_id),
+        ).fetchall()
+        return {
+            "writing": [_decode(r, ("improvements", "usage")) for r in writing],
+            "speaking": [_decode(r, ("transcripts", "feedback", "per_part", "usage")) for r in speaking],
+        }
+
+
+
+def _decode(row: sqlite3.Row, json_fields=()) -> Dict[str, Any]:
+    out = dict(row)
+    for f in json_fields:
+        if out.get(f):
+            out[f] = json.loads(out[f])
+    return out
+
+
+history_store = HistoryStore()
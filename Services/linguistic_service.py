@@ -0,0 +1,185 @@
+import os
+import re
+import math
+import logging
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from prometheus_client import Counter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# IELTS minimum lengths; shorter answers lose Task Achievement/Response marks.
+MIN_WORDS = {"task1": 150, "task2": 250}
+# Below these, an answer (or a speaking part) is not ratable and never reaches the LLM.
+TRIAGE_MIN_WORDS_WRITING = int(os.getenv("TRIAGE_MIN_WORDS_WRITING", "20"))
+TRIAGE_MIN_WORDS_SPEAKING = int(os.getenv("TRIAGE_MIN_WORDS_SPEAKING", "8"))
+# Share of the answer's word trigrams lifted from the question above which it counts as a copy.
+TRIAGE_COPY_RATIO = float(os.getenv("TRIAGE_COPY_RATIO", "0.8"))
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "true").lower() == "true"
+
+# Start of the "text" asr_service returns for a failed transcription. New results also carry
+# an "error" key (kept as SpeakingState.asr_errors); the prefixes catch transcripts stored
+# before that flag existed.
+ASR_ERROR_PREFIXES = ("Error in transcription:", "Error: Invalid ASR_MODE")
+
+TRIAGE_OUTCOMES = Counter(
+    "ielts_triage_total",
+    "Answers and transcripts checked before scoring, by module and outcome (passed or the rejection reason)",
+    ["module", "outcome"],
+)
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+_SENTENCE_RE = re.compile(r"[.!?]+(?:\s+|$)")
+
+# Frequent English function words: they make up ~40-50% of running English text
+# and almost none of any other language, which is enough to tell English apart.
+_EN_FUNCTION_WORDS = frozenset("""
+a about after all also an and any are as at be because been but by can could do does for from had
+has have he her his how i if in into is it its just like many may me more most much my no not of on
+one only or other our out over people so some such than that the their them then there these they
+this those to too up us very was we were what when which while who why will with would you your
+""".split())
+
+
+def round_band(x: float) -> float:
+    """
+    Nearest half band with halves rounded up (6.25 -> 6.5, 6.75 -> 7.0), as IELTS
+    reports overall bands; Python's round() would send 6.25 down to 6.0.
+    """
+    return math.floor(x * 2 + 0.5) / 2.0
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _content_words(words: List[str]) -> set:
+    return {w for w in words if len(w) > 2 and w not in _EN_FUNCTION_WORDS}
+
+
+def detect_language(words: List[str], text: str) -> str:
+    """'en', 'other', or 'unknown' (too little text to tell)."""
+    letters = [ch for ch in text if ch.isalpha()]
+    if letters and sum(1 for ch in letters if ch.isascii()) / len(letters) < 0.5:
+        return "other"
+    if len(words) < 5:
+        return "unknown"
+    ratio = sum(1 for w in words if w in _EN_FUNCTION_WORDS) / len(words)
+    return "en" if ratio >= 0.15 else "other"
+
+
+def extract_features(text: Optional[str], question: Optional[str] = None, task: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Cheap, deterministic text features of an answer or transcript: length against the
+    IELTS minimum, sentence-length stats, type-token ratio, language and question overlap.
+    """
+    text = text or ""
+    words = _words(text)
+    n = len(words)
+    sentences = [s for s in _SENTENCE_RE.split(text) if _words(s)]
+    lengths = [len(_words(s)) for s in sentences] or ([n] if n else [])
+    mean_len = sum(lengths) / len(lengths) if lengths else 0.0
+    sd_len = math.sqrt(sum((x - mean_len) ** 2 for x in lengths) / len(lengths)) if lengths else 0.0
+
+    features: Dict[str, Any] = {
+        "word_count": n,
+        "min_words": MIN_WORDS.get(task),
+        "sentence_count": len(sentences),
+        "mean_sentence_length": round(mean_len, 1),
+        "sentence_length_sd": round(sd_len, 1),
+        "type_token_ratio": round(len(set(words)) / n, 3) if n else 0.0,
+        "language": detect_language(words, text),
+        "question_overlap": None,
+        "copied_ratio": None,
+    }
+    if question:
+        q_words = _words(question)
+        q_content = _content_words(q_words)
+        if q_content:
+            features["question_overlap"] = round(len(q_content & set(words)) / len(q_content), 3)
+        answer_trigrams = list(zip(words, words[1:], words[2:]))
+        if answer_trigrams:
+            q_trigrams = set(zip(q_words, q_words[1:], q_words[2:]))
+            features["copied_ratio"] = round(sum(1 for t in answer_trigrams if t in q_trigrams) / len(answer_trigrams), 3)
+    return features
+
+
+def feature_summary(features: Dict[str, Any]) -> str:
+    """One-line summary of the features for the scoring prompt."""
+    parts = [f"{features['word_count']} words"]
+    if features.get("min_words"):
+        short = " - UNDER LENGTH" if features["word_count"] < features["min_words"] else ""
+        parts[0] += f" (minimum {features['min_words']}{short})"
+    parts.append(
+        f"{features['sentence_count']} sentences, mean {features['mean_sentence_length']} words"
+        f" (sd {features['sentence_length_sd']})"
+    )
+    parts.append(f"type-token ratio {features['type_token_ratio']}")
+    parts.append(f"language {features['language']}")
+    if features.get("question_overlap") is not None:
+        parts.append(f"uses {round(features['question_overlap'] * 100)}% of the question's key words")
+    if features.get("copied_ratio"):
+        parts.append(f"{round(features['copied_ratio'] * 100)}% of word sequences copied from the question")
+    return "; ".join(parts)
+
+
+_VERDICTS = {
+    "no_answer": (
+        0.0,
+        "No answer was given, so it could not be assessed.",
+        ["Give a complete answer to the question before submitting."],
+    ),
+    "not_english": (
+        0.0,
+        "The response is not in English, so it cannot be assessed against the IELTS band descriptors.",
+        ["Give your whole response in English."],
+    ),
+    "copied_question": (
+        1.0,
+        "The response mostly repeats the wording of the question; copied language is not assessed.",
+        ["Answer in your own words: paraphrase the question in one sentence, then develop your own ideas."],
+    ),
+    "too_short": (
+        1.0,
+        "The response is far too short to show the skills being assessed.",
+        ["Develop a full response with a clear position, supporting ideas and examples."],
+    ),
+}
+
+
+def triage(features: Dict[str, Any], min_words: int = TRIAGE_MIN_WORDS_WRITING) -> Optional[Dict[str, Any]]:
+    """
+    Verdict for clearly unratable input, or None when it should be scored normally.
+    The verdict carries a deterministic band, feedback and improvements.
+    """
+    if not TRIAGE_ENABLED:
+        return None
+    if features["word_count"] == 0:
+        reason = "no_answer"
+    elif features["language"] == "other":
+        reason = "not_english"
+    elif (features.get("copied_ratio") or 0) >= TRIAGE_COPY_RATIO:
+        reason = "copied_question"
+    elif features["word_count"] < min_words:
+        reason = "too_short"
+    else:
+        return None
+    band, feedback, improvements = _VERDICTS[reason]
+    return {"reason": reason, "band": band, "feedback": feedback, "improvements": list(improvements)}
+
+
+def is_asr_error(text: Optional[str]) -> bool:
+    return bool(text) and text.startswith(ASR_ERROR_PREFIXES)
+
+
+def check(module: str, text: Optional[str], question: Optional[str] = None, task: Optional[str] = None):
+    """extract_features + triage in one step, counted in ielts_triage_total. Returns (features, verdict)."""
+    features = extract_features(text, question, task)
+    min_words = TRIAGE_MIN_WORDS_SPEAKING if module == "speaking" else TRIAGE_MIN_WORDS_WRITING
+    verdict = triage(features, min_words)
+    TRIAGE_OUTCOMES.labels(module=module, outcome=verdict["reason"] if verdict else "passed").inc()
+    return features, verdict
@@ -0,0 +1,180 @@
+"""
+Which Gemini model each LLM stage uses, and what each model tier costs.
+
+Every stage has its own LLM_MODEL_<STAGE> variable, so text-only stages
+(combine, feedback, improvements) do not have to run on the image model that
+question generation needs.
+
+With SCORE_CASCADE=true a writing task is scored by the fast tier
+(LLM_MODEL_SCORE_FAST) first. It is re-scored by the strong tier
+(LLM_MODEL_SCORE_STRONG) only when the fast score is not trustworthy:
+- the four criterion scores spread more than CASCADE_MAX_SPREAD bands;
+- their mean lies within CASCADE_BOUNDARY_MARGIN of a half-band rounding point;
+- the reply could not be parsed.
+
+invoke() times every call and prices its tokens with MODEL_PRICES (USD per
+million tokens, overridable with LLM_PRICES='{"model": [input, output]}').
+tier_stats collects latency and cost per (stage, model).
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_google_genai import ChatGoogleGenerativeAI
+from prometheus_client import Counter, Histogram
+
+from config import GOOGLE_API_KEY
+from services.telemetry_service import span
+from services.token_service import record_usage
+from services.linguistic_service import round_band
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+STAGE_MODELS = {
+    "question": os.getenv("LLM_MODEL_QUESTION", "gemini-2.5-flash-image-preview"),
+    "score": os.getenv("LLM_MODEL_SCORE", "gemini-2.5-flash"),
+    "score_fast": os.getenv("LLM_MODEL_SCORE_FAST", "gemini-2.5-flash-lite"),
+    "score_strong": os.getenv("LLM_MODEL_SCORE_STRONG", "gemini-2.5-pro"),
+    "combine": os.getenv("LLM_MODEL_COMBINE", "gemini-2.5-flash-lite"),
+    "feedback": os.getenv("LLM_MODEL_FEEDBACK", "gemini-2.5-flash"),
+    "improvements": os.getenv("LLM_MODEL_IMPROVEMENTS", "gemini-2.5-flash-lite"),
+    "speaking": os.getenv("LLM_MODEL_SPEAKING", os.getenv("LLM_MODEL", "gemini-2.5-flash")),
+    "reading_explain": os.getenv("LLM_MODEL_READING", "gemini-2.5-flash"),
+}
+
+SCORE_CASCADE = os.getenv("SCORE_CASCADE", "false").lower() == "true"
+CASCADE_MAX_SPREAD = float(os.getenv("CASCADE_MAX_SPREAD", "1.0"))
+CASCADE_BOUNDARY_MARGIN = float(os.getenv("CASCADE_BOUNDARY_MARGIN", "0.125"))
+
+# USD per 1M tokens: (input, output). Text pricing; unknown models cost 0.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-image-preview": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+WRITING_CRITERIA = ("task_response", "coherence_cohesion", "lexical_resource", "grammatical_range_accuracy")
+
+LLM_CALL_SECONDS = Histogram(
+    "ielts_llm_call_seconds",
+    "LLM call latency by stage and model",
+    ["stage", "model"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+LLM_COST = Counter("ielts_llm_cost_usd_total", "Estimated LLM spend by stage and model", ["stage", "model"])
+ESCALATIONS = Counter("ielts_score_escalations_total", "Cascade scores re-run on the strong tier", ["reason"])
+
+
+def chat_model(stage: str) -> ChatGoogleGenerativeAI:
+    return ChatGoogleGenerativeAI(model=STAGE_MODELS[stage], api_key=GOOGLE_API_KEY)
+
+
+def model_name(llm: Any) -> str:
+    name = getattr(llm, "model", None) or getattr(llm, "model_name", None) or "unknown"
+    return name[len("models/"):] if name.startswith("models/") else name
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1e6
+
+
+class TierStats:
+    """Calls, latency, tokens and cost per (stage, model), plus cascade outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._cascade = {"scored": 0, "escalated": 0, "reasons": {}}
+
+    def observe(self, stage: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+        cost = cost_usd(model, prompt_tokens, completion_tokens)
+        LLM_CALL_SECONDS.labels(stage=stage, model=model).observe(seconds)
+        LLM_COST.labels(stage=stage, model=model).inc(cost)
+        with self._lock:
+            entry = self._tiers.setdefault((stage, model), {
+                "calls": 0, "seconds": 0.0, "max_seconds": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            })
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += cost
+
+    def cascade_outcome(self, reason: Optional[str]):
+        if reason:
+            ESCALATIONS.labels(reason=reason).inc()
+        with self._lock:
+            self._cascade["scored"] += 1
+            if reason:
+                self._cascade["escalated"] += 1
+                self._cascade["reasons"][reason] = self._cascade["reasons"].get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = [
+                {
+                    "stage": stage, "model": model, "calls": e["calls"],
+                    "mean_latency_s": round(e["seconds"] / e["calls"], 3),
+                    "max_latency_s": round(e["max_seconds"], 3),
+                    "prompt_tokens": e["prompt_tokens"], "completion_tokens": e["completion_tokens"],
+                    "cost_usd": round(e["cost_usd"], 6),
+                    "cost_per_call_usd": round(e["cost_usd"] / e["calls"], 6),
+                }
+                for (stage, model), e in sorted(self._tiers.items())
+            ]
+            cascade = {**self._cascade, "reasons": dict(self._cascade["reasons"])}
+        cascade["escalation_rate"] = round(cascade["escalated"] / cascade["scored"], 3) if cascade["scored"] else 0.0
+        return {"models": dict(STAGE_MODELS), "cascade_enabled": SCORE_CASCADE, "cascade": cascade, "tiers": tiers}
+
+    def reset(self):
+        with self._lock:
+            self._tiers.clear()
+            self._cascade = {"scored": 0, "escalated": 0, "reasons": {}}
+
+
+tier_stats = TierStats()
+
+
+def observe_call(stage: str, model: str, seconds: float, response: Any):
+    """Record usage and per-tier latency/cost of a call made outside invoke() (e.g. google.generativeai)."""
+    prompt_tokens, completion_tokens = record_usage(stage, response)
+    tier_stats.observe(stage, model, seconds, prompt_tokens, completion_tokens)
+
+
+def invoke(llm: Any, stage: str, prompt: Any, span_name: Optional[str] = None):
+    """llm.invoke(prompt) under a telemetry span, with token usage and per-tier latency/cost recorded."""
+    start = time.perf_counter()
+    with span(span_name or f"llm.{stage}"):
+        response = llm.invoke(prompt)
+    observe_call(stage, model_name(llm), time.perf_counter() - start, response)
+    return response
+
+
+def escalation_reason(result: Optional[Dict[str, Any]],
+                      criteria: Iterable[str] = WRITING_CRITERIA) -> Optional[str]:
+    """Why a fast-tier score should be re-scored by the strong tier, or None to keep it."""
+    if not isinstance(result, dict):
+        return "unparseable"
+    try:
+        scores = [float(result[c]) for c in criteria]
+    except (KeyError, TypeError, ValueError):
+        return "missing_criteria"
+    if max(scores) - min(scores) > CASCADE_MAX_SPREAD:
+        return "criteria_disagree"
+    mean = sum(scores) / len(scores)
+    # the overall band is round_band(mean), which flips at x.25 and x.75
+    if 0.25 - abs(mean - round_band(mean)) < CASCADE_BOUNDARY_MARGIN:
+        return "near_boundary"
+    return None
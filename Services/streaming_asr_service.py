@@ -0,0 +1,164 @@
+"""
+Incremental transcription of live audio.
+
+Audio arrives as raw PCM frames while the candidate is still speaking. Once
+ASR_STREAM_WINDOW_SECONDS of untranscribed audio has built up, the buffer is cut at
+its last silence and that window goes to the ASR backend on a worker thread, so
+by the time the part ends only the final few seconds remain to transcribe.
+
+A part is capped at ASR_STREAM_MAX_PART_SECONDS of audio (and the matching number
+of bytes at the declared sample rate); feed() raises StreamLimitExceeded beyond it.
+The WebSocket handler also caps the whole session at ASR_STREAM_MAX_SESSION_SECONDS.
+A window whose transcription fails is left out of the text and fails the part.
+
+With ASR_MODE=local every window goes to the one in-process model, which decodes one
+request at a time (see LocalASRModel), so windows are transcribed by a single worker
+unless ASR_STREAM_WORKERS says otherwise; cloud and hybrid mode default to 4.
+"""
+import os
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.asr_service import ASR_MODE, transcribe_samples, wav_bytes
+from services.chunked_asr_service import SAMPLE_RATE, silence_centers
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ASR_STREAM_WINDOW_SECONDS = float(os.getenv("ASR_STREAM_WINDOW_SECONDS", "8"))
+ASR_STREAM_WORKERS = int(os.getenv("ASR_STREAM_WORKERS", "1" if ASR_MODE == "local" else "4"))
+ASR_STREAM_MAX_PART_SECONDS = float(os.getenv("ASR_STREAM_MAX_PART_SECONDS", "300"))
+ASR_STREAM_MAX_SESSION_SECONDS = float(os.getenv("ASR_STREAM_MAX_SESSION_SECONDS", "900"))
+ASR_STREAM_SAMPLE_RATES = (8000, 48000)      # accepted range of client sample rates
+
+# Never cut a window shorter than this (Whisper needs context); cut without a
+# silence once the buffer reaches twice the window.
+_MIN_WINDOW_SECONDS = 3.0
+
+_executor = ThreadPoolExecutor(max_workers=ASR_STREAM_WORKERS, thread_name_prefix="asr-stream")
+
+
+class StreamLimitExceeded(ValueError):
+    """More audio than a part (or what is left of the session) may hold."""
+
+
+def _resample(samples: np.ndarray, rate: int) -> np.ndarray:
+    if rate == SAMPLE_RATE or not len(samples):
+        return samples
+    n = int(round(len(samples) * SAMPLE_RATE / rate))
+    return np.interp(np.linspace(0, len(samples) - 1, n), np.arange(len(samples)), samples).astype(np.float32)
+
+
+class IncrementalTranscriber:
+    """Transcribes one part of a live recording in silence-aligned windows."""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, window_seconds: float = ASR_STREAM_WINDOW_SECONDS,
+                 transcribe: Callable[[np.ndarray], Dict[str, Any]] = transcribe_samples,
+                 max_seconds: float = ASR_STREAM_MAX_PART_SECONDS):
+        if not ASR_STREAM_SAMPLE_RATES[0] <= sample_rate <= ASR_STREAM_SAMPLE_RATES[1]:
+            raise ValueError(f"sample_rate must be between {ASR_STREAM_SAMPLE_RATES[0]} and {ASR_STREAM_SAMPLE_RATES[1]}")
+        self.sample_rate = sample_rate
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.max_seconds = max_seconds
+        self.max_bytes = int(max_seconds * sample_rate) * 2
+        self._transcribe = transcribe
+        self._bytes = 0
+        self._leftover = b""
+        self._received: List[np.ndarray] = []
+        self._pending: List[np.ndarray] = []    # joined only when a window may be cut
+        self._pending_len = 0
+        self._committed = 0                      # samples already handed to ASR
+        self._windows: List[Future] = []
+        self._reported = 0
+
+    @property
+    def duration(self) -> float:
+        return (self._committed + self._pending_len) / SAMPLE_RATE
+
+    def feed(self, pcm: bytes):
+        """
+        Add little-endian 16-bit mono PCM; starts transcribing a window when one is ready.
+        Raises StreamLimitExceeded once the part exceeds max_seconds.
+        """
+        self._bytes += len(pcm)
+        if self._bytes > self.max_bytes:
+            raise StreamLimitExceeded(f"Audio for this part exceeds {self.max_seconds:g} seconds")
+        data = self._leftover + pcm
+        usable = len(data) - len(data) % 2
+        self._leftover = data[usable:]
+        samples = _resample(np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0, self.sample_rate)
+        self._received.append(samples)
+        self._pending.append(samples)
+        self._pending_len += len(samples)
+
+        if self._pending_len < self.window:
+            return
+        pending = self._joined_pending()
+        silences = silence_centers(pending)
+        silences = silences[silences >= _MIN_WINDOW_SECONDS]
+        if silences.size:
+            self._submit(int(silences[-1] * SAMPLE_RATE))
+        elif self._pending_len >= 2 * self.window:
+            self._submit(self.window)
+
+    def _joined_pending(self) -> np.ndarray:
+        if len(self._pending) != 1:
+            self._pending = [np.concatenate(self._pending) if self._pending else np.empty(0, dtype=np.float32)]
+        return self._pending[0]
+
+    def _submit(self, n: int):
+        pending = self._joined_pending()
+        window, rest = pending[:n], pending[n:]
+        self._pending, self._pending_len = [rest], len(rest)
+        offset = self._committed / SAMPLE_RATE
+        self._committed += n
+        self._windows.append(_executor.submit(self._run, window, offset))
+
+    def _run(self, window: np.ndarray, offset: float) -> Dict[str, Any]:
+        result = self._transcribe(window)
+        for w in result.get("words", []):
+            w["start"] += offset
+            w["end"] += offset
+        return result
+
+    def partials(self) -> List[Dict[str, Any]]:
+        """Windows finished since the last call, in order (stops at the first still running); failed ones are skipped."""
+        ready = []
+        while self._reported < len(self._windows) and self._windows[self._reported].done():
+            result = self._windows[self._reported].result()
+            if not result.get("error"):
+                ready.append(result)
+            self._reported += 1
+        return ready
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Transcribe what is left and return the whole part as {"text", "words"} (blocks).
+        Failed windows never reach the text; if any failed the result also carries "error",
+        so the part is treated as a failed transcription rather than scored incomplete.
+        """
+        if self._pending_len:
+            self._submit(self._pending_len)
+        results = [f.result() for f in self._windows]
+        ok = [r for r in results if not r.get("error")]
+        out = {
+            "text": " ".join(r["text"].strip() for r in ok if r["text"].strip()),
+            "words": [w for r in ok for w in r.get("words", [])],
+        }
+        errors = [r["error"] for r in results if r.get("error")]
+        if errors:
+            logger.warning("%d of %d live windows failed to transcribe: %s", len(errors), len(results), errors[0])
+            out["error"] = f"{len(errors)} of {len(results)} audio windows failed to transcribe: {errors[0]}"
+        return out
+
+    def audio(self) -> Optional[bytes]:
+        """The whole part as a 16 kHz WAV file, for the audio store."""
+        if not self._received:
+            return None
+        return wav_bytes(np.concatenate(self._received)).getvalue()
@@ -0,0 +1,104 @@
+import os
+import time
+import uuid
+import random
+import logging
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Prompt dumps are off by default; when on, only a sample of calls is logged.
+LOG_PROMPTS = os.getenv("LOG_PROMPTS", "false").lower() == "true"
+PROMPT_LOG_SAMPLE_RATE = float(os.getenv("PROMPT_LOG_SAMPLE_RATE", "0.01"))
+
+TRACE_HEADER = "X-Trace-Id"
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_DURATION = Histogram(
+    "ielts_stage_duration_seconds",
+    "Duration of agent calls, graph nodes, ASR/TTS calls and uploads",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "ielts_stage_errors_total",
+    "Stages that raised an exception",
+    ["stage"],
+)
+HTTP_DURATION = Histogram(
+    "ielts_http_request_duration_seconds",
+    "End-to-end HTTP request duration (until the handler returns)",
+    ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS = Counter(
+    "ielts_http_requests_total",
+    "HTTP requests by route and status code",
+    ["method", "route", "status"],
+)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]):
+    """Bind a trace id to the current context; returns a token for reset_trace_id."""
+    return _trace_id.set(trace_id or new_trace_id())
+
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block, record it under ielts_stage_duration_seconds{stage=...} and count failures."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.labels(stage=stage).observe(elapsed)
+        logger.debug("trace=%s stage=%s duration_ms=%.1f", get_trace_id(), stage, elapsed * 1000)
+
+
+def traced(stage: str):
+    """Decorator form of span() for plain functions (e.g. LangGraph nodes)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def log_prompt(stage: str, prompt: str):
+    """Log a prompt only when LOG_PROMPTS is enabled, and then only for a sample of calls."""
+    if LOG_PROMPTS and random.random() < PROMPT_LOG_SAMPLE_RATE:
+        logger.info("trace=%s stage=%s prompt=%s", get_trace_id(), stage, prompt)
+
+
+def metrics_payload():
+    """Prometheus exposition body and content type for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
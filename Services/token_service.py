@@ -0,0 +1,217 @@
+import os
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Per-field input limits (estimated tokens). Above the limit the text is truncated;
+# above limit * TOKEN_REJECT_FACTOR (or always, with TOKEN_BUDGET_POLICY=reject) it is rejected.
+# For a writing task the question counts against the same limit as its answer.
+TOKEN_BUDGETS = {
+    "writing": int(os.getenv("MAX_INPUT_TOKENS_WRITING", "1500")),
+    "speaking": int(os.getenv("MAX_INPUT_TOKENS_SPEAKING", "2000")),
+}
+TOKEN_BUDGET_POLICY = os.getenv("TOKEN_BUDGET_POLICY", "truncate")
+TOKEN_REJECT_FACTOR = float(os.getenv("TOKEN_REJECT_FACTOR", "4"))
+# Users kept in the in-memory usage ledger; the least recently active are dropped first.
+TOKEN_LEDGER_MAX_USERS = int(os.getenv("TOKEN_LEDGER_MAX_USERS", "10000"))
+
+LLM_TOKENS = Counter(
+    "ielts_llm_tokens_total",
+    "Tokens reported by the LLM, by endpoint, stage and kind (prompt/completion)",
+    ["endpoint", "stage", "kind"],
+)
+REQUEST_TOKENS = Histogram(
+    "ielts_request_tokens",
+    "Total LLM tokens spent per request",
+    ["endpoint"],
+    buckets=(500, 1000, 2500, 5000, 10000, 20000, 40000, 80000),
+)
+INPUT_TRUNCATIONS = Counter(
+    "ielts_input_truncations_total",
+    "Inputs shortened or rejected by the token budget",
+    ["endpoint", "action"],
+)
+
+
+class TokenBudgetExceeded(ValueError):
+    pass
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap tokenizer-free estimate (~4 characters per token for English)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """
+    Keep the head and tail of the text on word boundaries (about 2/3 head, 1/3 tail):
+    introductions and conclusions carry the position an examiner scores.
+    """
+    words = text.split()
+    # words average ~1.3 tokens; solve for how many words fit
+    keep = max(1, int(max_tokens / 1.3))
+    if len(words) <= keep:
+        return text
+    head = words[: keep * 2 // 3]
+    tail = words[len(words) - (keep - len(head)):]
+    omitted = len(words) - len(head) - len(tail)
+    return " ".join(head) + f" [... {omitted} words omitted ...] " + " ".join(tail)
+
+
+def enforce_budget(text: Optional[str], endpoint: str, reserved: int = 0) -> Optional[str]:
+    """
+    Apply the endpoint's input budget to one field, less `reserved` tokens already
+    taken by other input (e.g. the question); raises TokenBudgetExceeded on rejection.
+    """
+    if not text:
+        return text
+    limit = TOKEN_BUDGETS.get(endpoint)
+    tokens = estimate_tokens(text)
+    if not limit or tokens + reserved <= limit:
+        return text
+    if reserved >= limit:
+        INPUT_TRUNCATIONS.labels(endpoint=endpoint, action="rejected").inc()
+        raise TokenBudgetExceeded(f"Question of ~{reserved} tokens exceeds the {endpoint} limit of {limit} tokens")
+    limit -= reserved
+    if TOKEN_BUDGET_POLICY == "reject" or tokens > limit * TOKEN_REJECT_FACTOR:
+        INPUT_TRUNCATIONS.labels(endpoint=endpoint, action="rejected").inc()
+        raise TokenBudgetExceeded(
+            f"Input of ~{tokens} tokens exceeds the {endpoint} limit of {limit} tokens"
+        )
+    INPUT_TRUNCATIONS.labels(endpoint=endpoint, action="truncated").inc()
+    logger.info("Truncating %s input from ~%d to %d tokens", endpoint, tokens, limit)
+    return truncate_to_budget(text, limit)
+
+
+def enforce_task_budget(question: Optional[str], answer: Optional[str], endpoint: str) -> Optional[str]:
+    """
+    Apply the budget to a question and its answer together and return the answer.
+    The question is never shortened (that would change the task): it is rejected
+    when it alone is over the limit, otherwise only the answer gives way.
+    """
+    return enforce_budget(answer, endpoint, reserved=estimate_tokens(question))
+
+
+def fit_to_budget(text: Optional[str], endpoint: str) -> Optional[str]:
+    """Like enforce_budget but never rejects; for inputs already paid for upstream (e.g. ASR transcripts)."""
+    limit = TOKEN_BUDGETS.get(endpoint)
+    if not text or not limit or estimate_tokens(text) <= limit:
+        return text
+    INPUT_TRUNCATIONS.labels(endpoint=endpoint, action="truncated").inc()
+    return truncate_to_budget(text, limit)
+
+
+# ---- Usage accounting ----
+class RequestUsage:
+    def __init__(self, endpoint: str, user_id: Optional[str] = None):
+        self.endpoint = endpoint
+        self.user_id = user_id
+        self.stages: Dict[str, Dict[str, int]] = {}
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int):
+        entry = self.stages.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+
+    def summary(self) -> Dict[str, Any]:
+        prompt = sum(s["prompt_tokens"] for s in self.stages.values())
+        completion = sum(s["completion_tokens"] for s in self.stages.values())
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "stages": self.stages,
+        }
+
+
+_current_usage: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("request_usage", default=None)
+
+# user_id -> endpoint -> {"prompt_tokens", "completion_tokens", "requests"}, least recently active first
+_user_ledger: "OrderedDict[str, Dict[str, Dict[str, int]]]" = OrderedDict()
+_ledger_lock = threading.Lock()
+
+
+def finish_request(usage: RequestUsage):
+    """Publish a finished request's usage to metrics and the per-user ledger."""
+    summary = usage.summary()
+    REQUEST_TOKENS.labels(endpoint=usage.endpoint).observe(summary["total_tokens"])
+    user_id = usage.user_id or "anonymous"
+    with _ledger_lock:
+        entry = _user_ledger.setdefault(user_id, {}).setdefault(
+            usage.endpoint, {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0}
+        )
+        entry["prompt_tokens"] += summary["prompt_tokens"]
+        entry["completion_tokens"] += summary["completion_tokens"]
+        entry["requests"] += 1
+        _user_ledger.move_to_end(user_id)
+        while len(_user_ledger) > TOKEN_LEDGER_MAX_USERS:
+            _user_ledger.popitem(last=False)
+
+
+@contextmanager
+def track_request(endpoint: str, user_id: Optional[str] = None):
+    """Collect token usage of every LLM call made inside the block and attribute it to the user."""
+    usage = RequestUsage(endpoint, user_id)
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        finish_request(usage)
+
+
+def iter_with_usage(usage: RequestUsage, iterator):
+    """
+    Drive a generator with usage bound on every step. Streaming responses resume the
+    generator from a fresh context copy each time, so a contextvar set once would be lost.
+    """
+    while True:
+        token = _current_usage.set(usage)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current_usage.reset(token)
+        yield item
+
+
+def _usage_counts(response: Any):
+    """(prompt, completion) from a LangChain message or a google.generativeai response."""
+    meta = getattr(response, "usage_metadata", None)
+    if not meta:
+        return 0, 0
+    if isinstance(meta, dict):
+        return int(meta.get("input_tokens", 0) or 0), int(meta.get("output_tokens", 0) or 0)
+    return int(getattr(meta, "prompt_token_count", 0) or 0), int(getattr(meta, "candidates_token_count", 0) or 0)
+
+
+def record_usage(stage: str, response: Any) -> Tuple[int, int]:
+    """Count tokens of one LLM response (or streamed chunk) against the current request; returns them."""
+    prompt_tokens, completion_tokens = _usage_counts(response)
+    if not prompt_tokens and not completion_tokens:
+        return 0, 0
+    usage = _current_usage.get()
+    endpoint = usage.endpoint if usage else "unattributed"
+    LLM_TOKENS.labels(endpoint=endpoint, stage=stage, kind="prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(endpoint=endpoint, stage=stage, kind="completion").inc(completion_tokens)
+    if usage:
+        usage.add(stage, prompt_tokens, completion_tokens)
+    return prompt_tokens, completion_tokens
+
+
+def user_token_usage(user_id: str) -> Dict[str, Dict[str, int]]:
+    with _ledger_lock:
+        return {endpoint: dict(v) for endpoint, v in _user_ledger.get(user_id, {}).items()}
@@ -1,7 +1,9 @@
 import os
 import logging
+import threading
 import requests
 from dotenv import load_dotenv
+from services.telemetry_service import span
 
 load_dotenv()
 
@@ -11,6 +13,11 @@ logging.basicConfig(level=logging.INFO)
 TTS_MODE = os.getenv("TTS_MODE", "local")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+
+# pyttsx3 drives one process-wide driver loop and is not thread-safe; requests reach
+# speak_text from threadpool threads, so local synthesis runs one at a time.
+_local_engine_lock = threading.Lock()
 
 def speak_text(text: str, output_file: str = "output.mp3") -> str:
     """
@@ -24,9 +31,10 @@ def speak_text(text: str, output_file: str = "output.mp3") -> str:
         if TTS_MODE == "local":
             logger.info("Using local pyttsx3 TTS...")
             import pyttsx3
-            engine = pyttsx3.init()
-            engine.save_to_file(text, output_file)
-            engine.runAndWait()
+            with span("tts.local"), _local_engine_lock:
+                engine = pyttsx3.init()
+                engine.save_to_file(text, output_file)
+                engine.runAndWait()
             return output_file
 
         elif TTS_MODE == "cloud":
@@ -34,13 +42,14 @@ def speak_text(text: str, output_file: str = "output.mp3") -> str:
             if not ELEVENLABS_VOICE_ID:
                 raise ValueError("ELEVENLABS_VOICE_ID not set in environment")
 
-            url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+            url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
             headers = {
                 "xi-api-key": ELEVENLABS_API_KEY,
                 "Content-Type": "application/json"
             }
             payload = {"text": text}
-            response = requests.post(url, headers=headers, json=payload)
+            with span("tts.cloud"):
+                response = requests.post(url, headers=headers, json=payload)
             response.raise_for_status()
 
             with open(output_file, "wb") as f:
@@ -0,0 +1,288 @@
+"""
+Local retrieval index of scored writing exemplars and band-descriptor snippets.
+
+Texts are embedded with a hashed TF-IDF vectoriser (word unigrams + bigrams,
+sublinear tf, L2-normalised; CPU only, no model download) and searched with an
+IVF index: k-means centroids partition the vectors, a query scans only the
+VECTOR_NPROBE closest lists. Every array is a .npy file opened with mmap_mode="r",
+so loading the index at startup costs a few milliseconds whatever its size.
+
+Build or rebuild it from the exemplar JSONL and the rubric file:
+    python -m services.vector_db_service --exemplars data/exemplars/writing_exemplars.jsonl
+"""
+import os
+import re
+import json
+import math
+import time
+import zlib
+import argparse
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join("data", "vector_index"))
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "4096"))
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "4"))
+RETRIEVAL_EXEMPLARS = int(os.getenv("RETRIEVAL_EXEMPLARS", "3"))
+EXEMPLAR_EXCERPT_WORDS = int(os.getenv("EXEMPLAR_EXCERPT_WORDS", "120"))
+# Lowest descriptor levels always sent, whatever bands the nearest exemplars have:
+# retrieval is by topic, so an off-topic or junk essay can land among band 7-9 exemplars.
+RETRIEVAL_FLOOR_LEVELS = int(os.getenv("RETRIEVAL_FLOOR_LEVELS", "2"))
+
+KIND_EXEMPLAR, KIND_DESCRIPTOR = 0, 1
+TASK_KEYS = ("task1_academic", "task1_general_training", "task2")
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+_BAND_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def task_key(task_type: str, test_type: Optional[str] = None) -> str:
+    if task_type == "task1":
+        return f"task1_{(test_type or '').lower().replace(' ', '_')}"
+    return task_type
+
+
+# ---- vectoriser ----
+def _features(text: str) -> Counter:
+    tokens = _TOKEN_RE.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return Counter(zlib.crc32(g.encode("utf-8")) % VECTOR_DIM for g in grams)
+
+
+def _tf_matrix(texts: List[str]) -> np.ndarray:
+    matrix = np.zeros((len(texts), VECTOR_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        counts = _features(text)
+        if counts:
+            idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            matrix[i, idx] = 1.0 + np.log(tf)
+    return matrix
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine); returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalise(centroids)
+    return centroids
+
+
+# ---- build ----
+def build_index(documents: List[Dict[str, Any]], out_dir: str = VECTOR_INDEX_DIR, nlist: Optional[int] = None) -> str:
+    """
+    documents: {"kind": KIND_*, "task": one of TASK_KEYS, "band": float, "text": str,
+    "excerpt": str (what goes into the prompt), "criterion": str (descriptors only)}.
+    """
+    if not documents:
+        raise ValueError("No documents to index")
+    tf = _tf_matrix([d["text"] for d in documents])
+    df = (tf > 0).sum(axis=0)
+    idf = (np.log((1 + len(documents)) / (1 + df)) + 1.0).astype(np.float32)
+    vectors = _normalise(tf * idf)
+
+    nlist = nlist or max(1, int(math.sqrt(len(documents))))
+    centroids = _kmeans(vectors, min(nlist, len(documents)))
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")            # inverted lists stored contiguously
+    offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64)
+
+    docs = [documents[i] for i in order]
+    payloads = [json.dumps({k: d.get(k) for k in ("excerpt", "criterion")}, ensure_ascii=False).encode("utf-8") for d in docs]
+    text_offsets = np.zeros(len(payloads) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(p) for p in payloads])
+
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        "vectors": vectors[order].astype(np.float32),
+        "centroids": centroids.astype(np.float32),
+        "list_offsets": offsets,
+        "idf": idf,
+        "kind": np.array([d["kind"] for d in docs], dtype=np.int8),
+        "task": np.array([TASK_KEYS.index(d["task"]) for d in docs], dtype=np.int8),
+        "band": np.array([d["band"] for d in docs], dtype=np.float32),
+        "text_offsets": text_offsets,
+        "texts": np.frombuffer(b"".join(payloads), dtype=np.uint8),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"documents": len(docs), "dim": VECTOR_DIM, "nlist": int(len(centroids)), "built_at": time.time()}, f)
+    logger.info("Vector index built: %d documents, %d lists -> %s", len(docs), len(centroids), out_dir)
+    return out_dir
+
+
+def rubric_documents(rubrics: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """One descriptor snippet per (task, criterion, band) of the band-descriptor JSON."""
+    sections = {"task2": rubrics.get("task2", {})}
+    for test_type, section in (rubrics.get("task1") or {}).items():
+        sections[f"task1_{test_type}"] = section
+    for key, criteria in sections.items():
+        if key not in TASK_KEYS:
+            continue
+        for criterion, levels in (criteria or {}).items():
+            if not isinstance(levels, dict):
+                continue
+            for band, text in levels.items():
+                match = _BAND_RE.search(str(band))
+                if not match:
+                    continue
+                text = text if isinstance(text, str) else json.dumps(text, ensure_ascii=False)
+                yield {"kind": KIND_DESCRIPTOR, "task": key, "band": float(match.group()), "criterion": criterion,
+                       "text": text, "excerpt": text}
+
+
+def exemplar_documents(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            e = json.loads(line)
+            words = e["answer"].split()
+            excerpt = " ".join(words[:EXEMPLAR_EXCERPT_WORDS]) + (" ..." if len(words) > EXEMPLAR_EXCERPT_WORDS else "")
+            yield {"kind": KIND_EXEMPLAR, "task": task_key(e["task"], e.get("test_type")), "band": float(e["band"]),
+                   "text": e["answer"], "excerpt": excerpt}
+
+
+# ---- query ----
+class VectorIndex:
+    def __init__(self, index_dir: str):
+        load = lambda name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")  # noqa: E731
+        self.vectors = load("vectors")
+        self.centroids = load("centroids")
+        self.list_offsets = load("list_offsets")
+        self.idf = load("idf")
+        self.kind = load("kind")
+        self.task = load("task")
+        self.band = load("band")
+        self.text_offsets = load("text_offsets")
+        self.texts = load("texts")
+
+    @classmethod
+    def load_if_exists(cls, index_dir: str = VECTOR_INDEX_DIR) -> Optional["VectorIndex"]:
+        manifest_path = os.path.join(index_dir, "manifest.json")
+        if not os.path.exists(manifest_path):
+            logger.info("No vector index at %s; scoring prompts will use the full rubric", index_dir)
+            return None
+        with open(manifest_path, encoding="utf-8") as f:
+            dim = json.load(f).get("dim")
+        if dim != VECTOR_DIM:
+            # queries hash into VECTOR_DIM buckets; a mismatch would break every search
+            logger.warning("Vector index at %s was built with dim=%s but VECTOR_DIM=%d; rebuild it. "
+                           "Scoring prompts will use the full rubric", index_dir, dim, VECTOR_DIM)
+            return None
+        start = time.perf_counter()
+        index = cls(index_dir)
+        logger.info("Vector index loaded in %.1f ms (%d documents)", (time.perf_counter() - start) * 1000, len(index.kind))
+        return index
+
+    def embed(self, text: str) -> np.ndarray:
+        return _normalise(_tf_matrix([text]) * self.idf)[0]
+
+    def _payload(self, i: int) -> Dict[str, Any]:
+        return json.loads(bytes(self.texts[self.text_offsets[i]: self.text_offsets[i + 1]]).decode("utf-8"))
+
+    def search(self, text: str, k: int, kind: int, task: str, nprobe: int = VECTOR_NPROBE) -> List[Dict[str, Any]]:
+        """Top-k documents of one kind and task by cosine similarity, probing the nprobe nearest lists."""
+        query = self.embed(text)
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        candidates = np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in lists])
+        candidates = candidates[(self.kind[candidates] == kind) & (self.task[candidates] == TASK_KEYS.index(task))]
+        if not candidates.size:
+            return []
+        scores = self.vectors[candidates] @ query
+        top = np.argsort(-scores)[:k]
+        return [
+            {"band": float(self.band[candidates[i]]), "similarity": round(float(scores[i]), 3), **self._payload(int(candidates[i]))}
+            for i in top
+        ]
+
+    def descriptors(self, task: str, bands: List[float], floor_levels: int = RETRIEVAL_FLOOR_LEVELS) -> Dict[str, Dict[str, str]]:
+        """
+        Descriptor levels bracketing the given bands (nearest level below and above each), plus
+        the `floor_levels` lowest levels, per criterion.
+        """
+        rows = np.flatnonzero((self.kind == KIND_DESCRIPTOR) & (self.task == TASK_KEYS.index(task)))
+        out: Dict[str, Dict[str, str]] = {}
+        by_criterion: Dict[str, List[int]] = {}
+        for i in rows:
+            by_criterion.setdefault(self._payload(int(i))["criterion"], []).append(int(i))
+        lo, hi = min(bands), max(bands)
+        for criterion, idx in by_criterion.items():
+            levels = np.array([self.band[i] for i in idx])
+            below, above = levels[levels <= lo], levels[levels >= hi]
+            keep = set(levels[(levels >= lo) & (levels <= hi)].tolist())
+            if below.size:
+                keep.add(float(below.max()))
+            if above.size:
+                keep.add(float(above.min()))
+            keep.update(sorted(set(levels.tolist()))[:floor_levels])
+            out[criterion] = {
+                f"{self.band[i]:g}": self._payload(i)["excerpt"] for i in idx if float(self.band[i]) in keep
+            }
+        return out
+
+
+vector_index = VectorIndex.load_if_exists()
+
+
+def retrieve_scoring_context(task_type: str, test_type: Optional[str], answer: str) -> Optional[Dict[str, Any]]:
+    """
+    The closest scored exemplars and the descriptor levels around their bands, or None
+    (no index, or nothing indexed for this task) so the caller falls back to the full rubric.
+    """
+    if vector_index is None or not answer:
+        return None
+    key = task_key(task_type, test_type)
+    if key not in TASK_KEYS:
+        return None
+    exemplars = vector_index.search(answer, RETRIEVAL_EXEMPLARS, KIND_EXEMPLAR, key)
+    if not exemplars:
+        return None
+    descriptors = vector_index.descriptors(key, [e["band"] for e in exemplars])
+    return {
+        "exemplars": [{"band": e["band"], "answer": e["excerpt"]} for e in exemplars],
+        "descriptors": descriptors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the local exemplar/descriptor retrieval index")
+    parser.add_argument("--exemplars", default=os.path.join("data", "exemplars", "writing_exemplars.jsonl"))
+    parser.add_argument("--rubrics", help="band-descriptor JSON (default: the one evaluation_service loads)")
+    parser.add_argument("--out", default=VECTOR_INDEX_DIR)
+    parser.add_argument("--nlist", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    documents = list(exemplar_documents(args.exemplars))
+    if args.rubrics:
+        with open(args.rubrics, encoding="utf-8") as f:
+            rubrics = json.load(f)
+    else:
+        from services.evaluation_service import rubrics
+    documents += list(rubric_documents(rubrics))
+    build_index(documents, args.out, args.nlist)
+
+
+if __name__ == "__main__":
+    main()
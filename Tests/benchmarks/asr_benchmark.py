@@ -0,0 +1,175 @@
+"""
+Speed/accuracy benchmark for the local ASR configurations in services.asr_service.
+
+For every combination of backend, model size, int8 quantisation and thread
+settings it reports model load time, real-time factor (transcription time /
+audio duration, lower is faster), peak memory and word error rate against the
+spoken fixtures in Tests/fixtures/asr (generate them with make_asr_fixtures.py).
+Each configuration runs in a fresh process so memory and thread settings
+do not leak between runs.
+
+    python -m Tests.benchmarks.asr_benchmark
+    python -m Tests.benchmarks.asr_benchmark --backends whisper faster-whisper --models tiny base small \\
+        --int8 off on --threads 4:1 8:1 --json asr_report.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+import wave
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FIXTURES_DIR = os.path.join(ROOT, "Tests", "fixtures", "asr")
+
+_NORMALISE_RE = re.compile(r"[^a-z0-9' ]+")
+
+
+def _normalise(text: str) -> List[str]:
+    return _NORMALISE_RE.sub(" ", text.lower().replace("-", " ")).split()
+
+
+def word_edit_distance(reference: List[str], hypothesis: List[str]) -> int:
+    """Levenshtein distance over words (substitutions + deletions + insertions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1]
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref, hyp = _normalise(reference), _normalise(hypothesis)
+    return word_edit_distance(ref, hyp) / len(ref) if ref else float(bool(hyp))
+
+
+def load_fixtures(fixtures_dir: str = FIXTURES_DIR) -> List[Dict[str, Any]]:
+    """[{"path", "reference", "duration_s"}] for every referenced WAV that exists."""
+    with open(os.path.join(fixtures_dir, "references.json"), encoding="utf-8") as f:
+        references = json.load(f)
+    fixtures = []
+    for name, reference in references.items():
+        path = os.path.join(fixtures_dir, name)
+        if not os.path.exists(path):
+            continue
+        with wave.open(path, "rb") as w:
+            duration = w.getnframes() / float(w.getframerate())
+        fixtures.append({"path": path, "reference": reference, "duration_s": duration})
+    return fixtures
+
+
+def _run_config(config: Dict[str, Any], fixtures: List[Dict[str, Any]], queue):
+    # keep the module from loading its own default model at import
+    os.environ["ASR_MODE"] = "cloud"
+    try:
+        from services.asr_service import LocalASRModel
+
+        start = time.perf_counter()
+        model = LocalASRModel(config["model"], config["backend"], config["int8"],
+                              config["intra_threads"], config["inter_threads"])
+        load_s = time.perf_counter() - start
+        model.transcribe(fixtures[0]["path"])  # warm-up
+
+        audio_s = transcribe_s = 0.0
+        edits = ref_words = 0
+        for fx in fixtures:
+            start = time.perf_counter()
+            text = model.transcribe(fx["path"])["text"]
+            transcribe_s += time.perf_counter() - start
+            audio_s += fx["duration_s"]
+            ref = _normalise(fx["reference"])
+            edits += word_edit_distance(ref, _normalise(text))
+            ref_words += len(ref)
+
+        queue.put({
+            **config,
+            "backend_used": model.backend,
+            "load_s": round(load_s, 2),
+            "rtf": round(transcribe_s / audio_s, 3),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "wer": round(edits / ref_words, 3) if ref_words else None,
+        })
+    except Exception as e:
+        queue.put({**config, "error": f"{type(e).__name__}: {e}"})
+
+
+def run_benchmark(configs: List[Dict[str, Any]], fixtures: List[Dict[str, Any]], timeout_s: float = 1800) -> List[Dict[str, Any]]:
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for config in configs:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_config, args=(config, fixtures, queue))
+        proc.start()
+        proc.join(timeout_s)
+        if proc.is_alive():
+            proc.terminate()
+            results.append({**config, "error": "timeout"})
+            continue
+        results.append(queue.get() if not queue.empty() else {**config, "error": f"exit code {proc.exitcode}"})
+        print(json.dumps(results[-1]), flush=True)
+    return results
+
+
+def build_configs(backends, models, int8_modes, threads) -> List[Dict[str, Any]]:
+    configs = []
+    for backend, model, int8, thread_spec in itertools.product(backends, models, int8_modes, threads):
+        intra, _, inter = thread_spec.partition(":")
+        configs.append({
+            "backend": backend, "model": model, "int8": int8 == "on",
+            "intra_threads": int(intra or 0), "inter_threads": int(inter or 0),
+        })
+    return configs
+
+
+def _print_table(results: List[Dict[str, Any]]):
+    header = f"{'backend':<15}{'model':<9}{'int8':<6}{'threads':<9}{'load_s':>8}{'rtf':>8}{'rss_mb':>9}{'wer':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        threads = f"{r['intra_threads'] or '-'}:{r['inter_threads'] or '-'}"
+        if "error" in r:
+            print(f"{r['backend']:<15}{r['model']:<9}{str(r['int8']):<6}{threads:<9}  ERROR {r['error']}")
+            continue
+        backend = r["backend_used"] if r["backend_used"] == r["backend"] else f"{r['backend_used']}*"
+        print(f"{backend:<15}{r['model']:<9}{str(r['int8']):<6}{threads:<9}{r['load_s']:>8}{r['rtf']:>8}"
+              f"{r['peak_rss_mb']:>9}{r['wer']:>7}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Real-time factor, memory and WER per local ASR configuration")
+    parser.add_argument("--backends", nargs="*", default=["whisper", "faster-whisper"])
+    parser.add_argument("--models", nargs="*", default=["tiny", "base"])
+    parser.add_argument("--int8", nargs="*", default=["off", "on"], choices=["off", "on"])
+    parser.add_argument("--threads", nargs="*", default=["0:0"], help="intra:inter thread counts, 0 = library default")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        sys.exit(f"No audio fixtures in {args.fixtures}; run Tests/fixtures/asr/make_asr_fixtures.py first")
+
+    results = run_benchmark(build_configs(args.backends, args.models, args.int8, args.threads), fixtures)
+    print()
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"fixtures": len(fixtures), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
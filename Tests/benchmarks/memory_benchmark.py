@@ -0,0 +1,164 @@
+"""
+Per-worker memory of N ASR workers: each loading its own model vs. preload-then-fork.
+
+"independent" starts every worker as a fresh interpreter that loads the model
+itself (what `uvicorn --workers N` does); "preload" loads it once in the parent,
+freezes the gc and forks the workers (what gunicorn.conf.py does); "chunked" is
+"preload" plus the long-audio pool every server worker spawns when
+ASR_CHUNK_WORKERS > 1 (services/chunked_asr_service.py), whose processes each
+load their own model. Every worker
+runs one transcription so the weights are actually read, then all of them are
+measured at the same moment from /proc/<pid>/smaps_rollup:
+
+    rss  resident pages, shared ones counted in full by every process
+    pss  proportional set size: shared pages split between the processes using them
+    uss  pages private to the process (what it would free on exit)
+
+The sum of PSS is the real footprint of the pool. Linux only.
+
+    python -m Tests.benchmarks.memory_benchmark --model tiny --workers 4
+    python -m Tests.benchmarks.memory_benchmark --model synthetic:300   # 300 MB array, no whisper needed
+    python -m Tests.benchmarks.memory_benchmark --modes preload chunked --chunk-workers 2
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_model = None
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """rss/pss/uss in kB from smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if rest.strip().endswith("kB"):
+                fields[name] = int(rest.split()[0])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _load(model: str):
+    if model.startswith("synthetic:"):
+        import numpy as np
+        return np.random.default_rng(0).standard_normal(int(model.split(":")[1]) * 2 ** 20 // 8)
+    os.environ["ASR_MODE"] = "cloud"  # keep the import from loading its own default model
+    from services.asr_service import LocalASRModel
+    return LocalASRModel(model, "whisper", False)
+
+
+def _touch(model):
+    if hasattr(model, "transcribe"):
+        import numpy as np
+        model.transcribe(np.zeros(16000 * 5, dtype=np.float32), word_timestamps=False)
+    else:
+        float(model.sum())
+
+
+def _worker(model_name: Optional[str], ready, release):
+    global _model
+    if _model is None:  # independent: load here; preload: inherited from the parent
+        _model = _load(model_name)
+    _touch(_model)
+    ready.release()
+    release.wait()
+
+
+def _measure(mode: str, model: str, workers: int, chunk_workers: int = 2) -> Dict[str, Any]:
+    global _model
+    if mode in ("preload", "chunked"):
+        _model = _load(model)
+        _touch(_model)
+        gc.freeze()
+        ctx = multiprocessing.get_context("fork")
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    ready, release = ctx.Semaphore(0), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(model, ready, release)) for _ in range(workers)]
+    # chunk pools are spawned (never forked) by each server worker, so they load the model themselves
+    spawn = multiprocessing.get_context("spawn")
+    chunk_ready, chunk_release = spawn.Semaphore(0), spawn.Event()
+    chunk_procs = [spawn.Process(target=_worker, args=(model, chunk_ready, chunk_release))
+                   for _ in range(workers * chunk_workers if mode == "chunked" else 0)]
+    for p in procs + chunk_procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    for _ in chunk_procs:
+        chunk_ready.acquire()
+
+    per_worker = [memory_kb(p.pid) for p in procs]
+    chunks = [memory_kb(p.pid) for p in chunk_procs]
+    parent = memory_kb(os.getpid()) if mode != "independent" else None
+    release.set()
+    chunk_release.set()
+    for p in procs + chunk_procs:
+        p.join()
+    _model = None
+    gc.unfreeze()
+    gc.collect()
+
+    def mean(key):
+        return round(sum(m[key] for m in per_worker) / len(per_worker) / 1024, 1)
+
+    chunk_pss = sum(m["pss"] for m in chunks)
+    total_pss = sum(m["pss"] for m in per_worker) + (parent["pss"] if parent else 0) + chunk_pss
+    return {
+        "mode": mode, "model": model, "workers": workers, "chunk_workers": len(chunks),
+        "rss_mb": mean("rss"), "pss_mb": mean("pss"), "uss_mb": mean("uss"),
+        "parent_pss_mb": round(parent["pss"] / 1024, 1) if parent else 0.0,
+        "chunk_pss_mb": round(chunk_pss / 1024, 1),
+        "total_pss_mb": round(total_pss / 1024, 1),
+    }
+
+
+def _print_table(results: List[Dict[str, Any]]):
+    header = (f"{'mode':<13}{'workers':>8}{'rss/worker':>12}{'pss/worker':>12}{'uss/worker':>12}{'parent':>9}"
+              f"{'chunk pool':>12}{'total pss':>11}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<13}{r['workers']:>8}{r['rss_mb']:>12}{r['pss_mb']:>12}{r['uss_mb']:>12}"
+              f"{r['parent_pss_mb']:>9}{r['chunk_pss_mb']:>12}{r['total_pss_mb']:>11}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Per-worker RSS/PSS with and without preload-then-fork")
+    parser.add_argument("--model", default=os.getenv("ASR_MODEL_SIZE", "base"),
+                        help="whisper model size, or synthetic:<MB> for a plain array of that size")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="*", default=["independent", "preload"],
+                        choices=["independent", "preload", "chunked"])
+    parser.add_argument("--chunk-workers", type=int, default=2,
+                        help="ASR_CHUNK_WORKERS per server worker for the chunked mode")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("smaps_rollup is not available; this benchmark needs Linux 4.14+")
+
+    results = []
+    for mode in args.modes:
+        results.append(_measure(mode, args.model, args.workers, args.chunk_workers))
+        print(json.dumps(results[-1]), flush=True)
+    print()
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
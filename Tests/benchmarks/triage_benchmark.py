@@ -0,0 +1,123 @@
+"""
+How many LLM calls the local pre-check (services.linguistic_service) avoids on a traffic mix.
+
+Replays stored traffic through the same feature extraction and triage that run in
+front of the scoring agents and counts the LLM calls each request would make with
+and without triage. No model is called.
+
+    python -m Tests.benchmarks.triage_benchmark                          # history DB (HISTORY_DB_PATH)
+    python -m Tests.benchmarks.triage_benchmark --jsonl submissions.jsonl  # batch-format JSONL
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.linguistic_service import TRIAGE_MIN_WORDS_SPEAKING, extract_features, is_asr_error, triage  # noqa: E402
+from Tests.benchmarks.load_generator import percentile  # noqa: E402
+
+
+def writing_calls(ratable: int) -> int:
+    """LLM calls of one writing evaluation: a score per ratable task, combine, feedback, improvements."""
+    if not ratable:
+        return 0
+    return ratable + (1 if ratable == 2 else 0) + 2
+
+
+def _writing_tasks(submission: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+    tasks = []
+    if submission.get("task1_answer") is not None:
+        tasks.append(("task1", submission.get("task1_answer"), submission.get("task1_question")))
+    if submission.get("task2_answer") is not None and submission.get("task2_question"):
+        tasks.append(("task2", submission.get("task2_answer"), submission.get("task2_question")))
+    return tasks
+
+
+def from_history(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for row in conn.execute(
+            "SELECT test_type, task1_question, task1_answer, task2_question, task2_answer FROM writing_submissions"
+        ):
+            yield "writing", dict(zip(("test_type", "task1_question", "task1_answer", "task2_question", "task2_answer"), row))
+        for (transcripts,) in conn.execute("SELECT transcripts FROM speaking_sessions"):
+            yield "speaking", {"transcripts": json.loads(transcripts or "{}")}
+    finally:
+        conn.close()
+
+
+def from_jsonl(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                yield ("speaking" if "transcripts" in item else "writing"), item
+
+
+def run(traffic: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    requests = Counter()
+    calls_before = Counter()
+    calls_after = Counter()
+    reasons = Counter()
+    short_circuited = Counter()
+    timings_ms: List[float] = []
+
+    for module, item in traffic:
+        requests[module] += 1
+        start = time.perf_counter()
+        if module == "writing":
+            tasks = _writing_tasks(item)
+            verdicts = [triage(extract_features(answer, question, task)) for task, answer, question in tasks]
+            ratable = sum(1 for v in verdicts if not v)
+            before, after = writing_calls(len(tasks)), writing_calls(ratable)
+        else:
+            parts = item.get("transcripts", {})
+            failed = item.get("asr_errors") or {}
+            # as in the speaking agent: a failed transcription is scored as no speech
+            verdicts = [
+                triage(extract_features("" if p in failed or is_asr_error(t) else t), TRIAGE_MIN_WORDS_SPEAKING)
+                for p, t in parts.items()
+            ]
+            before, after = (1 if parts else 0), (1 if any(not v for v in verdicts) else 0)
+        timings_ms.append((time.perf_counter() - start) * 1000)
+
+        reasons.update(v["reason"] for v in verdicts if v)
+        calls_before[module] += before
+        calls_after[module] += after
+        if before and not after:
+            short_circuited[module] += 1
+
+    total_before, total_after = sum(calls_before.values()), sum(calls_after.values())
+    return {
+        "requests": dict(requests),
+        "short_circuited": dict(short_circuited),
+        "triage_reasons": dict(reasons),
+        "llm_calls_without_triage": dict(calls_before),
+        "llm_calls_with_triage": dict(calls_after),
+        "llm_calls_avoided": total_before - total_after,
+        "llm_calls_avoided_pct": round(100.0 * (total_before - total_after) / total_before, 1) if total_before else 0.0,
+        "precheck_p50_ms": round(percentile(timings_ms, 50), 3),
+        "precheck_p99_ms": round(percentile(timings_ms, 99), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM calls avoided by the local pre-check on a traffic mix")
+    parser.add_argument("--history-db", default=os.getenv("HISTORY_DB_PATH", os.path.join(ROOT, "data", "ielts_history.db")))
+    parser.add_argument("--jsonl", help="batch-format submissions (or {'transcripts': {...}} lines) instead of the history DB")
+    args = parser.parse_args(argv)
+
+    traffic = from_jsonl(args.jsonl) if args.jsonl else from_history(args.history_db)
+    print(json.dumps(run(traffic), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Keep the test process offline: no Whisper load, no Gemini key, local rubric fixture.
+os.environ.setdefault("ASR_MODE", "cloud")
+os.environ.setdefault("TTS_MODE", "cloud")
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+os.environ.setdefault("RUBRICS_PATH", os.path.join(ROOT, "Tests", "fixtures", "band_descriptors.json"))
@@ -0,0 +1,213 @@
+"""
+Offline stand-in for Gemini.
+
+FakeLLM mimics the parts of ChatGoogleGenerativeAI the agents use (invoke, stream)
+and FakeGenai mimics google.generativeai (GenerativeModel(...).generate_content).
+Latency is drawn from a log-normal distribution and band scores from a normal
+distribution around a configurable mean, so benchmarks see realistic spread
+without touching the network.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+class FakeLLMConfig:
+    def __init__(
+        self,
+        latency_ms: float = 800.0,
+        latency_sigma: float = 0.35,
+        token_latency_ms: float = 15.0,
+        band_mean: float = 6.5,
+        band_sd: float = 1.0,
+        malformed_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms            # median time to first token
+        self.latency_sigma = latency_sigma      # log-normal shape
+        self.token_latency_ms = token_latency_ms
+        self.band_mean = band_mean
+        self.band_sd = band_sd
+        self.malformed_rate = malformed_rate    # fraction of replies that are not valid JSON
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def latency(self) -> float:
+        with self.lock:
+            return self.rng.lognormvariate(math.log(self.latency_ms / 1000.0), self.latency_sigma)
+
+    def band(self) -> float:
+        with self.lock:
+            x = self.rng.gauss(self.band_mean, self.band_sd)
+        return min(9.0, max(0.0, round(x * 2) / 2.0))
+
+    def malformed(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.malformed_rate
+
+
+def _prompt_text(prompt: Any) -> str:
+    """Flatten a string or a LangChain multimodal message list into text."""
+    if isinstance(prompt, str):
+        return prompt
+    texts = []
+    for message in prompt or []:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(c.get("text", "") for c in content if isinstance(c, dict))
+    return "\n".join(texts)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_reply(prompt_text: str, config: FakeLLMConfig) -> str:
+    """Pick a reply shaped like what the matching agent prompt asks for."""
+    if config.malformed():
+        return "Sorry, I cannot produce JSON for that."
+
+    if "IELTS Speaking examiner" in prompt_text:
+        cats = ["fluency", "coherence", "lexical_resource", "grammar", "pronunciation"]
+
+        def part_scores():
+            scores = {c: int(config.band()) for c in cats}
+            scores["feedback"] = {c: f"Fake {c} feedback." for c in cats}
+            scores["band"] = round(sum(scores[c] for c in cats) / len(cats) * 2) / 2.0
+            return scores
+
+        if "Return ONLY JSON with keys" in prompt_text:
+            return json.dumps(part_scores())
+        parts = sorted(set(re.findall(r"(part_\d+): \"", prompt_text))) or ["part_1"]
+        per_part = {p: part_scores() for p in parts}
+        aggregated = {c: round(sum(per_part[p][c] for p in parts) / len(parts), 1) for c in cats}
+        aggregated["band"] = round(sum(aggregated[c] for c in cats) / len(cats) * 2) / 2.0
+        return json.dumps({"per_part": per_part, "aggregated": aggregated})
+
+    if "IELTS Reading tutor" in prompt_text:
+        return json.dumps({"explanation": "The passage states this directly in the paragraph the question refers to."})
+    if "examiner-style feedback" in prompt_text:
+        return json.dumps({"feedback": "You addressed the task with a clear position. " * 6})
+    if "improvements" in prompt_text:
+        return json.dumps({"improvements": [
+            "You should add a clearer overview.",
+            "You should vary sentence structures.",
+            "You should use more precise vocabulary.",
+        ]})
+    if "Evaluate the following IELTS Writing" in prompt_text:
+        criteria = {c: float(int(config.band())) for c in (
+            "task_response", "coherence_cohesion", "lexical_resource", "grammatical_range_accuracy")}
+        return json.dumps({**criteria, "band": round(sum(criteria.values()) / 4 * 2) / 2.0})
+    if '"band"' in prompt_text:
+        return json.dumps({"band": config.band()})
+    if "Task 2" in prompt_text and "question" in prompt_text:
+        return "Some people believe technology isolates people. To what extent do you agree or disagree? Give reasons for your answer and include any relevant examples from your own knowledge or experience."
+    return "The chart below shows the number of visitors to three museums between 2010 and 2020. Summarize the information by selecting and reporting the main features, and make comparisons where relevant."
+
+
+class FakeLLM:
+    """Drop-in for ChatGoogleGenerativeAI in the agents."""
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, model: str = "fake-gemini"):
+        self.config = config or FakeLLMConfig()
+        self.model = model
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _record(self, prompt_text: str, content: str, elapsed: float):
+        with self._lock:
+            self.calls.append({"model": self.model, "prompt_chars": len(prompt_text), "elapsed": elapsed})
+
+    def _message(self, prompt_text: str, content: str):
+        return SimpleNamespace(
+            content=content,
+            usage_metadata={
+                "input_tokens": _approx_tokens(prompt_text),
+                "output_tokens": _approx_tokens(content),
+                "total_tokens": _approx_tokens(prompt_text) + _approx_tokens(content),
+            },
+        )
+
+    def invoke(self, prompt: Any, *args, **kwargs):
+        start = time.perf_counter()
+        prompt_text = _prompt_text(prompt)
+        content = fake_reply(prompt_text, self.config)
+        time.sleep(self.config.latency())
+        self._record(prompt_text, content, time.perf_counter() - start)
+        return self._message(prompt_text, content)
+
+    def stream(self, prompt: Any, *args, **kwargs):
+        start = time.perf_counter()
+        prompt_text = _prompt_text(prompt)
+        content = fake_reply(prompt_text, self.config)
+        time.sleep(self.config.latency())
+        chunks = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.config.token_latency_ms / 1000.0)
+            message = SimpleNamespace(content=chunk, usage_metadata=None)
+            if i == len(chunks) - 1:
+                message = self._message(prompt_text, chunk)
+                message.usage_metadata["output_tokens"] = _approx_tokens(content)
+            yield message
+        self._record(prompt_text, content, time.perf_counter() - start)
+
+
+class _FakeGenerativeModel:
+    def __init__(self, llm: FakeLLM, model_name: str):
+        self._llm = llm
+        self.model_name = model_name
+
+    def generate_content(self, prompt: Any, *args, **kwargs):
+        message = self._llm.invoke(prompt)
+        usage = message.usage_metadata
+        part = SimpleNamespace(text=message.content)
+        return SimpleNamespace(
+            text=message.content,
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=usage["input_tokens"],
+                candidates_token_count=usage["output_tokens"],
+                total_token_count=usage["total_tokens"],
+            ),
+        )
+
+
+class FakeGenai:
+    """Drop-in for the google.generativeai module as used by the speaking agent."""
+
+    def __init__(self, llm: FakeLLM):
+        self._llm = llm
+
+    def configure(self, *args, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name: str, *args, **kwargs):
+        return _FakeGenerativeModel(self._llm, model_name)
+
+
+def install_fake_llm(config: Optional[FakeLLMConfig] = None) -> FakeLLM:
+    """
+    Replace the module-level Gemini clients of every agent with one shared FakeLLM.
+    Returns the fake so callers can inspect .calls.
+    """
+    import agents.scoring_agent as scoring_agent
+    import agents.feedback_agent as feedback_agent
+    import agents.improvement_agent as improvement_agent
+    import agents.writing_agent as writing_agent
+    import agents.speaking_agent as speaking_agent
+    import agents.reading_agent as reading_agent
+
+    llm = FakeLLM(config)
+    for module in (scoring_agent, feedback_agent, improvement_agent, writing_agent, reading_agent):
+        module.llm = llm
+    scoring_agent.combine_llm = scoring_agent.fast_llm = scoring_agent.strong_llm = llm
+    speaking_agent.genai = FakeGenai(llm)
+    return llm
@@ -0,0 +1,122 @@
+"""
+Local HTTP stand-in for the ElevenLabs speech-to-text and text-to-speech APIs.
+
+Point the services at it with ELEVENLABS_BASE_URL (or by setting
+services.asr_service.ELEVENLABS_BASE_URL / services.tts_service.ELEVENLABS_BASE_URL).
+"""
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_TRANSCRIPT = (
+    "Well I think I would like to talk about my hometown which is a small city "
+    "near the coast and um it is famous for its seafood and the old harbour"
+)
+
+
+def _fake_words(text: str):
+    """Word timings in the shape ElevenLabs returns: ~2.5 words/sec with an occasional pause."""
+    words, t = [], 0.0
+    for i, w in enumerate(text.split()):
+        if i and i % 9 == 0:
+            t += 0.8
+        words.append({"text": w, "type": "word", "start": round(t, 2), "end": round(t + 0.32, 2)})
+        t += 0.4
+    return words
+
+
+class FakeUpstream:
+    def __init__(self, latency_ms: float = 300.0, latency_sigma: float = 0.3, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.failing = False  # answer 503 to everything, to simulate an outage
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _sleep(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.rng.lognormvariate(math.log(self.latency_ms / 1000.0), self.latency_sigma)
+        time.sleep(delay)
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                upstream._sleep()
+                if upstream.failing:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if self.path.startswith("/v1/speech-to-text"):
+                    body = json.dumps({
+                        "language_code": "en",
+                        "text": FAKE_TRANSCRIPT,
+                        "words": _fake_words(FAKE_TRANSCRIPT),
+                    }).encode("utf-8")
+                    content_type = "application/json"
+                elif self.path.startswith("/v1/text-to-speech/"):
+                    # a tiny MPEG frame header followed by padding is enough for clients
+                    body = b"\xff\xfb\x90\x64" + b"\x00" * 4096
+                    content_type = "audio/mpeg"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstream":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def install_fake_upstream(upstream: FakeUpstream):
+    """Route the ASR/TTS services to a running FakeUpstream in cloud mode."""
+    import services.asr_service as asr_service
+    import services.tts_service as tts_service
+
+    for module in (asr_service, tts_service):
+        module.ELEVENLABS_BASE_URL = upstream.base_url
+        module.ELEVENLABS_API_KEY = "fake-key"
+    asr_service.ASR_MODE = "cloud"
+    tts_service.TTS_MODE = "cloud"
+    tts_service.ELEVENLABS_VOICE_ID = "fake-voice"
@@ -0,0 +1,36 @@
+"""
+Generate the spoken fixtures for the ASR benchmark from references.json.
+
+The audio is synthesised with the local TTS engine (services.tts_service in local
+mode, i.e. pyttsx3), so the reference transcript of every file is known exactly.
+Synthetic speech is cleaner than candidate recordings: use it to compare ASR
+configurations with each other, not as an absolute accuracy figure. Real
+recordings can be added next to these as <name>.wav plus an entry in references.json.
+
+    python Tests/fixtures/asr/make_asr_fixtures.py
+"""
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ["TTS_MODE"] = "local"
+
+from services.tts_service import speak_text  # noqa: E402
+
+
+def main():
+    with open(os.path.join(HERE, "references.json"), encoding="utf-8") as f:
+        references = json.load(f)
+    for name, text in references.items():
+        path = os.path.join(HERE, name)
+        result = speak_text(text, path)
+        print("wrote" if result == path else "failed", path)
+
+
+if __name__ == "__main__":
+    main()
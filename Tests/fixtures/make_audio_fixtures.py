@@ -0,0 +1,52 @@
+"""
+Regenerate the small WAV fixtures used by the offline benchmarks.
+
+They are synthetic: voiced-like tone bursts separated by silences, 16 kHz mono
+16-bit, so silence detection and upload paths can be exercised without shipping
+real candidate recordings.
+
+    python Tests/fixtures/make_audio_fixtures.py
+"""
+import math
+import os
+import struct
+import wave
+
+SAMPLE_RATE = 16000
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio")
+
+# (name, [(seconds, tone_hz or None for silence), ...])
+FIXTURES = [
+    ("part_1.wav", [(0.4, 180), (0.2, None), (0.5, 220), (0.1, None)]),
+    ("part_2.wav", [(0.3, 200), (0.3, None), (0.4, 160), (0.2, None), (0.3, 240)]),
+    ("part_3.wav", [(0.6, 210), (0.15, None), (0.45, 190)]),
+]
+
+
+def _samples(segments):
+    for seconds, hz in segments:
+        n = int(seconds * SAMPLE_RATE)
+        for i in range(n):
+            if hz is None:
+                yield 0
+                continue
+            # syllable-rate (4 Hz) envelope over a harmonic-rich tone
+            env = 0.5 * (1 - math.cos(2 * math.pi * 4 * i / SAMPLE_RATE))
+            x = sum(math.sin(2 * math.pi * hz * k * i / SAMPLE_RATE) / k for k in (1, 2, 3))
+            yield int(9000 * env * x / 1.8)
+
+
+def main():
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    for name, segments in FIXTURES:
+        path = os.path.join(AUDIO_DIR, name)
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(SAMPLE_RATE)
+            w.writeframes(b"".join(struct.pack("<h", s) for s in _samples(segments)))
+        print("wrote", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.admission_service import AdmissionController, AdmissionRejected
+
+
+def _queue_in_order(controller, requests):
+    """Hold the only slot, queue `requests` (user, mode) one by one, then record grant order."""
+    holder = controller.acquire("holder", mode="mock")
+    order, threads = [], []
+
+    def run(user, mode):
+        ticket = controller.acquire(user, mode=mode)
+        order.append((user, mode))
+        controller.release(ticket)
+
+    for i, (user, mode) in enumerate(requests):
+        t = threading.Thread(target=run, args=(user, mode))
+        t.start()
+        threads.append(t)
+        while sum(controller.stats()["queued"].values()) < i + 1:
+            time.sleep(0.001)
+    controller.release(holder)
+    for t in threads:
+        t.join(5)
+    return order
+
+
+def test_users_share_slots_fairly_within_a_class():
+    controller = AdmissionController(max_concurrent=1, user_rate_per_min=0, tenant_rate_per_min=0)
+    order = _queue_in_order(controller, [("heavy", "practice")] * 4 + [("light", "practice")])
+    # the late user is served right after the heavy user's first request, not after all four
+    assert [u for u, _ in order][:3] == ["heavy", "light", "heavy"]
+
+
+def test_mock_tests_jump_ahead_of_practice():
+    controller = AdmissionController(max_concurrent=1, user_rate_per_min=0, tenant_rate_per_min=0)
+    order = _queue_in_order(controller, [("a", "practice"), ("b", "practice"), ("c", "mock")])
+    assert order[0] == ("c", "mock")
+
+
+def test_rate_and_concurrency_limits():
+    controller = AdmissionController(max_concurrent=4, user_concurrency=1, user_rate_per_min=2, tenant_rate_per_min=0)
+    first = controller.acquire("u1")
+    with pytest.raises(AdmissionRejected) as e:  # second slot for the same user: waits, then times out
+        controller.acquire("u1", timeout=0.05)
+    assert e.value.status_code == 503
+    controller.release(first)
+    with pytest.raises(AdmissionRejected) as e:  # burst of 2 per minute used up
+        controller.acquire("u1")
+    assert e.value.reason == "user_rate" and e.value.status_code == 429 and e.value.retry_after >= 1
+    controller.release(controller.acquire("u2"))
+    assert controller.stats()["running"] == 0 and controller.stats()["queued"] == {"mock": 0, "practice": 0}
+
+
+def test_anonymous_clients_do_not_share_a_bucket():
+    controller = AdmissionController(max_concurrent=8, user_concurrency=1, user_rate_per_min=1, tenant_rate_per_min=1)
+    # no user and no tenant: keyed on the client address, no tenant bucket
+    tickets = [controller.acquire(None, client=f"10.0.0.{i}") for i in range(3)]
+    with pytest.raises(AdmissionRejected) as e:
+        controller.acquire(None, client="10.0.0.0")
+    assert e.value.reason == "user_rate"
+    # a tenant's limits still apply to the tenant's users
+    controller.release(controller.acquire("u1", "school"))
+    with pytest.raises(AdmissionRejected) as e:
+        controller.acquire("u2", "school")
+    assert e.value.reason == "tenant_rate"
+    for ticket in tickets:
+        controller.release(ticket)
+    assert controller.stats()["running"] == 0
+
+
+def test_async_acquire_waits_without_a_thread():
+    controller = AdmissionController(max_concurrent=1, user_rate_per_min=0, tenant_rate_per_min=0)
+
+    async def scenario():
+        holder = await controller.acquire_async("a")
+        waiter = asyncio.ensure_future(controller.acquire_async("b"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done() and controller.stats()["queued"]["practice"] == 1
+        # released from another thread, as the threadpool-run evaluation would
+        await asyncio.get_running_loop().run_in_executor(None, controller.release, holder)
+        ticket = await asyncio.wait_for(waiter, 1)
+        controller.release(ticket)
+        controller.release(ticket)  # idempotent
+
+        holder = await controller.acquire_async("a")
+        with pytest.raises(AdmissionRejected) as e:
+            await controller.acquire_async("b", timeout=0.02)
+        assert e.value.status_code == 503
+        cancelled = asyncio.ensure_future(controller.acquire_async("c"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        assert controller.stats()["queued"]["practice"] == 0
+        controller.release(holder)
+
+    asyncio.run(scenario())
+    assert controller.stats()["running"] == 0
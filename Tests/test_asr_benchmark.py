@@ -0,0 +1,13 @@
+from Tests.benchmarks.asr_benchmark import build_configs, word_error_rate
+
+
+def test_word_error_rate():
+    assert word_error_rate("I come from a small town.", "i come from a small town") == 0.0
+    assert word_error_rate("I come from a small town", "I come from small town") == 1 / 6
+    assert word_error_rate("a b c d", "a x c d e") == 2 / 4
+
+
+def test_build_configs_is_the_cartesian_product():
+    configs = build_configs(["whisper", "faster-whisper"], ["tiny", "base"], ["off", "on"], ["4:1"])
+    assert len(configs) == 8
+    assert {"backend": "whisper", "model": "tiny", "int8": True, "intra_threads": 4, "inter_threads": 1} in configs
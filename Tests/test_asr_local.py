@@ -0,0 +1,39 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.asr_service import LocalASRModel
+
+
+class _NonReentrantModel:
+    """Stands in for a Whisper model whose decoder state is shared across calls."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return {"text": "ok", "segments": []}
+
+
+def _model(backend):
+    model = LocalASRModel.__new__(LocalASRModel)
+    model.backend, model._fp16 = backend, False
+    model._decodes = threading.Semaphore(1)
+    model._model = _NonReentrantModel()
+    return model
+
+
+def test_whisper_decodes_one_request_at_a_time():
+    model = _model("whisper")
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda _: model.transcribe("clip.wav"), range(6)))
+    assert [r["text"] for r in results] == ["ok"] * 6
+    assert model._model.max_active == 1
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import services.asr_service as asr_service
+from services.asr_router_service import ASRRouter, CLOUD, LOCAL
+from Tests.fakes.fake_upstream import FAKE_TRANSCRIPT, FakeUpstream
+
+
+class SimulatedLocal:
+    """Local Whisper stand-in: optional gate to hold transcriptions in the queue."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, audio):
+        self.calls += 1
+        self.gate.wait(5)
+        return {"text": "local transcript", "words": []}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cloud(monkeypatch):
+    with FakeUpstream(latency_ms=5, latency_sigma=0.1, seed=1) as upstream:
+        monkeypatch.setattr(asr_service, "ELEVENLABS_BASE_URL", upstream.base_url)
+        monkeypatch.setattr(asr_service, "ELEVENLABS_API_KEY", "fake-key")
+        yield upstream
+
+
+def _clip(seconds=2.0):
+    return np.zeros(int(16000 * seconds), dtype=np.float32)
+
+
+def test_deep_local_queue_overflows_to_cloud():
+    local = SimulatedLocal()
+    router = ASRRouter(local, lambda audio: {"text": "cloud", "words": []},
+                       local_concurrency=1, local_max_queue=2, local_rtf=0.1, cloud_rtf=0.2)
+    assert router.choose(10) == (LOCAL, "faster")
+
+    local.gate.clear()
+    workers = [threading.Thread(target=router.transcribe, args=(_clip(), 10)) for _ in range(2)]
+    for w in workers:
+        w.start()
+    while router.stats()["local_queue"] < 2:
+        time.sleep(0.001)
+    assert router.choose(10) == (CLOUD, "local_queue_full")
+    local.gate.set()
+    for w in workers:
+        w.join(5)
+    assert router.choose(10)[0] == LOCAL
+
+
+def test_observed_latency_and_duration_steer_routing():
+    router = ASRRouter(SimulatedLocal(), lambda audio: {}, local_rtf=0.3, cloud_rtf=0.2)
+    assert router.choose(30)[0] == CLOUD
+    for _ in range(20):  # cloud has become slow
+        router.latency[CLOUD].observe(30.0, 30.0)
+    assert router.choose(30)[0] == LOCAL
+
+
+def test_cloud_outage_fails_over_and_breaker_recovers(cloud):
+    local, clock = SimulatedLocal(), FakeClock()
+    router = ASRRouter(local, asr_service._transcribe_cloud_source, local_rtf=1.0, cloud_rtf=0.01,
+                       breaker_failures=2, breaker_reset_s=30, clock=clock)
+    assert router.transcribe(_clip())["text"] == FAKE_TRANSCRIPT
+
+    cloud.failing = True
+    for _ in range(2):  # each request still succeeds, via local
+        assert router.transcribe(_clip())["text"] == "local transcript"
+    assert router.stats()["breakers"][CLOUD] == "open"
+    requests_before = cloud.requests
+    assert router.transcribe(_clip())["text"] == "local transcript"
+    assert cloud.requests == requests_before  # open breaker: cloud not even tried
+
+    clock.now += 31  # half-open: one probe goes to the cloud again
+    cloud.failing = False
+    assert router.choose(2) == (CLOUD, "faster")
+    assert router.transcribe(_clip())["text"] == FAKE_TRANSCRIPT
+    assert router.stats()["breakers"][CLOUD] == "closed"
+    assert local.calls == 3
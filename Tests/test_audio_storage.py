@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from services import audio_storage_service as aus
+
+
+def _store(tmp_path):
+    return aus.AudioStore(str(tmp_path / "audio"), {"speaking_part": 3600.0}, 10 * 1024 * 1024)
+
+
+def test_concurrent_writes_of_the_same_audio_are_counted_once(tmp_path):
+    store = _store(tmp_path)
+    data = b"RIFF" + bytes(range(256)) * 400
+    barrier = threading.Barrier(8)
+    paths = []
+
+    def write():
+        barrier.wait()
+        paths.append(store.put_bytes("speaking_part", data, "part_1.wav"))
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(paths)) == 1
+    stats = store.stats()
+    assert stats["bytes_stored"] == len(data)
+    assert stats["dedup_hits"] == 7
+    assert not [p for p in (tmp_path / "audio").rglob("*.tmp")]
+
+
+@pytest.mark.skipif(aus.fcntl is None, reason="needs fcntl")
+def test_only_one_worker_collects(tmp_path):
+    first, second = _store(tmp_path), _store(tmp_path)   # two workers sharing AUDIO_DIR
+    first.start_gc(interval=3600)
+    second.start_gc(interval=3600)
+    assert first._gc_lock_file is not None and second._gc_lock_file is None
+    first.stop_gc()
+    assert not first._gc_thread
+    second._gc_tick()
+    assert second._gc_lock_file is not None
+    second.stop_gc()
+
+
+def test_stats_cover_every_worker(tmp_path):
+    first, second = _store(tmp_path), _store(tmp_path)   # two workers sharing AUDIO_DIR
+    data = b"RIFF" + bytes(range(256)) * 10
+    first.put_bytes("speaking_part", data, "part_1.wav")
+    second.put_bytes("speaking_part", data, "part_1.wav")
+    assert first.stats() == second.stats()
+    assert second.stats()["bytes_stored"] == len(data) and second.stats()["dedup_hits"] == 1
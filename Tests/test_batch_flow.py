@@ -0,0 +1,66 @@
+import json
+import threading
+
+import workflow.batch_flow as bf
+
+QUESTION = "Some people think that university education should be free. To what extent do you agree or disagree?"
+
+
+def _submission(n, **extra):
+    return {"test_type": "academic", "task2_question": QUESTION,
+            "task2_answer": f"Essay number {n}. " * 40, **extra}
+
+
+def _fake_evaluate(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def evaluate_task(request):
+        with lock:
+            calls.append(request.task2_answer)
+        if "fail" in request.task2_answer:
+            return {"error": "model unavailable"}
+        return {"band": 6.5}
+
+    monkeypatch.setattr(bf, "evaluate_task", evaluate_task)
+    return calls
+
+
+def test_duplicates_are_evaluated_once(monkeypatch):
+    calls = _fake_evaluate(monkeypatch)
+    submissions = [_submission(1, id="a"), _submission(2, id="b"), _submission(1, id="c")]
+    records = {r["id"]: r for r in bf.run_batch(submissions, max_concurrency=2)}
+    assert len(calls) == 2
+    assert records["c"]["duplicate_of"] == "a" and records["c"]["result"] == records["a"]["result"]
+    assert "duplicate_of" not in records["a"] and "duplicate_of" not in records["b"]
+
+
+def test_resume_skips_scored_items_and_retries_failures(tmp_path, monkeypatch):
+    calls = _fake_evaluate(monkeypatch)
+    scored, failed, new = _submission(1), _submission("fail"), _submission(3)
+    output = tmp_path / "results.jsonl"
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": 1, "key": bf.submission_key(scored), "status": "ok", "result": {"band": 6.5}}) + "\n")
+        f.write(json.dumps({"id": 2, "key": bf.submission_key(failed), "status": "error", "error": "x"}) + "\n")
+        f.write('{"id": 3, "key": "' + bf.submission_key(new)[:20])      # killed mid-write
+
+    done = bf.load_done_keys(str(output))
+    assert done == {bf.submission_key(scored)}
+
+    records = list(bf.run_batch([scored, failed, new], done_keys=done))
+    assert sorted(r["key"] for r in records) == sorted([bf.submission_key(failed), bf.submission_key(new)])
+    assert len(calls) == 2
+    assert {r["status"] for r in records} == {"ok", "error"}
+    assert bf.load_done_keys(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_admitted_batch_is_paced_not_rate_limited(monkeypatch):
+    from services.admission_service import AdmissionController
+
+    calls = _fake_evaluate(monkeypatch)
+    controller = AdmissionController(max_concurrent=2, user_concurrency=2, user_rate_per_min=2, tenant_rate_per_min=2)
+    # far more items than the anonymous caller's 2/minute: every one waits for a slot and runs
+    records = list(bf.run_batch([_submission(n) for n in range(12)], max_concurrency=4,
+                                admission=controller, client="10.0.0.1"))
+    assert len(calls) == 12 and all(r["status"] == "ok" for r in records)
+    assert controller.stats()["running"] == 0
@@ -0,0 +1,97 @@
+import numpy as np
+
+from services.chunked_asr_service import SAMPLE_RATE, plan_chunks, silence_centers, stitch
+
+
+def _speech_with_pauses(seconds, burst=4.0, pause=0.5):
+    rng = np.random.default_rng(0)
+    parts, total = [], 0.0
+    while total < seconds:
+        parts += [rng.normal(0, 0.3, int(burst * SAMPLE_RATE)), np.zeros(int(pause * SAMPLE_RATE))]
+        total += burst + pause
+    return np.concatenate(parts).astype(np.float32)
+
+
+def test_chunks_end_on_silences_and_overlap():
+    samples = _speech_with_pauses(150)
+    duration = len(samples) / SAMPLE_RATE
+    silences = silence_centers(samples)
+    plan = plan_chunks(duration, silences, max_chunk=30, min_chunk=10, overlap=0.5)
+
+    assert len(plan) == 6
+    assert plan[0][2] == 0.0 and plan[-1][3] == duration
+    for (_, end, _, keep_to), (start, _, keep_from, _) in zip(plan, plan[1:]):
+        assert keep_to == keep_from
+        assert np.min(np.abs(silences - keep_to)) < 1e-9      # boundary on a silence
+        assert end - keep_to == 0.5 and keep_from - start == 0.5
+
+
+def test_stitch_drops_words_repeated_in_the_overlap():
+    plan = [(0.0, 10.5, 0.0, 10.0), (9.5, 20.0, 10.0, 20.0)]
+    timed = [
+        {"text": "my hometown is", "words": [{"word": "my", "start": 8.0, "end": 8.4},
+                                             {"word": "hometown", "start": 8.5, "end": 9.2},
+                                             {"word": "is", "start": 9.9, "end": 10.2}]},
+        {"text": "is small", "words": [{"word": "is", "start": 9.9, "end": 10.2},
+                                       {"word": "small", "start": 10.4, "end": 10.9}]},
+    ]
+    assert stitch(timed, plan)["text"] == "my hometown is small"
+
+    untimed = [{"text": "I like reading books and", "words": []}, {"text": "books and cycling.", "words": []}]
+    assert stitch(untimed, plan)["text"] == "I like reading books and cycling."
+
+
+class _FakeWorkerModel:
+    """A word every half second of the chunk it is given, timed relative to the chunk."""
+
+    def transcribe(self, samples):
+        n = int(len(samples) / SAMPLE_RATE / 0.5)
+        words = [{"word": f"w{i}", "start": i * 0.5, "end": i * 0.5 + 0.3} for i in range(n)]
+        return {"text": " ".join(w["word"] for w in words), "words": words}
+
+
+def test_transcribe_long_chunks_in_the_pool_and_stitches(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    import services.chunked_asr_service as cas
+
+    samples = _speech_with_pauses(120)
+    monkeypatch.setattr(cas, "load_pcm", lambda path: samples)
+    monkeypatch.setattr(cas, "_worker_model", _FakeWorkerModel())
+    pool = ThreadPoolExecutor(2)
+    monkeypatch.setattr(cas, "_get_pool", lambda model: pool)
+
+    monkeypatch.setattr(cas, "ASR_CHUNK_WORKERS", 1)
+    assert cas.transcribe_long("long.wav", None) is None        # mode off (the default)
+    monkeypatch.setattr(cas, "ASR_CHUNK_WORKERS", 2)
+    monkeypatch.setattr(cas, "load_pcm", lambda path: samples[: 20 * SAMPLE_RATE])
+    assert cas.transcribe_long("short.wav", None) is None       # short enough for one decode
+
+    monkeypatch.setattr(cas, "load_pcm", lambda path: samples)
+    result = cas.transcribe_long("long.wav", None)
+    pool.shutdown()
+    starts = [w["start"] for w in result["words"]]
+    # absolute times, strictly increasing: the overlaps produced no repeated or reordered words
+    assert all(b > a for a, b in zip(starts, starts[1:]))
+    assert starts[0] == 0.0 and starts[-1] > len(samples) / SAMPLE_RATE - 2
+    assert max(b - a for a, b in zip(starts, starts[1:])) <= 1.0
+
+
+def test_chunk_pool_is_created_once_with_spawned_workers(monkeypatch):
+    import types
+    import services.chunked_asr_service as cas
+
+    created = []
+
+    class RecordingPool:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+    monkeypatch.setattr(cas, "ProcessPoolExecutor", RecordingPool)
+    monkeypatch.setattr(cas, "_pool", None)
+    monkeypatch.setattr(cas, "ASR_CHUNK_WORKERS", 2)
+    model = types.SimpleNamespace(model_size="tiny", backend="whisper", int8=False)
+    assert cas._get_pool(model) is cas._get_pool(model)
+    assert len(created) == 1
+    kwargs = created[0]
+    assert kwargs["max_workers"] == 2 and kwargs["mp_context"].get_start_method() == "spawn"
+    assert kwargs["initializer"] is cas._init_worker and kwargs["initargs"][:3] == ("tiny", "whisper", False)
@@ -0,0 +1,36 @@
+from services.fluency_service import fluency_band, fluency_metrics
+
+
+def _timed(words, gap=0.1, word_len=0.3, pause_after=(), pause=1.2):
+    out, t = [], 0.0
+    for i, w in enumerate(words):
+        out.append({"word": w, "start": t, "end": t + word_len})
+        t += word_len + (pause if i in pause_after else gap)
+    return out
+
+
+def test_pauses_runs_and_fillers():
+    words = _timed("well I um think that it is uh quite good".split(), pause_after={2, 5})
+    m = fluency_metrics(words)
+    assert m["words"] == 10
+    assert m["pause_count"] == 2 and m["long_pause_count"] == 2
+    assert m["mean_pause_s"] == 1.2
+    assert m["mean_length_of_run"] == round(10 / 3, 1)
+    assert m["filler_count"] == 2 and m["fillers_per_100_words"] == 20.0
+
+
+def test_fluent_speech_scores_higher_than_halting_speech():
+    fluent = fluency_metrics(_timed(["word"] * 60, gap=0.05, word_len=0.3))
+    halting = fluency_metrics(_timed(["word", "um"] * 30, gap=0.1, word_len=0.4, pause_after=set(range(0, 60, 3))))
+    assert fluency_band(fluent) > fluency_band(halting)
+    assert 0 <= fluency_band(halting) <= 9
+    assert fluency_metrics([]) is None and fluency_band(None) is None
+
+
+def test_fluency_band_rounds_halves_up(monkeypatch):
+    import services.fluency_service as fs
+
+    monkeypatch.setattr(fs, "_BAND_WEIGHTS", {"speech_rate_wpm": 1.0})
+    monkeypatch.setattr(fs, "_BAND_ANCHORS", {"speech_rate_wpm": ([0.0, 9.0], [0.0, 9.0])})
+    assert fluency_band({"speech_rate_wpm": 6.25}) == 6.5
+    assert fluency_band({"speech_rate_wpm": 6.75}) == 7.0
@@ -0,0 +1,105 @@
+import sqlite3
+import threading
+
+import pytest
+
+from services import history_service as hs
+
+
+def _store(tmp_path):
+    return hs.HistoryStore(str(tmp_path / "history.db"))
+
+
+def _tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+
+def test_failed_migration_leaves_no_partial_schema(tmp_path, monkeypatch):
+    path = str(tmp_path / "history.db")
+    monkeypatch.setattr(hs, "MIGRATIONS", hs.MIGRATIONS + ["CREATE TABLE half_done (id INTEGER); SELECT * FROM missing;"])
+    conn = hs._connect(path)
+    with pytest.raises(sqlite3.OperationalError):
+        hs.migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    conn.close()
+    assert not _tables(path) & {"half_done", "scores"}
+
+
+def test_workers_migrating_at_once_do_not_race(tmp_path):
+    path = str(tmp_path / "history.db")
+    errors = []
+
+    def start_worker():
+        conn = hs._connect(path)
+        try:
+            hs.migrate(conn)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=start_worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert not errors
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(hs.MIGRATIONS)
+
+
+def test_rescoring_a_session_updates_it_in_place(tmp_path):
+    store = _store(tmp_path)
+    output = {"user_id": "u1", "test_id": "t1", "session_key": "thread-1", "transcripts": {"part_1": "hello"},
+              "score": {"band": 6.0, "fluency": 6.0}, "per_part": {"part_1": {"fluency": 6.0}}}
+    store.record_speaking(output)                                    # first run
+    store.record_speaking(output)                                    # checkpoint hit
+    store.record_speaking({**output, "score": {"band": 6.5, "fluency": 7.0}, "per_part": {}})   # re-evaluation
+    store.record_speaking({**output, "session_key": None})           # live session: its own row
+    store._queue.join()
+
+    sessions = store.test_result("u1", "t1")["speaking"]
+    assert sorted(s["band"] for s in sessions) == [6.0, 6.5]
+    rows = store._reader().execute(
+        "SELECT criterion, part, score FROM scores WHERE session_key = 'thread-1' ORDER BY criterion"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [("band", None, 6.5), ("fluency", None, 7.0)]
+
+
+def test_writing_criteria_are_stored_per_task(tmp_path):
+    store = _store(tmp_path)
+    result = {"band": 6.5, "task2_band": 6.5, "feedback": "ok", "improvements": [],
+              "criteria": {"task2": {"task_response": 6, "coherence_cohesion": 7, "lexical_resource": 6,
+                                     "grammatical_range_accuracy": 6}}}
+    store.record_writing({"user_id": "u1", "test_id": "t1", "test_type": "academic"}, result, "key")
+    store._queue.join()
+    rows = store._reader().execute(
+        "SELECT criterion, score FROM scores WHERE module = 'writing' AND part = 'task2' ORDER BY criterion"
+    ).fetchall()
+    assert dict(tuple(r) for r in rows) == {"coherence_cohesion": 7.0, "grammatical_range_accuracy": 6.0,
+                                            "lexical_resource": 6.0, "task_response": 6.0}
+    assert store.user_history("u1")["writing"][0]["band"] == 6.5
+
+
+def test_close_writes_queued_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(hs, "HISTORY_FLUSH_INTERVAL_MS", 60_000)     # nothing is written before close()
+    store = _store(tmp_path)
+    for n in range(5):
+        store.record_writing({"user_id": "u1", "test_id": f"t{n}", "test_type": "academic"}, {"band": 6.0}, None)
+    store.close()
+    assert not store._writer.is_alive()
+    assert len(_store(tmp_path).user_history("u1")["writing"]) == 5
+
+
+def test_a_bad_record_does_not_sink_its_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(hs, "HISTORY_FLUSH_INTERVAL_MS", 500)
+    store = _store(tmp_path)
+    store.record_writing({"user_id": "u1", "test_id": "t1", "test_type": "academic"}, {"band": 6.0}, None)
+    store._enqueue({"kind": "writing", "user_id": "u1", "row": ("too", "short"), "scores": [], "created_at": 0})
+    store.record_writing({"user_id": "u1", "test_id": "t2", "test_type": "academic"}, {"band": 7.0}, None)
+    store._queue.join()
+    assert sorted(w["test_id"] for w in store.user_history("u1")["writing"]) == ["t1", "t2"]
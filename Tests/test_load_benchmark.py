@@ -0,0 +1,39 @@
+import json
+
+from Tests.benchmarks.load_generator import DEFAULT_BASELINE, SCENARIOS, compare, percentile, run_benchmark
+from Tests.fakes.fake_llm import FakeLLMConfig
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+
+def test_compare_flags_p95_and_throughput_regressions():
+    baseline = {"results": {"tts_speak": {"4": {"p95_ms": 100.0, "throughput_rps": 40.0}}}}
+    current = {"results": {"tts_speak": {"4": {"p95_ms": 130.0, "throughput_rps": 30.0}}}}
+    assert len(compare(current, baseline, tolerance=0.2)) == 2
+    assert compare(baseline, baseline, tolerance=0.2) == []
+
+
+def test_committed_baseline_covers_every_scenario():
+    with open(DEFAULT_BASELINE, encoding="utf-8") as f:
+        baseline = json.load(f)
+    assert set(baseline["results"]) == set(SCENARIOS)
+    for name, levels in baseline["results"].items():
+        assert all(stats["errors"] == 0 for stats in levels.values()), name
+
+
+def test_every_endpoint_runs_offline_without_errors():
+    report = run_benchmark(
+        list(SCENARIOS),
+        concurrency_levels=[2],
+        n_requests=4,
+        llm_config=FakeLLMConfig(latency_ms=5, token_latency_ms=0, seed=1),
+        upstream_latency_ms=5,
+    )
+    for name, levels in report["results"].items():
+        assert levels["2"]["errors"] == 0, name
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from Tests.benchmarks.memory_benchmark import _measure
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux smaps_rollup")
+
+
+def test_forked_workers_share_preloaded_weights():
+    independent = _measure("independent", "synthetic:64", 2)
+    preload = _measure("preload", "synthetic:64", 2)
+    # every independent worker holds its own 64 MB; forked ones keep it shared
+    assert independent["uss_mb"] > 50
+    assert preload["uss_mb"] < 20
+    assert preload["pss_mb"] < independent["pss_mb"]
+
+
+def test_chunk_pool_processes_pay_for_their_own_model():
+    chunked = _measure("chunked", "synthetic:64", 1, chunk_workers=2)
+    assert chunked["chunk_workers"] == 2
+    # the server worker shares the preloaded copy; each chunk process holds a private one
+    assert chunked["uss_mb"] < 20
+    assert chunked["chunk_pss_mb"] > 2 * 50
@@ -0,0 +1,66 @@
+import pytest
+
+import agents.scoring_agent as scoring_agent
+import services.model_service as model_service
+from services.model_service import escalation_reason, tier_stats
+from Tests.fakes.fake_llm import FakeLLM, FakeLLMConfig
+
+QUESTION = "Some people think that university education should be free. To what extent do you agree or disagree?"
+ESSAY = "Many governments debate whether students should pay for higher study. " * 30
+
+
+def _scores(tr, cc, lr, gra):
+    return {"task_response": tr, "coherence_cohesion": cc, "lexical_resource": lr, "grammatical_range_accuracy": gra}
+
+
+def test_escalation_rules():
+    assert escalation_reason(_scores(6, 6, 6, 6)) is None
+    assert escalation_reason(_scores(6, 7, 6, 7)) is None            # mean 6.5, mid band
+    assert escalation_reason(_scores(5, 7, 6, 6)) == "criteria_disagree"
+    assert escalation_reason(_scores(6, 6, 6, 7)) == "near_boundary"  # mean 6.25 rounds either way
+    assert escalation_reason({"band": 6.5}) == "missing_criteria"
+    assert escalation_reason(None) == "unparseable"
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    def install(fast_config, strong_config):
+        fast = FakeLLM(fast_config, model="fake-fast")
+        strong = FakeLLM(strong_config, model="fake-strong")
+        monkeypatch.setattr(model_service, "SCORE_CASCADE", True)
+        monkeypatch.setitem(model_service.MODEL_PRICES, "fake-fast", (0.10, 0.40))
+        monkeypatch.setitem(model_service.MODEL_PRICES, "fake-strong", (1.25, 10.00))
+        monkeypatch.setattr(scoring_agent, "fast_llm", fast)
+        monkeypatch.setattr(scoring_agent, "strong_llm", strong)
+        return fast, strong
+
+    tier_stats.reset()
+    yield install
+    tier_stats.reset()
+
+
+def test_confident_fast_scores_are_not_escalated(tiers):
+    fast, strong = tiers(FakeLLMConfig(latency_ms=1, band_mean=6.0, band_sd=0, seed=1),
+                         FakeLLMConfig(latency_ms=1, seed=2))
+    for _ in range(5):
+        result = scoring_agent.score_task("task2", "academic", QUESTION, ESSAY)
+        assert result["band"] == 6.0 and result["tier"] == "fast"
+    assert len(fast.calls) == 5 and not strong.calls
+    assert tier_stats.stats()["cascade"]["escalation_rate"] == 0.0
+
+
+def test_uncertain_scores_escalate_and_tiers_are_reported(tiers):
+    fast, strong = tiers(FakeLLMConfig(latency_ms=1, band_mean=6.0, band_sd=0.4, malformed_rate=0.1, seed=3),
+                         FakeLLMConfig(latency_ms=5, band_mean=6.0, band_sd=0, seed=4))
+    results = [scoring_agent.score_task("task2", "academic", QUESTION, ESSAY) for _ in range(30)]
+    escalated = [r for r in results if r["tier"] == "strong"]
+    assert 0 < len(escalated) < len(results)
+    assert len(strong.calls) == len(escalated) and len(fast.calls) == len(results)
+    assert all(r["band"] == 6.0 and r["escalated"] for r in escalated)
+
+    stats = tier_stats.stats()
+    assert stats["cascade"]["scored"] == 30 and stats["cascade"]["escalated"] == len(escalated)
+    by_stage = {t["stage"]: t for t in stats["tiers"]}
+    assert by_stage["score_fast"]["model"] == "fake-fast" and by_stage["score_fast"]["calls"] == 30
+    assert by_stage["score_strong"]["mean_latency_s"] > by_stage["score_fast"]["mean_latency_s"]
+    assert by_stage["score_strong"]["cost_per_call_usd"] > by_stage["score_fast"]["cost_per_call_usd"] > 0
@@ -0,0 +1,68 @@
+from agents.progress_agent import ProgressAnalytics
+from services.history_service import HistoryStore
+
+
+def _speaking(user, band, session_key=None, test_id="t1"):
+    return {"user_id": user, "test_id": test_id, "session_key": session_key,
+            "score": {"band": band, "fluency": band, "grammar": band - 1}}
+
+
+def test_analytics_follow_writes_from_other_workers(tmp_path):
+    path = str(tmp_path / "history.db")
+    worker_a, worker_b = HistoryStore(path), HistoryStore(path)    # two processes' stores, one database
+    analytics = ProgressAnalytics(capacity=4)
+    analytics.attach(worker_b, refresh_interval=0)
+    assert analytics.user_progress("u1") is None
+
+    worker_a.record_speaking(_speaking("u1", 6.0, "s1"))
+    worker_a.record_writing({"user_id": "u2", "test_id": "w1", "test_type": "academic"},
+                            {"band": 7.0, "task2_band": 7.0})
+    worker_a._queue.join()
+
+    progress = analytics.user_progress("u1")
+    assert progress["criteria"]["fluency"]["mean"] == 6.0
+    assert progress["weakest_criterion"] == "grammar"
+    assert analytics.cohort_summary("academic")["criteria"]["writing_band"]["mean"] == 7.0
+
+
+def test_rescored_session_is_not_counted_twice(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    analytics = ProgressAnalytics()
+    analytics.attach(store, refresh_interval=0)
+    store.record_speaking(_speaking("u1", 5.0, "s1"))
+    store.record_speaking(_speaking("u1", 7.0, "s2", test_id="t2"))
+    store._queue.join()
+    assert analytics.user_progress("u1")["criteria"]["speaking_band"]["count"] == 2
+
+    store.record_speaking(_speaking("u1", 6.0, "s1"))                # /re-evaluate of the first session
+    store._queue.join()
+    band = analytics.user_progress("u1")["criteria"]["speaking_band"]
+    assert band["count"] == 2 and band["mean"] == 6.5 and band["last"] == 7.0
+
+
+def test_queries_refresh_at_most_once_per_interval(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    analytics = ProgressAnalytics()
+    analytics.attach(store, refresh_interval=3600)
+    store.record_speaking(_speaking("u1", 6.0))
+    store._queue.join()
+    assert analytics.user_progress("u1") is None                     # within the interval: cached view
+    analytics.refresh()
+    assert analytics.user_progress("u1")["criteria"]["speaking_band"]["count"] == 1
+
+
+def test_writing_criteria_are_analysed_per_session(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    analytics = ProgressAnalytics()
+    analytics.attach(store, refresh_interval=0)
+    criteria = {"task_response": 6.0, "coherence_cohesion": 7.0, "lexical_resource": 7.0, "grammatical_range_accuracy": 7.0}
+    store.record_writing({"user_id": "u1", "test_id": "w1", "test_type": "academic"},
+                         {"band": 6.5, "task1_band": 5.0, "task2_band": 7.0,
+                          "criteria": {"task1": {**criteria, "task_response": 4.5}, "task2": criteria}})
+    store._queue.join()
+
+    progress = analytics.user_progress("u1")
+    task_response = progress["criteria"]["writing_task_response"]
+    assert task_response["count"] == 1 and task_response["mean"] == 5.5               # task 2 counts double
+    assert progress["criteria"]["writing_coherence_cohesion"]["mean"] == 7.0
+    assert progress["weakest_criterion"] == "writing_task_response"                  # not the task1 band
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+
+import agents.reading_agent as ra
+from Tests.fakes.fake_llm import FakeLLMConfig, install_fake_llm
+
+TEST_ID = "academic_sample_1"
+ALL_RIGHT = {1: "FALSE", 2: "TRUE", 3: "NOT GIVEN", 4: "FALSE", 5: "TRUE", 6: "B", 7: "C", 8: "D",
+             9: "organisation", 10: "register", 11: "wildflower meadows", 12: "biology", 13: "air pollution"}
+
+
+def test_answer_variants_are_accepted():
+    test = ra.reading_bank.get(TEST_ID)
+    sheet = {1: "f", 2: "T", 3: "ng", 4: "False.", 5: " true ", 6: "b", 7: "(C)", 8: "d",
+             9: "Organization", 10: "the central register", 11: "Wild flower meadows", 12: "BIOLOGY", 13: "pollution"}
+    assert test.grade([sheet])[0]["raw_score"] == 13
+    wrong = test.grade([{1: "TRUE", 9: "organise", 12: ""}])[0]
+    assert wrong["raw_score"] == 0 and 12 in wrong["incorrect"]
+
+
+def test_official_band_conversion():
+    assert ra.BAND_TABLES["academic"][[40, 35, 30, 23, 15, 10]].tolist() == [9.0, 8.0, 7.0, 6.0, 5.0, 4.0]
+    assert ra.BAND_TABLES["general_training"][[40, 34, 30, 23, 15]].tolist() == [9.0, 7.0, 6.0, 5.0, 4.0]
+    test = ra.reading_bank.get(TEST_ID)
+    result = test.grade([ALL_RIGHT])[0]
+    assert result["band"] == 9.0 and result["band_estimated"]
+
+
+def test_batch_grading_matches_single_sheets_and_is_fast():
+    test = ra.reading_bank.get(TEST_ID)
+    rng = np.random.default_rng(0)
+    sheets = [{n: (a if rng.random() < 0.6 else "wrong") for n, a in ALL_RIGHT.items()} for _ in range(1000)]
+    start = time.perf_counter()
+    batch = test.grade(sheets)
+    per_sheet_us = (time.perf_counter() - start) / len(sheets) * 1e6
+    assert [r["raw_score"] for r in batch[:20]] == [test.grade([s])[0]["raw_score"] for s in sheets[:20]]
+    assert per_sheet_us < 2000
+
+
+def test_explanations_are_generated_once_per_question(tmp_path, monkeypatch):
+    monkeypatch.setattr(ra, "reading_bank", ra.ReadingBank(cache_dir=str(tmp_path)))
+    monkeypatch.setattr(ra, "llm", ra.llm)
+    llm = install_fake_llm(FakeLLMConfig(latency_ms=1, token_latency_ms=0, seed=1))
+    sheet = {**ALL_RIGHT, 1: "TRUE", 6: "A"}
+    first = ra.grade_submission(TEST_ID, sheet)
+    assert sorted(first["explanations"]) == [1, 6] and len(llm.calls) == 2
+    ra.grade_submission(TEST_ID, sheet)
+    assert len(llm.calls) == 2
+    # survives a restart through the on-disk cache
+    monkeypatch.setattr(ra, "reading_bank", ra.ReadingBank(cache_dir=str(tmp_path)))
+    assert ra.grade_submission(TEST_ID, sheet)["explanations"][1]["explanation"] and len(llm.calls) == 2
+
+
+def test_blank_answer_never_matches_an_a_key():
+    test = ra.ReadingTest({
+        "test_id": "letters", "passages": [{"id": 1, "text": "..."}],
+        "questions": [{"n": 1, "type": "mcq", "answer": ["A"]}, {"n": 2, "type": "gap", "answer": ["the one"]}],
+    })
+    assert test.grade([{}])[0]["raw_score"] == 0
+    assert test.grade([{1: "", 2: " "}])[0]["raw_score"] == 0
+    assert test.grade([{1: "a", 2: "One"}])[0]["correct"] == [1, 2]
+    assert test.grade([{1: "B", 2: "1"}])[0]["correct"] == [2]
@@ -0,0 +1,93 @@
+import pytest
+
+import agents.speaking_agent as sa
+from Tests.fakes.fake_llm import FakeGenai, FakeLLM, FakeLLMConfig
+
+TRANSCRIPT = ("I live in a small town near the coast and I really enjoy it because the people are friendly "
+              "and there is always something to do at the weekend, like walking along the beach.")
+
+
+class FlakyGenai(FakeGenai):
+    """Fails the first evaluation call, then behaves like the fake."""
+
+    def __init__(self, llm):
+        super().__init__(llm)
+        self.failures = 1
+
+    def GenerativeModel(self, model_name, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("LLM unavailable")
+        return super().GenerativeModel(model_name)
+
+
+@pytest.fixture
+def speaking(tmp_path, monkeypatch):
+    monkeypatch.setattr(sa, "SPEAKING_CHECKPOINTS", True)
+    monkeypatch.setattr(sa, "SPEAKING_CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(sa, "_checkpointed_pid", None)
+    monkeypatch.setattr(sa, "genai", FlakyGenai(FakeLLM(FakeLLMConfig(latency_ms=1, token_latency_ms=0, seed=1))))
+    asr_calls = []
+    monkeypatch.setattr(sa, "transcribe_audio_detailed",
+                        lambda path: asr_calls.append(path) or {"text": TRANSCRIPT, "words": []})
+    audio = tmp_path / "part_1.wav"
+    audio.write_bytes(b"RIFF fake audio")
+    return asr_calls, lambda: {"test_id": "t1", "user_id": "u1", "responses": {"part_1": str(audio)}}
+
+
+def test_retry_resumes_from_transcripts_and_reevaluates_without_audio(speaking):
+    asr_calls, new_state = speaking
+    with pytest.raises(RuntimeError):
+        sa.run_speaking(new_state())
+    assert len(asr_calls) == 1
+
+    result = sa.run_speaking(new_state())  # retry: only the evaluate node runs again
+    assert len(asr_calls) == 1
+    assert result["transcripts"]["part_1"] == TRANSCRIPT and result["aggregated"]["band"] is not None
+
+    assert sa.run_speaking(new_state())["aggregated"] == result["aggregated"]  # finished run is returned as is
+    again = sa.reevaluate_speaking("u1", "t1")
+    assert len(asr_calls) == 1 and again["aggregated"]
+    assert sa.reevaluate_speaking("u1", "unknown-test") is None
+
+
+def test_thread_id_depends_on_audio_content(tmp_path):
+    a, b = tmp_path / "a.wav", tmp_path / "b.wav"
+    a.write_bytes(b"one")
+    b.write_bytes(b"two")
+    assert sa.speaking_thread_id("u", "t", {"part_1": str(a)}) != sa.speaking_thread_id("u", "t", {"part_1": str(b)})
+    assert sa.speaking_thread_id("u", "t", {"part_1": str(a)}) == sa.speaking_thread_id("u", "t", {"part_1": str(a)})
+
+
+def test_failed_transcription_is_not_checkpointed(speaking, monkeypatch):
+    asr_calls, new_state = speaking
+    results = iter([{"text": "Error in transcription: 503", "words": [], "error": "503 Service Unavailable"},
+                    {"text": TRANSCRIPT, "words": []}])
+    monkeypatch.setattr(sa, "transcribe_audio_detailed", lambda path: asr_calls.append(path) or next(results))
+    monkeypatch.setattr(sa.genai, "failures", 0)
+
+    with pytest.raises(sa.TranscriptionError):
+        sa.run_speaking(new_state())
+    result = sa.run_speaking(new_state())  # the retry transcribes again instead of returning the error
+    assert len(asr_calls) == 2
+    assert result["transcripts"]["part_1"] == TRANSCRIPT and not result["asr_errors"]
+
+
+def test_expired_runs_are_pruned(speaking, monkeypatch):
+    asr_calls, new_state = speaking
+    monkeypatch.setattr(sa.genai, "failures", 0)
+    sa.run_speaking(new_state())
+    assert sa.prune_checkpoints(ttl_days=1) == 0
+    assert sa.prune_checkpoints(ttl_days=-1) == 1
+    assert sa.reevaluate_speaking("u1", "t1") is None
+    sa.run_speaking(new_state())
+    assert len(asr_calls) == 2
+
+
+def test_reevaluating_a_run_without_transcripts_returns_none(speaking, monkeypatch):
+    asr_calls, new_state = speaking
+    monkeypatch.setattr(sa, "transcribe_audio_detailed",
+                        lambda path: {"text": "Error in transcription: 503", "words": [], "error": "503"})
+    with pytest.raises(sa.TranscriptionError):
+        sa.run_speaking(new_state())
+    assert sa.reevaluate_speaking("u1", "t1") is None
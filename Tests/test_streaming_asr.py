@@ -0,0 +1,74 @@
+import numpy as np
+
+from services.streaming_asr_service import IncrementalTranscriber
+
+SR = 16000
+
+
+def _speech(seconds_on, seconds_off, repeats):
+    rng = np.random.default_rng(0)
+    parts = []
+    for _ in range(repeats):
+        parts += [rng.normal(0, 0.3, int(seconds_on * SR)), np.zeros(int(seconds_off * SR))]
+    return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+
+
+def test_windows_are_transcribed_while_audio_arrives():
+    calls = []
+
+    def fake_transcribe(samples):
+        calls.append(len(samples) / SR)
+        n = len(calls)
+        return {"text": f"w{n}", "words": [{"word": f"w{n}", "start": 0.0, "end": 0.5}]}
+
+    t = IncrementalTranscriber(SR, window_seconds=4, transcribe=fake_transcribe)
+    audio = _speech(1.5, 0.5, 10)                       # 20 s with a pause every 2 s
+    for i in range(0, len(audio), 3201):                # odd frame size splits samples
+        t.feed(audio[i:i + 3201])
+    windows_before_end = len(calls)
+    result = t.finish()
+
+    assert windows_before_end >= 3
+    assert all(3.0 <= c <= 8.0 for c in calls[:windows_before_end])
+    assert abs(sum(calls) - 20.0) < 1e-3 and abs(t.duration - 20.0) < 1e-3
+    assert result["text"] == " ".join(f"w{i}" for i in range(1, len(calls) + 1))
+    starts = [w["start"] for w in result["words"]]
+    assert starts == sorted(starts) and starts[0] == 0.0
+    assert t.audio()[:4] == b"RIFF"
+
+
+def test_part_audio_is_capped():
+    import pytest
+    from services.streaming_asr_service import StreamLimitExceeded
+
+    t = IncrementalTranscriber(SR, window_seconds=4, max_seconds=5,
+                               transcribe=lambda s: {"text": "x", "words": []})
+    audio = _speech(1.5, 0.5, 3)                        # 6 s
+    with pytest.raises(StreamLimitExceeded):
+        for i in range(0, len(audio), 3200):
+            t.feed(audio[i:i + 3200])
+    assert t.duration <= 5.0
+    with pytest.raises(ValueError):
+        IncrementalTranscriber(1_000_000)
+
+
+def test_failed_windows_are_dropped_and_fail_the_part():
+    import itertools
+    calls = itertools.count(1)
+
+    def flaky_transcribe(samples):
+        n = next(calls)
+        if n == 2:
+            return {"text": "Error in transcription: 503 Server Error", "words": [], "error": "503"}
+        return {"text": f"w{n}", "words": []}
+
+    t = IncrementalTranscriber(SR, window_seconds=4, transcribe=flaky_transcribe)
+    audio = _speech(1.5, 0.5, 10)
+    partials = []
+    for i in range(0, len(audio), 3200):
+        t.feed(audio[i:i + 3200])
+        partials += t.partials()
+    result = t.finish()
+    assert "Error" not in result["text"] and "w2" not in result["text"] and "w1" in result["text"]
+    assert all("error" not in p for p in partials)
+    assert "1 of" in result["error"]
@@ -0,0 +1,30 @@
+import pytest
+
+from services import token_service as ts
+
+
+def test_question_counts_against_the_answer_budget(monkeypatch):
+    monkeypatch.setitem(ts.TOKEN_BUDGETS, "writing", 200)
+    answer = "word " * 130                               # ~163 tokens: fits on its own
+    assert ts.enforce_budget(answer, "writing") == answer
+    question = "Discuss both views and give your own opinion. " * 8    # ~94 tokens
+    shortened = ts.enforce_task_budget(question, answer, "writing")
+    assert "words omitted" in shortened
+    assert ts.estimate_tokens(question) + ts.estimate_tokens(shortened) <= 200 * 1.1
+
+
+def test_over_long_question_is_rejected_not_truncated(monkeypatch):
+    monkeypatch.setitem(ts.TOKEN_BUDGETS, "writing", 200)
+    with pytest.raises(ts.TokenBudgetExceeded, match="Question"):
+        ts.enforce_task_budget("Why? " * 200, "Because.", "writing")
+
+
+def test_user_ledger_keeps_the_most_recently_active_users(monkeypatch):
+    monkeypatch.setattr(ts, "TOKEN_LEDGER_MAX_USERS", 3)
+    monkeypatch.setattr(ts, "_user_ledger", ts.OrderedDict())
+    for user in ("a", "b", "c", "a", "d"):
+        with ts.track_request("writing", user) as usage:
+            usage.add("score", 10, 5)
+    assert list(ts._user_ledger) == ["c", "a", "d"]
+    assert ts.user_token_usage("a")["writing"] == {"prompt_tokens": 20, "completion_tokens": 10, "requests": 2}
+    assert ts.user_token_usage("b") == {}
@@ -0,0 +1,65 @@
+from services.linguistic_service import extract_features, round_band, triage
+from Tests.benchmarks.triage_benchmark import run, writing_calls
+
+QUESTION = "Some people think that university education should be free. To what extent do you agree or disagree?"
+ESSAY = (
+    "Many governments debate whether students should pay for higher study. In my view, tuition should be "
+    "free because it widens access and benefits the whole economy. Graduates pay more tax over their lives. "
+) * 6
+
+
+def test_features_of_a_normal_answer():
+    features = extract_features(ESSAY, QUESTION, "task2")
+    assert features["word_count"] == len(ESSAY.split())
+    assert features["min_words"] == 250
+    assert features["sentence_count"] == 18
+    assert features["language"] == "en"
+    assert 0 < features["question_overlap"] < 1
+    assert triage(features) is None
+
+
+def test_clearly_invalid_answers_are_triaged():
+    assert triage(extract_features("", QUESTION, "task2"))["reason"] == "no_answer"
+    assert triage(extract_features("I agree with this idea.", QUESTION, "task2"))["reason"] == "too_short"
+    assert triage(extract_features(QUESTION, QUESTION, "task2"))["reason"] == "copied_question"
+    spanish = "Creo que la educación universitaria debería ser gratuita para todos porque es un derecho de los jóvenes."
+    verdict = triage(extract_features(spanish, QUESTION, "task2"))
+    assert verdict["reason"] == "not_english" and verdict["band"] == 0.0 and verdict["feedback"]
+
+
+def test_benchmark_counts_avoided_calls():
+    traffic = [
+        ("writing", {"task1_question": QUESTION, "task1_answer": ESSAY, "task2_question": QUESTION, "task2_answer": ESSAY}),
+        ("writing", {"task1_question": QUESTION, "task1_answer": "ok", "task2_question": QUESTION, "task2_answer": "no"}),
+        ("speaking", {"transcripts": {"part_1": "Error in transcription: 503 Server Error: Service Unavailable for url", "part_2": ""}}),
+        ("speaking", {"transcripts": {"part_1": "I think so"}, "asr_errors": {"part_1": "timeout"}}),
+    ]
+    report = run(traffic)
+    assert writing_calls(2) == 5 and writing_calls(0) == 0
+    assert report["llm_calls_without_triage"] == {"writing": 10, "speaking": 2}
+    assert report["llm_calls_with_triage"] == {"writing": 5, "speaking": 0}
+    assert report["llm_calls_avoided"] == 7
+    assert report["short_circuited"] == {"writing": 1, "speaking": 2}
+
+
+def test_failed_transcriptions_never_reach_the_llm():
+    import agents.speaking_agent as sa
+    from Tests.fakes.fake_llm import FakeLLMConfig, install_fake_llm
+
+    llm = install_fake_llm(FakeLLMConfig(latency_ms=1, seed=1))
+    error = "Error in transcription: 503 Server Error: Service Unavailable for url: https://api.elevenlabs.io/v1/speech-to-text"
+    for state in ({"transcripts": {"part_1": error}},                                   # stored before the flag
+                  {"transcripts": {"part_1": ""}, "asr_errors": {"part_1": "timeout"}}):
+        result = sa.evaluate_node(state)
+        assert result["per_part"]["part_1"]["triage"] == "no_answer"
+    assert not llm.calls
+
+
+def test_bands_round_half_up():
+    from agents.writing_agent import _final_result
+
+    assert [round_band(x) for x in (6.25, 6.75, 5.24, 6.5, 0.25)] == [6.5, 7.0, 5.0, 6.5, 0.5]
+    # one triaged task: Task 2 counts double; (5.25 + 2 * 6.75) / 3 = 6.25 must not round to even
+    assert _final_result({"band": 4.5, "triage": "too_short"}, {"band": 6.0})["band"] == 5.5
+    assert _final_result({"band": 3.0, "triage": "too_short"}, {"band": 7.5})["band"] == 6.0
+    assert _final_result({"band": 5.25, "triage": "too_short"}, {"band": 6.75})["band"] == 6.5
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+
+from services import vector_db_service as vdb
+from services.evaluation_service import rubrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXEMPLARS = os.path.join(ROOT, "data", "exemplars", "writing_exemplars.jsonl")
+
+
+def _build(tmp_path):
+    documents = list(vdb.exemplar_documents(EXEMPLARS)) + list(vdb.rubric_documents(rubrics))
+    return vdb.build_index(documents, str(tmp_path / "index"))
+
+
+def test_index_loads_memory_mapped_and_fast(tmp_path):
+    index_dir = _build(tmp_path)
+    start = time.perf_counter()
+    index = vdb.VectorIndex.load_if_exists(index_dir)
+    assert time.perf_counter() - start < 0.1
+    assert index.vectors.filename and len(index.kind) == json.load(open(os.path.join(index_dir, "manifest.json")))["documents"]
+    assert vdb.VectorIndex.load_if_exists(str(tmp_path / "missing")) is None
+
+
+def test_nearest_exemplars_match_topic_and_task(tmp_path):
+    index = vdb.VectorIndex.load_if_exists(_build(tmp_path))
+    answer = ("Some people think university education should be free for every student, "
+              "paid by the government through taxes, while others believe students should pay tuition fees.")
+    hits = index.search(answer, 3, vdb.KIND_EXEMPLAR, "task2", nprobe=len(index.centroids))
+    assert len(hits) == 3
+    assert "universit" in hits[0]["excerpt"].lower()
+    assert hits[0]["similarity"] >= hits[-1]["similarity"]
+    assert index.search(answer, 3, vdb.KIND_EXEMPLAR, "task1_academic", nprobe=len(index.centroids)) != hits
+
+
+def test_scoring_context_is_smaller_than_full_rubric(tmp_path, monkeypatch):
+    monkeypatch.setattr(vdb, "vector_index", vdb.VectorIndex.load_if_exists(_build(tmp_path)))
+    context = vdb.retrieve_scoring_context("task2", None, "Traffic congestion in big cities is getting worse every year.")
+    assert context["exemplars"] and context["descriptors"]
+    assert len(json.dumps(context["descriptors"])) <= len(json.dumps(rubrics["task2"]))
+    monkeypatch.setattr(vdb, "vector_index", None)
+    assert vdb.retrieve_scoring_context("task2", None, "anything") is None
+
+
+def test_descriptors_always_include_the_bottom_levels(tmp_path):
+    index = vdb.VectorIndex.load_if_exists(_build(tmp_path))
+    levels = index.descriptors("task2", [8.5, 9.0], floor_levels=2)
+    # a junk answer retrieved among high-band exemplars can still be scored at the bottom of the scale
+    assert {"3", "5", "7", "9"} == set(levels["task_response"])
+    assert {"5", "7"} == set(levels["lexical_resource"])
+    assert set(index.descriptors("task2", [8.5, 9.0], floor_levels=0)["task_response"]) == {"7", "9"}
+
+
+def test_index_built_with_another_dim_is_not_loaded(tmp_path, monkeypatch):
+    index_dir = _build(tmp_path)
+    monkeypatch.setattr(vdb, "VECTOR_DIM", vdb.VECTOR_DIM * 2)
+    assert vdb.VectorIndex.load_if_exists(index_dir) is None
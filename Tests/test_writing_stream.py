@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import agents.writing_agent as wa
+
+
+def test_each_task_band_is_streamed_as_soon_as_it_is_scored(monkeypatch):
+    scored = []
+
+    def score_task(task, *args, **kwargs):
+        scored.append(task)
+        return {"band": 6.0 if task == "task1" else 7.0}
+
+    monkeypatch.setattr(wa, "score_task", score_task)
+    monkeypatch.setattr(wa, "stream_feedback", lambda *a: iter(['{"feedback": "ok"}']))
+    monkeypatch.setattr(wa, "generate_improvements", lambda *a: {"improvements": []})
+    request = SimpleNamespace(
+        test_type="general training", task1_image=None,
+        task1_question="Write a letter to your landlord about a broken heater.",
+        task1_answer="Dear Sir, the heater in my flat has stopped working and it is very cold. " * 12,
+        task2_question="Some people believe exams are unfair. To what extent do you agree or disagree?",
+        task2_answer="It is often argued that examinations are an unfair way to assess students. " * 20,
+    )
+
+    stream = wa.evaluate_task_stream(request)
+    assert next(stream)[0] == "precheck"
+    event, data = next(stream)
+    assert (event, data["band"]) == ("task1_band", 6.0)
+    assert scored == ["task1"]                     # task 2 not scored yet
+    assert next(stream)[0] == "task2_band" and scored == ["task1", "task2"]
+    events = [e for e, _ in stream]
+    assert events[0] == "band" and events[-1] == "done"
@@ -0,0 +1,198 @@
+"""
+Bulk writing evaluation.
+
+Runs many submissions through evaluate_task with bounded concurrency,
+deduplicates identical submissions by content hash and reports per-item
+errors instead of failing the whole batch. Given an admission controller
+(the HTTP endpoint passes one, after admitting the batch as a whole), every
+item waits for a concurrency slot in the lowest priority class for its own
+user/tenant; items are not rate-limited again, so a large batch is paced by
+free capacity rather than rejected item by item.
+
+CLI usage (reads/writes JSONL, resumes from an existing output file). Run it from the
+project root, where `uvicorn main:app` runs; it needs the same agents/, services/ and
+workflow/ layout as main.py (see the README):
+    python -m workflow.batch_flow submissions.jsonl results.jsonl --concurrency 8
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import logging
+import contextvars
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from dotenv import load_dotenv
+
+from agents.writing_agent import evaluate_task
+from services.token_service import enforce_task_budget, track_request
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# How long one batch item may wait for a slot before it fails (interactive requests use ADMISSION_QUEUE_TIMEOUT_S).
+BATCH_ITEM_QUEUE_TIMEOUT_S = float(os.getenv("BATCH_ITEM_QUEUE_TIMEOUT_S", "3600"))
+
+SUBMISSION_FIELDS = (
+    "test_type",
+    "task1_question",
+    "task1_answer",
+    "task1_image",
+    "task2_question",
+    "task2_answer",
+)
+
+
+def submission_key(submission: Dict[str, Any]) -> str:
+    """Content hash of the fields that affect scoring."""
+    content = {f: submission.get(f) for f in SUBMISSION_FIELDS}
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def evaluate_submission(submission: Dict[str, Any], admission: Any = None, client: Optional[str] = None) -> Dict[str, Any]:
+    request = SimpleNamespace(**{f: submission.get(f) for f in SUBMISSION_FIELDS})
+    request.task1_answer = enforce_task_budget(request.task1_question, request.task1_answer, "writing")
+    request.task2_answer = enforce_task_budget(request.task2_question, request.task2_answer, "writing")
+    # blocks this batch worker (not a server thread) while queued; the batch was rate-limited
+    # once on admission, so items only wait for a slot (lowest class) and fail only on timeout
+    ticket = admission.acquire(submission.get("user_id"), submission.get("tenant_id"), None, client=client,
+                               timeout=BATCH_ITEM_QUEUE_TIMEOUT_S, rate_limited=False) if admission else None
+    try:
+        with track_request("writing_batch", submission.get("user_id")) as usage:
+            result = evaluate_task(request)
+    finally:
+        if ticket:
+            admission.release(ticket)
+    if "error" in result:
+        raise ValueError(result["error"])
+    return {**result, "usage": usage.summary()}
+
+
+def run_batch(
+    submissions: Iterable[Dict[str, Any]],
+    max_concurrency: int = BATCH_MAX_CONCURRENCY,
+    done_keys: Optional[Set[str]] = None,
+    admission: Any = None,
+    client: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one result record per submission, in completion order:
+    {"id", "key", "status": "ok", "result"} or {"id", "key", "status": "error", "error"}.
+
+    - Submissions whose key is in done_keys were scored by an earlier run and are skipped (resume).
+    - Duplicates within the batch are evaluated once; later copies carry "duplicate_of".
+    - At most max_concurrency evaluations run at a time.
+    - With `admission`, each item waits for a slot under its user_id/tenant_id (or
+      `client`, the caller's address, when it has no user_id) without a rate check:
+      admitting the batch as a whole is the caller's job.
+    """
+    done_keys = set(done_keys or ())
+    completed = {}     # key -> record produced in this run
+    pending = {}       # future -> (id, key)
+    waiting = {}       # key -> ids of duplicates waiting on that key
+    first_id = {}      # key -> id of the submission that is actually evaluated
+
+    def _records(future):
+        item_id, key = pending.pop(future)
+        try:
+            record = {"id": item_id, "key": key, "status": "ok", "result": future.result()}
+        except Exception as e:
+            logger.error("Batch item %s failed: %s", item_id, e)
+            record = {"id": item_id, "key": key, "status": "error", "error": str(e)}
+        completed[key] = record
+        yield record
+        for dup_id in waiting.pop(key, []):
+            yield {**record, "id": dup_id, "duplicate_of": item_id}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        for index, submission in enumerate(submissions):
+            item_id = submission.get("id", index)
+            key = submission_key(submission)
+            if key in completed:
+                yield {**completed[key], "id": item_id, "duplicate_of": completed[key]["id"]}
+                continue
+            if key in done_keys:
+                continue
+            if key in first_id:
+                waiting.setdefault(key, []).append(item_id)
+                continue
+            first_id[key] = item_id
+
+            while len(pending) >= max_concurrency:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield from _records(future)
+
+            # copy the context so each item is timed under the caller's trace id
+            ctx = contextvars.copy_context()
+            pending[pool.submit(ctx.run, evaluate_submission, submission, admission, client)] = (item_id, key)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield from _records(future)
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            item.setdefault("id", line_no)
+            yield item
+
+
+def load_done_keys(output_path: str) -> Set[str]:
+    """Keys scored successfully by a previous (possibly interrupted) run; failed items are retried."""
+    keys: Set[str] = set()
+    if not os.path.exists(output_path):
+        return keys
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("status") == "ok":
+                    keys.add(record["key"])
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                # last line may be truncated if the previous run was killed mid-write
+                continue
+    return keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-score IELTS writing submissions from JSONL")
+    parser.add_argument("input", help="JSONL file, one TaskSubmission object per line")
+    parser.add_argument("output", nargs="?", help="JSONL results file (appended to and resumed from); stdout if omitted")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    done_keys = load_done_keys(args.output) if args.output else set()
+    if done_keys:
+        logger.info("Resuming: %d submissions already scored", len(done_keys))
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    ok = failed = 0
+    try:
+        for record in run_batch(read_jsonl(args.input), args.concurrency, done_keys):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if record["status"] == "ok":
+                ok += 1
+            else:
+                failed += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info("Batch finished: %d ok, %d failed", ok, failed)
+
+
+if __name__ == "__main__":
+    main()
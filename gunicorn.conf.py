@@ -0,0 +1,32 @@
+"""
+Preload-then-fork deployment: gunicorn -c gunicorn.conf.py main:app
+
+The master imports main.py once, so asr_service loads the local Whisper model
+before any worker exists; workers are forked from it and share the weight pages
+copy-on-write instead of each loading their own copy (plain `uvicorn --workers N`
+spawns fresh interpreters, so every worker pays for the full model).
+
+Compare per-worker memory with Tests/benchmarks/memory_benchmark.py.
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))  # long audio / LLM calls
+graceful_timeout = 30
+
+
+def when_ready(server):
+    # Everything allocated while importing the app is now long-lived: move it out of
+    # the collector's generations so the first gc pass in a worker does not write to
+    # (and privately copy) every shared page holding a Python object header.
+    gc.freeze()
+    server.log.info("App preloaded in master (pid %s); %d objects frozen", os.getpid(), gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    from services.asr_service import after_fork
+    after_fork(workers)
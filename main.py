@@ -1,22 +1,50 @@
 import os
 import time
+import logging
+import requests
 from workflow.practice_module_flow import generate_task1,generate_task2
-from fastapi import FastAPI,UploadFile, File, Form
-from agents.speaking_agent import speaking_agent, format_output
+from fastapi import FastAPI,UploadFile, File, Form, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from agents.speaking_agent import (
+    format_output, stream_speaking, evaluate_node, store_transcription, run_speaking, reevaluate_speaking,
+    TranscriptionError,
+)
 from pydantic import BaseModel
 from agents.scoring_agent import score_task,combine_results
-from typing import List
+from typing import Dict, List
 from typing import Optional
-from agents.writing_agent import evaluate_task
+from agents.writing_agent import evaluate_task, evaluate_task_stream
+from workflow.batch_flow import run_batch, submission_key
 import base64
 import json
 from fastapi import HTTPException,status
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from services.token_service import (
+    RequestUsage, TokenBudgetExceeded, enforce_task_budget, finish_request,
+    iter_with_usage, track_request, user_token_usage,
+)
 from services.asr_service import transcribe_audio
+import services.asr_service as asr_service
 from services.tts_service import speak_text
+import services.tts_service as tts_service
+from services.audio_storage_service import audio_store
+from services.streaming_asr_service import (
+    IncrementalTranscriber, StreamLimitExceeded, ASR_STREAM_MAX_PART_SECONDS, ASR_STREAM_MAX_SESSION_SECONDS,
+)
+from services.history_service import history_store
+from services.admission_service import admission, AdmissionRejected
+from agents.progress_agent import progress_analytics
+from agents.reading_agent import reading_bank, grade_submission
+from services.model_service import tier_stats
+from services.telemetry_service import (
+    span, get_trace_id, set_trace_id, reset_trace_id, metrics_payload,
+    TRACE_HEADER, HTTP_DURATION, HTTP_REQUESTS,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 app= FastAPI(title="IELTS Writing Test API",
              description="Generate IELTS writing tasks and submit answers for scoring and feedback",
     version="1.0.0",
@@ -24,6 +52,30 @@ app= FastAPI(title="IELTS Writing Test API",
     redoc_url="/redoc",      
     openapi_url="/openapi.json"
 )
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Bind a trace id (from X-Trace-Id or fresh) for the request and record HTTP metrics."""
+    token = set_trace_id(request.headers.get(TRACE_HEADER))
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers[TRACE_HEADER] = get_trace_id()
+        return response
+    finally:
+        route = getattr(request.scope.get("route"), "path", request.url.path)
+        HTTP_DURATION.labels(method=request.method, route=route).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(method=request.method, route=route, status=str(status_code)).inc()
+        reset_trace_id(token)
+
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
 #requestmodels
 class UserRequest(BaseModel):
     mode: str
@@ -80,13 +132,13 @@ class WritingTestResponse(BaseModel):
             }
         }
 
-print("Server Started")
+logger.info("Server Started")
 @app.post("/ielts/writing-tests",
           response_model=WritingTestResponse,
     summary="Generate two writing tasks (task1 & task2)"
 )
 def start_module(request:UserRequest):
-    print("Endpoint called with:",request.mode,request.test_type)
+    logger.info("Endpoint called with: %s %s", request.mode, request.test_type)
 
     task1=generate_task1(request.mode,request.test_type)
     task2=generate_task2(request.mode,request.test_type)
@@ -106,6 +158,10 @@ class TaskSubmission(BaseModel):
     task2_question: str
     task2_answer: str
     task1_image: str = None
+    user_id: Optional[str] = None
+    test_id: Optional[str] = None
+    tenant_id: Optional[str] = None
+    mode: Optional[str] = None  # "mock" (timed test) is scheduled ahead of "practice"
     class Config:
         json_schema_extra = {
             "example": {
@@ -122,15 +178,13 @@ class TaskResult(BaseModel):
     band: float
     feedback: str
     improvements: List[str]
+    task1_band: Optional[float] = None
+    task2_band: Optional[float] = None
+    criteria: Optional[dict] = None  # {"task1"/"task2": {criterion: score}}
+    precheck: Optional[dict] = None
+    usage: Optional[dict] = None
 
-@app.post("/ielts/writing-submission",
-          response_model=TaskResult,
-          summary="Submit answers for scoring (returns band, feedback, improvements)")
-
-
-        
-def writing_submission(request: TaskSubmission):
-    
+def _validate_submission(request: TaskSubmission):
     #testtype validation
     if request.test_type not in ["academic","general training"]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
@@ -149,28 +203,225 @@ def writing_submission(request: TaskSubmission):
     if not request.task2_question or not request.task2_answer:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                 detail="Task 2 always requires question and answer for both academic and general training test")
+
+
+def _apply_input_budget(request: TaskSubmission):
+    """Truncate over-long answers, or reject them with 413 when far over budget."""
+    try:
+        request.task1_answer = enforce_task_budget(request.task1_question, request.task1_answer, "writing")
+        request.task2_answer = enforce_task_budget(request.task2_question, request.task2_answer, "writing")
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+
+def _record_writing(request: TaskSubmission, result: dict):
+    """Queue the scored submission for the history store (never blocks the response)."""
+    if "band" in result:
+        submission = request.model_dump()
+        history_store.record_writing(submission, result, submission_key(submission))
+
+
+def _admission_http_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def _client_host(connection) -> Optional[str]:
+    """Client address of a Request/WebSocket; admission keys anonymous callers on it."""
+    return connection.client.host if connection.client else None
+
+
+def _sse(event: str, data) -> str:
+    """Format one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ielts/writing-submission",
+          response_model=TaskResult,
+          summary="Submit answers for scoring (returns band, feedback, improvements)")
+async def writing_submission(request: TaskSubmission, http_request: Request):
+    _validate_submission(request)
+    _apply_input_budget(request)
+    try:
+        ticket = await admission.acquire_async(request.user_id, request.tenant_id, request.mode,
+                                               client=_client_host(http_request))
+    except AdmissionRejected as e:
+        raise _admission_http_error(e)
     try:
-            return evaluate_task(request)
-    except request.Timeout:
-            raise HTTPException(
+        with track_request("writing", request.user_id) as usage:
+            result = await run_in_threadpool(evaluate_task, request)
+        result = {**result, "usage": usage.summary()}
+        _record_writing(request, result)
+        return result
+    except requests.Timeout:
+        logger.warning("Upstream timeout in /ielts/writing-submission", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="service timeout. Please try again later."
+        )
+    except requests.ConnectionError:
+        logger.warning("Upstream unreachable in /ielts/writing-submission", exc_info=True)
+        raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="service unavailable. Please try again later."
         )
-    except request.ConnectionError:
-            raise HTTPException(
-            status_code=status.HTTP_504_SERVICE_UNAVAILABLE,
-            detail="service timeout. Please try again later.")
-
-    except Exception as e:
-            raise HTTPException(
+    except Exception:
+        logger.exception("Error in /ielts/writing-submission")
+        raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Unexpected server error. Please try again later."
         )
-        
+    finally:
+        admission.release(ticket)
+
+
+@app.post("/ielts/writing-submission/stream",
+          summary="Submit answers and stream partial results as server-sent events")
+async def writing_submission_stream(request: TaskSubmission, http_request: Request):
+    _validate_submission(request)
+    _apply_input_budget(request)
+    try:
+        ticket = await admission.acquire_async(request.user_id, request.tenant_id, request.mode,
+                                               client=_client_host(http_request))
+    except AdmissionRejected as e:
+        raise _admission_http_error(e)
+    usage = RequestUsage("writing_stream", request.user_id)
+
+    def event_stream():
+        try:
+            for event, data in iter_with_usage(usage, evaluate_task_stream(request)):
+                if event == "done":
+                    _record_writing(request, {**data, "usage": usage.summary()})
+                yield _sse(event, data)
+        except Exception:
+            logger.exception("Error in /ielts/writing-submission/stream")
+            yield _sse("error", {"error": "Unexpected server error. Please try again later."})
+        finally:
+            admission.release(ticket)
+        finish_request(usage)
+        yield _sse("usage", usage.summary())
+
+    # the background release covers a client that disconnects before the stream starts
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             background=BackgroundTask(admission.release, ticket))
+
+
+class BatchSubmission(BaseModel):
+    submissions: List[TaskSubmission]
+    user_id: Optional[str] = None    # owner of the batch, for admission
+    tenant_id: Optional[str] = None
+
+
+@app.post("/ielts/writing-submission/batch",
+          summary="Score many submissions; streams one JSON result per line (NDJSON) as each finishes")
+async def writing_submission_batch(request: BatchSubmission, http_request: Request):
+    client = _client_host(http_request)
+    # Admit the batch once: one rate-limit token, weighted by its size in the fair queue
+    # so interactive users are not starved. Items then wait for slots without further
+    # rate checks (see run_batch).
+    try:
+        gate = await admission.acquire_async(request.user_id, request.tenant_id, None,
+                                             max(1, len(request.submissions)), client=client)
+    except AdmissionRejected as e:
+        raise _admission_http_error(e)
+    admission.release(gate)
+
+    def result_stream():
+        valid = []
+        for index, submission in enumerate(request.submissions):
+            try:
+                _validate_submission(submission)
+                _apply_input_budget(submission)
+                valid.append({"id": index, **submission.model_dump()})
+            except HTTPException as e:
+                record = {"id": index, "key": submission_key(submission.model_dump()), "status": "error", "error": e.detail}
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        by_id = {item["id"]: item for item in valid}
+        for record in run_batch(valid, admission=admission, client=client):
+            if record["status"] == "ok" and "duplicate_of" not in record:
+                history_store.record_writing(by_id[record["id"]], record["result"], record["key"])
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+class ReadingSubmission(BaseModel):
+    test_id: str
+    answers: Dict[int, str]
+    user_id: Optional[str] = None
+    explain: bool = True
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "test_id": "academic_sample_1",
+                "answers": {"1": "FALSE", "2": "T", "6": "B", "9": "organization"},
+                "user_id": "student-42"
+            }
+        }
+
+
+@app.get("/ielts/reading-tests", summary="Available reading tests")
+def list_reading_tests():
+    return reading_bank.catalogue()
+
+
+@app.get("/ielts/reading-tests/{test_id}", summary="Passages and questions of a reading test (no answers)")
+def get_reading_test(test_id: str):
+    test = reading_bank.get(test_id)
+    if test is None:
+        raise HTTPException(status_code=404, detail=f"Unknown reading test: {test_id}")
+    return test.public()
+
+
+@app.post("/ielts/reading-submission",
+          summary="Grade a reading answer sheet locally (raw score, band) with cached explanations of wrong answers")
+def reading_submission(request: ReadingSubmission):
+    with track_request("reading", request.user_id) as usage:
+        result = grade_submission(request.test_id, request.answers, request.explain)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Unknown reading test: {request.test_id}")
+    return {**result, "usage": usage.summary()}
+
+
+@app.on_event("startup")
+def start_audio_gc():
+    audio_store.start_gc()
 
 
-AUDIO_DIR = "audio_files"
-os.makedirs(AUDIO_DIR, exist_ok=True)
+@app.on_event("shutdown")
+def stop_audio_gc():
+    audio_store.stop_gc()
+
+
+@app.on_event("shutdown")
+def flush_history():
+    history_store.close()
+
+
+@app.on_event("startup")
+def start_progress_analytics():
+    progress_analytics.attach(history_store)
+
+
+@app.get("/audio/stats", summary="Audio storage usage and garbage-collection stats")
+def audio_stats():
+    return audio_store.stats()
+
+
+@app.get("/asr/stats", summary="ASR mode; in hybrid mode the local queue, per-backend latency and breaker states")
+def asr_stats():
+    router = asr_service.asr_router
+    return {"mode": asr_service.ASR_MODE, **(router.stats() if router else {})}
+
+
+@app.get("/admission/stats", summary="Running and queued evaluations per priority class")
+def admission_stats():
+    return admission.stats()
+
+
+@app.get("/llm/stats", summary="Model per stage, latency and cost per model tier, and cascade escalation rate")
+def llm_stats():
+    return tier_stats.stats()
 
 # app = FastAPI(
 #     title="Speech Processing API",
@@ -185,7 +436,7 @@ os.makedirs(AUDIO_DIR, exist_ok=True)
 #   - `local` → pyttsx3 (runs locally)
 #   - `cloud` → ElevenLabs TTS (requires API key & voice ID)
 
-# All uploaded and generated audio files are stored in `audio_files/`.
+# All uploaded and generated audio files are stored in `audio_files/` (content-addressed, see services/audio_storage_service.py).
 # """,
 #     version="1.0.0"
 # )
@@ -198,15 +449,16 @@ os.makedirs(AUDIO_DIR, exist_ok=True)
 )
 async def asr_transcribe(file: UploadFile = File(..., description="Audio file to transcribe")):
     try:
-        filename = f"asr_{int(time.time())}_{file.filename}"
-        file_path = os.path.join(AUDIO_DIR, filename)
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
+        data = await file.read()
+        with span("upload.write"):
+            file_path = audio_store.put_bytes("asr_upload", data, file.filename)
 
-        transcript = transcribe_audio(file_path)
+        # hybrid/local ASR can run for seconds; keep the event loop free meanwhile
+        transcript = await run_in_threadpool(transcribe_audio, file_path)
         return JSONResponse({"transcript": transcript})
 
     except Exception as e:
+        logger.exception("Error in /asr/transcribe")
         return JSONResponse({"error": str(e)}, status_code=500)
 
 @app.post(
@@ -219,17 +471,34 @@ async def tts_speak(
     text: str = Form(..., description="Text to convert into speech", example="Hello, this is a test speech.")
 ):
     try:
-        filename = f"tts_{int(time.time())}.mp3"
-        output_file = os.path.join(AUDIO_DIR, filename)
-
-        audio_path = speak_text(text, output_file)
-        if audio_path.startswith("Error"):
-            return JSONResponse({"error": audio_path}, status_code=500)
-
-        return FileResponse(audio_path, media_type="audio/mpeg", filename=filename)
+        # same text + voice -> same file, so repeated prompts are synthesised once
+        cache_key = f"{tts_service.TTS_MODE}|{tts_service.ELEVENLABS_VOICE_ID}|{text}"
+        output_file, cached = audio_store.path_for_key("tts", cache_key, ".mp3")
+        if not cached:
+            tmp_file = audio_store.temp_path_for(output_file)
+            audio_path = await run_in_threadpool(speak_text, text, tmp_file)
+            if audio_path.startswith("Error"):
+                return JSONResponse({"error": audio_path}, status_code=500)
+            audio_store.commit("tts", tmp_file, output_file)
+
+        return FileResponse(output_file, media_type="audio/mpeg", filename=os.path.basename(output_file))
 
     except Exception as e:
+        logger.exception("Error in /tts/speak")
         return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def _save_speaking_uploads(part_1, part_2, part_3) -> dict:
+    responses = {}
+    # Save uploaded files to the audio store (identical recordings are kept once)
+    for part_key, upload in (("part_1", part_1), ("part_2", part_2), ("part_3", part_3)):
+        if upload is not None:
+            data = await upload.read()
+            with span("upload.write"):
+                responses[part_key] = audio_store.put_bytes("speaking_part", data, upload.filename)
+    return responses
+
+
 @app.post("/agent/speaking", summary="Evaluate IELTS speaking (parts 1-3)")
 async def agent_speaking_endpoint(
     test_id: str = Form(..., description="Test identifier"),
@@ -237,28 +506,259 @@ async def agent_speaking_endpoint(
     part_1: Optional[UploadFile] = File(None),
     part_2: Optional[UploadFile] = File(None),
     part_3: Optional[UploadFile] = File(None),
+    tenant_id: Optional[str] = Form(None, description="Tenant (school / organisation) identifier"),
+    mode: Optional[str] = Form(None, description="'mock' (timed test, scheduled first) or 'practice'"),
 ):
     try:
-        
-        responses = {}
-        # Save uploaded files to audio_files/
-        for part_key, upload in (("part_1", part_1), ("part_2", part_2), ("part_3", part_3)):
-            if upload is not None:
-                filename = f"{user_id}_{int(time.time())}_{os.path.basename(upload.filename)}"
-                path = os.path.join(AUDIO_DIR, filename)
-                with open(path, "wb") as f:
-                    f.write(await upload.read())
-                responses[part_key] = path
+        responses = await _save_speaking_uploads(part_1, part_2, part_3)
 
         if not responses:
             return JSONResponse({"error": "No audio files uploaded (part_1/part_2/part_3)."}, status_code=400)
 
+        # One slot per test, weighted by the number of parts to transcribe and score
+        try:
+            ticket = await admission.acquire_async(user_id, tenant_id, mode, len(responses))
+        except AdmissionRejected as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+
         # Build state and invoke LangGraph speaking_agent
-        state = {"test_id": test_id, "user_id": user_id, "responses": responses}
-        result_state = speaking_agent.invoke(state)
+        state = {"test_id": test_id, "user_id": user_id, "trace_id": get_trace_id(), "responses": responses}
+        try:
+            with track_request("speaking", user_id) as usage:
+                result_state = await run_in_threadpool(run_speaking, state)
+        finally:
+            admission.release(ticket)
         output = format_output(result_state)
+        output["usage"] = usage.summary()
+        history_store.record_speaking(output)
         return JSONResponse(output)
 
+    except TranscriptionError as e:
+        # nothing was checkpointed past the upload; the same request can simply be retried
+        return JSONResponse({"error": str(e)}, status_code=502)
+    except Exception as e:
+        logger.exception("Error in /agent/speaking")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.post("/agent/speaking/re-evaluate", summary="Score a speaking test again from its stored transcripts (no audio upload, no ASR)")
+async def agent_speaking_reevaluate(
+    test_id: str = Form(..., description="Test identifier"),
+    user_id: str = Form(..., description="User identifier"),
+    tenant_id: Optional[str] = Form(None, description="Tenant (school / organisation) identifier"),
+    mode: Optional[str] = Form(None, description="'mock' (timed test, scheduled first) or 'practice'"),
+):
+    try:
+        ticket = await admission.acquire_async(user_id, tenant_id, mode)
+    except AdmissionRejected as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+    try:
+        with track_request("speaking_reevaluate", user_id) as usage:
+            # the checkpointed run keeps word timings; sessions scored outside the graph
+            # (stream / WebSocket) only have their transcripts in the history store
+            result_state = await run_in_threadpool(reevaluate_speaking, user_id, test_id, get_trace_id())
+            if result_state is None:
+                sessions = history_store.test_result(user_id, test_id)["speaking"]
+                if not sessions or not sessions[0].get("transcripts"):
+                    return JSONResponse({"error": f"No stored transcripts for test {test_id}."}, status_code=404)
+                # same session_key, so the stored session is updated rather than duplicated
+                state = {"test_id": test_id, "user_id": user_id, "trace_id": get_trace_id(),
+                         "transcripts": sessions[0]["transcripts"], "thread_id": sessions[0].get("session_key")}
+                result_state = await run_in_threadpool(evaluate_node, state)
+        output = {**format_output(result_state), "usage": usage.summary()}
+        history_store.record_speaking(output)
+        return JSONResponse(output)
     except Exception as e:
-        print("Error in /agent/speaking:", e)
+        logger.exception("Error in /agent/speaking/re-evaluate")
         return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        admission.release(ticket)
+
+
+@app.post("/agent/speaking/stream", summary="Evaluate IELTS speaking and stream transcripts then scores as server-sent events")
+async def agent_speaking_stream_endpoint(
+    test_id: str = Form(..., description="Test identifier"),
+    user_id: str = Form(..., description="User identifier"),
+    part_1: Optional[UploadFile] = File(None),
+    part_2: Optional[UploadFile] = File(None),
+    part_3: Optional[UploadFile] = File(None),
+    tenant_id: Optional[str] = Form(None, description="Tenant (school / organisation) identifier"),
+    mode: Optional[str] = Form(None, description="'mock' (timed test, scheduled first) or 'practice'"),
+):
+    responses = await _save_speaking_uploads(part_1, part_2, part_3)
+    if not responses:
+        return JSONResponse({"error": "No audio files uploaded (part_1/part_2/part_3)."}, status_code=400)
+    try:
+        ticket = await admission.acquire_async(user_id, tenant_id, mode, len(responses))
+    except AdmissionRejected as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+
+    state = {"test_id": test_id, "user_id": user_id, "trace_id": get_trace_id(), "responses": responses}
+    usage = RequestUsage("speaking_stream", user_id)
+
+    def event_stream():
+        try:
+            for event, data in iter_with_usage(usage, stream_speaking(state)):
+                if event == "scores":
+                    history_store.record_speaking({**data, "usage": usage.summary()})
+                yield _sse(event, data)
+        except Exception as e:
+            logger.exception("Error in /agent/speaking/stream")
+            yield _sse("error", {"error": str(e)})
+        finally:
+            admission.release(ticket)
+        finish_request(usage)
+        yield _sse("usage", usage.summary())
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             background=BackgroundTask(admission.release, ticket))
+
+
+@app.websocket("/agent/speaking/ws")
+async def agent_speaking_ws(websocket: WebSocket, test_id: str, user_id: str, parts: str = "part_1,part_2,part_3",
+                            tenant_id: Optional[str] = None, mode: Optional[str] = None):
+    """
+    Live speaking session. Per part the client sends {"type": "start", "part": "part_1",
+    "sample_rate": 16000}, then binary frames of 16-bit mono PCM, then {"type": "end_part"}.
+    The server sends "partial" messages while the candidate speaks, a "transcript" per part,
+    and "scores" + "usage" as soon as the last expected part (or {"type": "end_test"}) ends.
+    Only scoring takes an admission slot, so idle live sessions never hold one; if scoring
+    is refused the client gets an "error" with "retry_after" and may send {"type": "end_test"}
+    again (the transcripts are kept). Audio beyond ASR_STREAM_MAX_PART_SECONDS per part or
+    ASR_STREAM_MAX_SESSION_SECONDS per session closes it with code 1009; a part whose
+    transcription failed is reported with an "error" and must be sent again before scoring.
+    """
+    expected = [p for p in parts.split(",") if p]
+    await websocket.accept()
+    token = set_trace_id(websocket.headers.get(TRACE_HEADER))
+    state = {"test_id": test_id, "user_id": user_id, "trace_id": get_trace_id(), "responses": {}}
+    part, transcriber = None, None
+    session_seconds = 0.0
+
+    def finish_part(t: IncrementalTranscriber):
+        return t.finish(), t.audio()
+
+    async def end_part():
+        nonlocal session_seconds
+        result, audio = await run_in_threadpool(finish_part, transcriber)
+        session_seconds += transcriber.duration
+        if audio:
+            state["responses"][part] = audio_store.put_bytes("speaking_part", audio, f"{part}.wav")
+        store_transcription(state, part, result)
+        message = {"type": "transcript", "part": part, "text": result["text"], "fluency_metrics": state["fluency_metrics"][part]}
+        if result.get("error"):
+            message["error"] = "Transcription failed; send this part again."
+        await websocket.send_json(message)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                if transcriber is None:
+                    await websocket.send_json({"type": "error", "error": "Send a 'start' message before audio."})
+                    continue
+                try:
+                    await run_in_threadpool(transcriber.feed, message["bytes"])
+                except StreamLimitExceeded as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    await websocket.close(code=1009)
+                    return
+                for window in transcriber.partials():
+                    await websocket.send_json({"type": "partial", "part": part, "text": window["text"]})
+                continue
+
+            control = json.loads(message.get("text") or "{}")
+            kind = control.get("type")
+            if kind == "start":
+                if transcriber is not None:
+                    await end_part()
+                part = control.get("part")
+                if part not in expected:
+                    await websocket.send_json({"type": "error", "error": f"Unknown part {part}; expected one of {expected}."})
+                    part, transcriber = None, None
+                    continue
+                remaining = ASR_STREAM_MAX_SESSION_SECONDS - session_seconds
+                if remaining <= 0:
+                    await websocket.send_json({"type": "error", "error": "Audio limit for this session reached."})
+                    await websocket.close(code=1009)
+                    return
+                try:
+                    transcriber = IncrementalTranscriber(int(control.get("sample_rate", 16000)),
+                                                         max_seconds=min(ASR_STREAM_MAX_PART_SECONDS, remaining))
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    part, transcriber = None, None
+            elif kind in ("end_part", "end_test"):
+                if transcriber is not None:
+                    await end_part()
+                    part, transcriber = None, None
+                done = all(p in state.get("transcripts", {}) for p in expected)
+                if kind == "end_test" or done:
+                    if not state.get("transcripts"):
+                        await websocket.send_json({"type": "error", "error": "No audio received."})
+                        break
+                    failed = sorted(state.get("asr_errors") or {})
+                    if failed:
+                        await websocket.send_json({"type": "error", "parts": failed,
+                                                   "error": f"Transcription failed for {', '.join(failed)}; send again to be scored."})
+                        if kind == "end_test":
+                            break
+                        continue
+                    try:
+                        ticket = await admission.acquire_async(user_id, tenant_id, mode, len(state["transcripts"]),
+                                                               client=_client_host(websocket))
+                    except AdmissionRejected as e:
+                        await websocket.send_json({"type": "error", "error": str(e), "retry_after": e.retry_after})
+                        continue
+                    try:
+                        with track_request("speaking_ws", user_id) as usage:
+                            result_state = await run_in_threadpool(evaluate_node, state)
+                    finally:
+                        admission.release(ticket)
+                    output = {**format_output(result_state), "usage": usage.summary()}
+                    history_store.record_speaking(output)
+                    await websocket.send_json({"type": "scores", **output})
+                    await websocket.send_json({"type": "usage", **usage.summary()})
+                    break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.exception("Error in /agent/speaking/ws")
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1011)
+    finally:
+        reset_trace_id(token)
+
+
+@app.get("/usage/{user_id}", summary="LLM token spend attributed to a user, per endpoint (since process start)")
+def get_user_usage(user_id: str):
+    return {"user_id": user_id, "usage": user_token_usage(user_id)}
+
+
+@app.get("/history/{user_id}", summary="Recent writing submissions and speaking sessions for a user")
+def get_user_history(user_id: str, limit: int = 20):
+    return history_store.user_history(user_id, limit)
+
+
+@app.get("/history/{user_id}/{test_id}", summary="Stored submissions, transcripts, scores and feedback for one test")
+def get_test_history(user_id: str, test_id: str):
+    return history_store.test_result(user_id, test_id)
+
+
+@app.get("/progress/cohort/{cohort}", summary="Score distribution and weakest criterion for a cohort ('all', 'academic', ...)")
+def get_cohort_progress(cohort: str):
+    summary = progress_analytics.cohort_summary(cohort)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"Unknown cohort: {cohort}")
+    return summary
+
+
+@app.get("/progress/{user_id}", summary="Per-criterion averages, trends, percentile ranks and weakest area for a user")
+def get_user_progress(user_id: str):
+    progress = progress_analytics.user_progress(user_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"No scores recorded for user {user_id}")
+    return progress